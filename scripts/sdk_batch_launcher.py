@@ -19,15 +19,24 @@ Environment Variables:
     OPENCODE_API_KEY        - API key for Opencode subscription
 """
 
+from __future__ import annotations
+
 import os
 import sys
+import time
+import random
 import asyncio
+import inspect
 import argparse
-import subprocess
+import statistics
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, Iterable, List, Optional, Tuple
 from dataclasses import dataclass
-from concurrent.futures import ThreadPoolExecutor
+
+# Shared tmux driver and tracing live next to gen_tmuxp.py in tools/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tools"))
+import arena_tmux  # noqa: E402
+import arena_trace  # noqa: E402
 
 # Try to import opencode SDK (may not be installed)
 try:
@@ -37,6 +46,12 @@ except ImportError:
     HAS_SDK = False
     print("Warning: opencode-sdk not installed. Using subprocess fallback.")
 
+SESSION_NAME = "opencode-sdk-batch"
+
+# HTTP statuses worth retrying (rate limit / overloaded / gateway errors)
+TRANSIENT_STATUS = {408, 425, 429, 500, 502, 503, 504}
+MAX_BACKOFF_SEC = 10.0
+
 
 @dataclass
 class ProjectConfig:
@@ -47,6 +62,113 @@ class ProjectConfig:
     command: Optional[str] = None
 
 
+@dataclass
+class WindowPlan:
+    """One planned tmux window of a bulk launch."""
+    project: ProjectConfig
+    name: str
+    start_cmd: str
+    window_id: Optional[str] = None
+    started: bool = False
+    error: Optional[str] = None
+
+
+@dataclass
+class LaunchResult:
+    """Outcome and latency of one SDK project launch."""
+    project: str
+    ok: bool
+    attempts: int = 0
+    wait_sec: float = 0.0
+    latency_sec: float = 0.0
+    error: Optional[str] = None
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Network errors, timeouts and retryable HTTP statuses are transient."""
+    if isinstance(exc, (ConnectionError, TimeoutError, asyncio.TimeoutError)):
+        return True
+    status = getattr(exc, "status_code", None) or getattr(exc, "status", None)
+    return isinstance(status, int) and status in TRANSIENT_STATUS
+
+
+def backoff_delay(attempt: int, base: float) -> float:
+    """Full-jitter exponential backoff: uniform(0, base * 2**attempt), capped."""
+    return random.uniform(0, min(MAX_BACKOFF_SEC, base * (2 ** attempt)))
+
+
+def accepts_keyword(func, name: str) -> bool:
+    """True if func can be called with keyword argument name."""
+    try:
+        params = inspect.signature(func).parameters
+    except (TypeError, ValueError):
+        return False
+    return name in params or any(p.kind is inspect.Parameter.VAR_KEYWORD for p in params.values())
+
+
+async def close_client(client) -> None:
+    """Close an OpenCode client (aclose/close, sync or async), ignoring errors."""
+    closer = getattr(client, "aclose", None) or getattr(client, "close", None)
+    if closer is None:
+        return
+    try:
+        result = closer()
+        if asyncio.iscoroutine(result):
+            await result
+    except Exception:
+        pass
+
+
+class ClientPool:
+    """
+    Shares OpenCode clients (and their connections) per model.
+    
+    When the SDK's create_session() takes a working_directory, one client per
+    model serves every project and the directory is passed per session.
+    Otherwise each project gets its own OpenCode(model=..., working_directory=...)
+    client, reused across its retries and closed by release() once its launch
+    finishes, so clients don't pile up over a batch.
+    """
+    
+    def __init__(self):
+        self.shared = accepts_keyword(OpenCode.create_session, "working_directory")
+        self._clients: Dict[Tuple[str, Optional[str]], "OpenCode"] = {}
+        self._lock = asyncio.Lock()
+    
+    def _key(self, model: str, working_directory: str) -> Tuple[str, Optional[str]]:
+        return (model, None if self.shared else working_directory)
+    
+    async def get(self, model: str, working_directory: str) -> "OpenCode":
+        key = self._key(model, working_directory)
+        async with self._lock:
+            if key not in self._clients:
+                if self.shared:
+                    self._clients[key] = OpenCode(model=model)
+                else:
+                    self._clients[key] = OpenCode(model=model, working_directory=working_directory)
+            return self._clients[key]
+    
+    async def create_session(self, model: str, working_directory: str) -> "Session":
+        client = await self.get(model, working_directory)
+        if self.shared:
+            return await client.create_session(working_directory=working_directory)
+        return await client.create_session()
+    
+    async def release(self, model: str, working_directory: str):
+        """Close a per-project client once its launch is done (no-op for shared clients)."""
+        if self.shared:
+            return
+        async with self._lock:
+            client = self._clients.pop(self._key(model, working_directory), None)
+        if client is not None:
+            await close_client(client)
+    
+    async def close(self):
+        clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            await close_client(client)
+
+
 class BatchLauncher:
     """
     Batch launcher for Opencode sessions.
@@ -58,12 +180,17 @@ class BatchLauncher:
         self,
         model: str = "openai/gpt-5.2-codex",
         small_model: Optional[str] = None,
-        max_workers: int = 4
+        max_workers: int = 4,
+        retries: int = 3,
+        retry_backoff: float = 0.5
     ):
         self.model = model
         self.small_model = small_model or model
         self.max_workers = max_workers
+        self.retries = retries
+        self.retry_backoff = retry_backoff
         self.sessions: List[Session] = []
+        self.pool: Optional[ClientPool] = None
     
     def set_environment(self):
         """Set environment variables for Opencode."""
@@ -96,122 +223,220 @@ class BatchLauncher:
     async def launch_with_sdk(
         self,
         project: ProjectConfig,
-        command: Optional[str] = None
-    ) -> Optional[Session]:
-        """Launch Opencode session using SDK."""
+        command: Optional[str] = None,
+        semaphore: Optional[asyncio.Semaphore] = None
+    ) -> LaunchResult:
+        """
+        Launch Opencode session using SDK.
+        
+        Waits for a slot on semaphore, uses the pooled client for the project's
+        model and retries transient failures with jittered exponential backoff.
+        """
+        result = LaunchResult(project=project.name, ok=False)
         if not HAS_SDK:
-            return None
+            result.error = "opencode-sdk not installed"
+            return result
         
-        try:
-            client = OpenCode(
-                model=project.model,
-                working_directory=str(project.path)
+        if self.pool is None:
+            self.pool = ClientPool()
+        semaphore = semaphore or asyncio.Semaphore(1)
+        queued = time.monotonic()
+        start: Optional[float] = None
+        while True:
+            retry = False
+            async with semaphore:
+                if start is None:
+                    start = time.monotonic()
+                    result.wait_sec = start - queued
+                result.attempts += 1
+                try:
+                    session = await self.pool.create_session(project.model, str(project.path))
+                    
+                    if command:
+                        await session.send_command(command)
+                    
+                    self.sessions.append(session)
+                    result.ok = True
+                except Exception as e:
+                    result.error = f"{type(e).__name__}: {e}"
+                    retry = result.attempts <= self.retries and is_transient(e)
+            if not retry:
+                break
+            # Back off without holding a slot so other projects keep launching
+            await asyncio.sleep(backoff_delay(result.attempts - 1, self.retry_backoff))
+        result.latency_sec = time.monotonic() - start
+        await self.pool.release(project.model, str(project.path))
+        
+        retried = f", {result.attempts} attempts" if result.attempts > 1 else ""
+        if result.ok:
+            print(f"✓ SDK session started: {project.name} ({result.latency_sec:.2f}s{retried})")
+        else:
+            print(f"✗ SDK launch failed for {project.name}: {result.error}{retried}")
+        return result
+    
+    def report_latency(self, results: List[LaunchResult]):
+        """Print per-batch launch latency percentiles and failures."""
+        latencies = sorted(r.latency_sec for r in results if r.ok)
+        failed = [r for r in results if not r.ok]
+        retried = sum(1 for r in results if r.attempts > 1)
+        if latencies:
+            p95 = latencies[min(len(latencies) - 1, int(round(0.95 * (len(latencies) - 1))))]
+            waits = [r.wait_sec for r in results]
+            print(
+                f"Launch latency: p50 {statistics.median(latencies):.2f}s, p95 {p95:.2f}s, "
+                f"max {latencies[-1]:.2f}s; queue wait max {max(waits):.2f}s; "
+                f"{retried} retried, {len(failed)} failed"
             )
+        for r in failed:
+            print(f"  ✗ {r.project}: {r.error} ({r.attempts} attempts)")
+    
+    def plan_windows(
+        self,
+        projects: List[ProjectConfig],
+        command: Optional[str] = None,
+        taken: Iterable[str] = ()
+    ) -> List[WindowPlan]:
+        """Assign unique window names in project order (dir, dir-2, ...) and start commands."""
+        used = set(taken)
+        cmd = f"opencode '{command}'" if command else "opencode"
+        plans = []
+        for project in projects:
+            name, n = project.name, 2
+            while name in used:
+                name, n = f"{project.name}-{n}", n + 1
+            used.add(name)
+            plans.append(WindowPlan(
+                project=project,
+                name=name,
+                start_cmd=f"export OPENCODE_MODEL='{project.model}' && {cmd}"
+            ))
+        return plans
+    
+    async def launch_tmux_batch(
+        self,
+        projects: List[ProjectConfig],
+        command: Optional[str] = None,
+        wave_size: Optional[int] = None,
+        wave_delay: float = 1.0
+    ) -> List[WindowPlan]:
+        """
+        Build the whole session layout in one planned batch, then start agents in waves.
+        
+        All windows (name, cwd, env) are created in a single pipelined round trip over
+        one tmux control-mode connection, so there is no has-session/new-session race
+        and window order and names follow the projects file. Start commands are then
+        sent wave_size windows at a time, wave_delay seconds apart.
+        """
+        wave_size = max(1, wave_size or self.max_workers)
+        async with arena_tmux.TmuxControl(SESSION_NAME, start_dir=projects[0].path) as tmux:
+            existing = [n for n in await tmux.list_windows() if n != arena_tmux.PLACEHOLDER_WINDOW]
+            plans = self.plan_windows(projects, command, taken=existing)
             
-            session = await client.create_session()
-            
-            if command:
-                await session.send_command(command)
-            
-            self.sessions.append(session)
-            print(f"✓ SDK session started: {project.name}")
-            return session
+            with arena_trace.span("launch.layout", windows=len(plans)):
+                replies = await tmux.pipeline([
+                    tmux.new_window_args(
+                        plan.name,
+                        cwd=plan.project.path,
+                        env={
+                            "OPENCODE_MODEL": plan.project.model,
+                            "OPENCODE_SMALL_MODEL": self.small_model
+                        }
+                    )
+                    for plan in plans
+                ], check=False, timeout=arena_tmux.REPLY_TIMEOUT_SEC + 0.1 * len(plans))
+                for plan, reply in zip(plans, replies):
+                    if reply.ok:
+                        plan.window_id = reply.text.strip()
+                    else:
+                        plan.error = reply.text or "new-window failed"
+                        print(f"✗ Window creation failed for {plan.project.name}: {plan.error}")
+                await tmux.drop_placeholder()
             
-        except Exception as e:
-            print(f"✗ SDK launch failed for {project.name}: {e}")
-            return None
+            ready = [plan for plan in plans if plan.window_id]
+            for i in range(0, len(ready), wave_size):
+                wave = ready[i:i + wave_size]
+                if i:
+                    await asyncio.sleep(wave_delay)
+                with arena_trace.span("launch.wave", wave=i // wave_size + 1, size=len(wave)):
+                    replies = await tmux.pipeline([
+                        ["send-keys", "-t", plan.window_id, plan.start_cmd, "C-m"]
+                        for plan in wave
+                    ], check=False)
+                for plan, reply in zip(wave, replies):
+                    plan.started = reply.ok
+                    if reply.ok:
+                        print(f"✓ Subprocess session started: {plan.name}")
+                    else:
+                        plan.error = reply.text or "send-keys failed"
+                        print(f"✗ Subprocess launch failed for {plan.name}: {plan.error}")
+        return plans
     
-    def launch_with_subprocess(
+    async def launch_with_subprocess(
         self,
         project: ProjectConfig,
         command: Optional[str] = None
-    ) -> Optional[subprocess.Popen]:
-        """Launch Opencode using subprocess (tmux)."""
+    ) -> bool:
+        """Launch Opencode for a single project in a tmux window."""
         try:
-            # Set environment
-            env = os.environ.copy()
-            env["OPENCODE_MODEL"] = project.model
-            env["OPENCODE_SMALL_MODEL"] = self.small_model
-            
-            # Build command
-            if command:
-                cmd = f"opencode '{command}'"
-            else:
-                cmd = "opencode"
-            
-            # Create tmux window
-            session_name = "opencode-sdk-batch"
-            
-            # Check if session exists
-            result = subprocess.run(
-                ["tmux", "has-session", "-t", session_name],
-                capture_output=True
-            )
-            
-            if result.returncode != 0:
-                # Create new session
-                subprocess.run([
-                    "tmux", "new-session", "-d", "-s", session_name,
-                    "-n", project.name, "-c", str(project.path)
-                ], env=env)
-            else:
-                # Create new window in existing session
-                subprocess.run([
-                    "tmux", "new-window", "-t", session_name,
-                    "-n", project.name, "-c", str(project.path)
-                ], env=env)
-            
-            # Send opencode command
-            subprocess.run([
-                "tmux", "send-keys", "-t", f"{session_name}:{project.name}",
-                f"export OPENCODE_MODEL='{project.model}' && {cmd}", "C-m"
-            ])
-            
-            print(f"✓ Subprocess session started: {project.name}")
-            return True
-            
-        except Exception as e:
+            plans = await self.launch_tmux_batch([project], command)
+        except (arena_tmux.TmuxError, asyncio.TimeoutError, OSError) as e:
             print(f"✗ Subprocess launch failed for {project.name}: {e}")
-            return None
+            return False
+        return plans[0].started
     
     async def launch_batch(
         self,
         projects: List[ProjectConfig],
         command: Optional[str] = None,
-        use_sdk: bool = True
+        use_sdk: bool = True,
+        wave_size: Optional[int] = None,
+        wave_delay: float = 1.0
     ):
-        """Launch multiple Opencode sessions in parallel."""
+        """Launch multiple Opencode sessions on one event loop."""
         self.set_environment()
         
-        if use_sdk and HAS_SDK:
-            # Use SDK for async launching
-            tasks = [
-                self.launch_with_sdk(project, command)
-                for project in projects
-            ]
-            await asyncio.gather(*tasks)
-        else:
-            # Use subprocess with thread pool
-            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-                futures = [
-                    executor.submit(self.launch_with_subprocess, project, command)
-                    for project in projects
-                ]
-                for future in futures:
-                    future.result()
+        mode = "sdk" if use_sdk and HAS_SDK else "tmux"
+        
+        # At most max_workers SDK launches (and connections) in flight
+        semaphore = asyncio.Semaphore(max(1, self.max_workers))
+        
+        async def launch_one(project: ProjectConfig) -> LaunchResult:
+            with arena_trace.span("launch.project", project=project.name, model=project.model, mode=mode) as attrs:
+                result = await self.launch_with_sdk(project, command, semaphore)
+                attrs.update(ok=result.ok, attempts=result.attempts, wait_ms=round(result.wait_sec * 1000, 1))
+                return result
+        
+        with arena_trace.span("launch.batch", projects=len(projects), mode=mode, workers=self.max_workers):
+            if mode == "sdk":
+                self.pool = self.pool or ClientPool()
+                results = await asyncio.gather(*(launch_one(project) for project in projects))
+                self.report_latency(list(results))
+            else:
+                # One planned layout over a single tmux client (tools/arena_tmux.py)
+                try:
+                    plans = await self.launch_tmux_batch(projects, command, wave_size, wave_delay)
+                except (arena_tmux.TmuxError, asyncio.TimeoutError, OSError) as e:
+                    print(f"✗ tmux batch launch failed: {e}")
+                    return
+                failed = [plan.name for plan in plans if not plan.started]
+                if failed:
+                    print(f"✗ {len(failed)} windows failed: {', '.join(failed)}")
         
         print(f"\n✓ Batch launch complete: {len(projects)} projects")
-        if not use_sdk or not HAS_SDK:
-            print("Attach to session: tmux attach -t opencode-sdk-batch")
+        if mode == "tmux":
+            print(f"Attach to session: tmux attach -t {SESSION_NAME}")
     
     async def close_all(self):
-        """Close all SDK sessions."""
+        """Close all SDK sessions, then the pooled clients."""
         for session in self.sessions:
             try:
                 await session.close()
             except Exception:
                 pass
         self.sessions.clear()
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
 
 
 class ModelPresets:
@@ -283,20 +508,57 @@ Available Model Presets:
         "-w", "--workers",
         type=int,
         default=4,
-        help="Number of parallel workers (default: 4)"
+        help="Concurrent SDK launches; in tmux mode, agents started per wave (default: 4)"
+    )
+    parser.add_argument(
+        "--wave-size",
+        type=int,
+        default=None,
+        help="Agents to start per wave in tmux mode (default: --workers)"
+    )
+    parser.add_argument(
+        "--wave-delay",
+        type=float,
+        default=1.0,
+        help="Seconds between start waves in tmux mode (default: 1.0)"
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=3,
+        help="Retries per project for transient SDK failures (default: 3)"
+    )
+    parser.add_argument(
+        "--retry-backoff",
+        type=float,
+        default=0.5,
+        help="Base seconds for jittered exponential retry backoff (default: 0.5)"
     )
     parser.add_argument(
         "--no-sdk",
         action="store_true",
         help="Use subprocess mode instead of SDK"
     )
+    parser.add_argument(
+        "--trace",
+        metavar="OUT.json",
+        help="Record launch timing spans as a Chrome trace-event file (open in Perfetto)"
+    )
+    parser.add_argument(
+        "--trace-top",
+        type=int,
+        default=15,
+        help="Number of slowest spans to print with --trace (default: 15)"
+    )
     
     args = parser.parse_args()
     
     # Create launcher
     launcher = BatchLauncher(
         model=args.model,
-        max_workers=args.workers
+        max_workers=args.workers,
+        retries=args.retries,
+        retry_backoff=args.retry_backoff
     )
     
     # Load projects
@@ -310,12 +572,24 @@ Available Model Presets:
     print(f"Workers: {args.workers}")
     print()
     
+    if args.trace:
+        arena_trace.enable()
+    
     # Launch
-    asyncio.run(launcher.launch_batch(
-        projects,
-        command=args.command,
-        use_sdk=not args.no_sdk
-    ))
+    try:
+        asyncio.run(launcher.launch_batch(
+            projects,
+            command=args.command,
+            use_sdk=not args.no_sdk,
+            wave_size=args.wave_size,
+            wave_delay=args.wave_delay
+        ))
+    finally:
+        if args.trace:
+            out = Path(args.trace).resolve()
+            arena_trace.TRACER.write(out, process_name="sdk_batch_launcher")
+            print(arena_trace.TRACER.summary(args.trace_top))
+            print(f"[trace] wrote {out} (open in https://ui.perfetto.dev)")
 
 
 if __name__ == "__main__":
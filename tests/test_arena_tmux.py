@@ -0,0 +1,87 @@
+"""tools/arena_tmux.py の control mode 出力パーサ（%begin/%end/%error と通知）とクォートのテスト。"""
+
+import asyncio
+import sys
+import unittest
+from pathlib import Path
+from typing import List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tools"))
+import arena_tmux  # noqa: E402
+
+
+def parse(data: str, commands: List[str], attach: bool = True) -> Tuple[arena_tmux.TmuxControl, list, list]:
+    """data を _read_loop に流し、(クライアント, 各コマンドの結果か例外, 通知) を返す。"""
+    notes: list = []
+    tmux = arena_tmux.TmuxControl("s", create=False, on_notification=lambda name, args: notes.append((name, args)))
+
+    async def main() -> list:
+        loop = asyncio.get_running_loop()
+        if attach:
+            tmux._attached = loop.create_future()
+        futs = []
+        for cmd in commands:
+            fut = loop.create_future()
+            tmux._pending.append((cmd, fut))
+            futs.append(fut)
+        reader = asyncio.StreamReader()
+        reader.feed_data(data.encode("utf-8"))
+        reader.feed_eof()
+        await tmux._read_loop(reader)
+        return [f.exception() or f.result() for f in futs]
+
+    return tmux, asyncio.run(main()), notes
+
+
+class ReadLoopTest(unittest.TestCase):
+    def test_replies_match_commands_in_order(self) -> None:
+        data = (
+            "%begin 1 10 0\n%end 1 10 0\n"
+            "%begin 1 11 1\nline one\nline two\n%end 1 11 1\n"
+            "%begin 1 12 1\ncan't find window: x\n%error 1 12 1\n"
+        )
+        tmux, (first, second), _ = parse(data, ["list-windows", "capture-pane -t x"])
+        self.assertEqual(first, arena_tmux.Reply("list-windows", True, ["line one", "line two"]))
+        self.assertFalse(second.ok)
+        self.assertEqual(second.text, "can't find window: x")
+        self.assertTrue(tmux._attached.result().ok)
+
+    def test_attach_failure_is_not_a_command_reply(self) -> None:
+        # attach 前に送ったコマンドへの応答が先に来て、その後に attach 自体の %error（flags 0）が来る
+        data = "%begin 1 5 1\nno current client\n%error 1 5 1\n%begin 1 6 0\ncan't find session: s\n%error 1 6 0\n%exit\n"
+        tmux, (reply,), _ = parse(data, ["refresh-client -f no-output"])
+        self.assertFalse(reply.ok)
+        attached = tmux._attached.result()
+        self.assertFalse(attached.ok)
+        self.assertEqual(attached.text, "can't find session: s")
+        self.assertEqual(tmux._closed, "exit")
+
+    def test_notifications_and_output_unescape(self) -> None:
+        data = "%begin 1 1 0\n%end 1 1 0\n%output %3 hi\\015\\012\\134\n%window-add @2\n%sessions-changed\n"
+        tmux, _, notes = parse(data, [])
+        self.assertEqual(notes, [("output", ["%3", "hi\r\n\\"]), ("window-add", ["@2"]), ("sessions-changed", [])])
+        self.assertEqual(tmux.notifications, 3)
+
+    def test_lines_inside_block_are_not_notifications(self) -> None:
+        data = "%begin 1 1 1\n%not-a-notification\n%end 1 1 1\n"
+        _, (reply,), notes = parse(data, ["display-message -p %x"], attach=False)
+        self.assertEqual(reply.lines, ["%not-a-notification"])
+        self.assertEqual(notes, [])
+
+    def test_eof_fails_pending_commands_and_attach(self) -> None:
+        tmux, (err,), _ = parse("%begin 1 1 1\npartial\n", ["list-windows"])
+        self.assertIsInstance(err, arena_tmux.TmuxError)
+        self.assertEqual(tmux._closed, "eof")
+        self.assertIsInstance(tmux._attached.exception(), arena_tmux.TmuxError)
+
+
+class QuoteTest(unittest.TestCase):
+    def test_command_line(self) -> None:
+        self.assertEqual(arena_tmux.command_line(["send-keys", "-t", "s:w", "-l", "--", 'echo "$HOME"\n']), 'send-keys -t s:w -l -- "echo \\"\\$HOME\\"\\n"')
+
+    def test_unescape_output(self) -> None:
+        self.assertEqual(arena_tmux.unescape_output("a\\033[0mb"), "a\x1b[0mb")
+
+
+if __name__ == "__main__":
+    unittest.main()
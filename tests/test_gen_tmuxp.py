@@ -0,0 +1,273 @@
+"""tools/gen_tmuxp.py の純粋な部品（統計・シャード分割・ログ世代・キャッシュ・影響索引・依存展開）のテスト。"""
+
+import asyncio
+import gzip
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tools"))
+import gen_tmuxp  # noqa: E402
+
+
+class TempDirTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = Path(tempfile.mkdtemp(prefix="arena-test-"))
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+
+
+class MedianCITest(unittest.TestCase):
+    def test_small_sample_is_min_max(self) -> None:
+        # n=5 では最も外側の順序統計量でも 95% に届かない
+        self.assertEqual(gen_tmuxp.median_ci([5.0, 1.0, 4.0, 2.0, 3.0]), (1.0, 5.0))
+
+    def test_order_statistics(self) -> None:
+        values = [float(v) for v in range(1, 11)]
+        self.assertEqual(gen_tmuxp.median_ci(values), (2.0, 9.0))
+        lo, hi = gen_tmuxp.median_ci([float(v) for v in range(1, 101)])
+        self.assertLess(lo, 50.5)
+        self.assertGreater(hi, 50.5)
+        self.assertEqual(hi - 50.5, 50.5 - lo)
+
+    def test_single_value(self) -> None:
+        self.assertEqual(gen_tmuxp.median_ci([3.0]), (3.0, 3.0))
+
+
+class BalanceShardsTest(unittest.TestCase):
+    def test_longest_first_into_lightest_shard(self) -> None:
+        durations = {"a": 5.0, "b": 4.0, "c": 3.0, "d": 2.0, "e": 1.0}
+        plan = gen_tmuxp.balance_shards(sorted(durations), durations, 2)
+        self.assertEqual(plan, [(["a", "d", "e"], 8.0), (["b", "c"], 7.0)])
+
+    def test_unknown_tests_use_known_median(self) -> None:
+        plan = gen_tmuxp.balance_shards(["a", "b", "new"], {"a": 1.0, "b": 3.0}, 3)
+        self.assertEqual(sorted(est for _, est in plan), [1.0, 2.0, 3.0])
+
+    def test_no_durations_gives_equal_weights(self) -> None:
+        plan = gen_tmuxp.balance_shards(["t1", "t2", "t3", "t4"], {}, 2)
+        self.assertEqual([len(ts) for ts, _ in plan], [2, 2])
+        self.assertEqual([est for _, est in plan], [2.0, 2.0])
+
+    def test_never_more_shards_than_tests(self) -> None:
+        plan = gen_tmuxp.balance_shards(["only"], {}, 4)
+        self.assertEqual(plan, [(["only"], 1.0)])
+
+
+class JunitDurationsTest(TempDirTestCase):
+    def write(self, body: str) -> Path:
+        p = self.tmp / "junit.xml"
+        p.write_text(f'<?xml version="1.0"?><testsuites><testsuite name="pytest">{body}</testsuite></testsuites>', encoding="utf-8")
+        return p
+
+    def test_file_attribute(self) -> None:
+        xml = self.write('<testcase file="tests/test_a.py" classname="tests.test_a" name="t1" time="1.5"/>'
+                         '<testcase file="tests/test_a.py" classname="tests.test_a" name="t2" time="0.5"/>')
+        self.assertEqual(gen_tmuxp.junit_durations(xml, ["tests/test_a.py"]), {"tests/test_a.py": 2.0})
+
+    def test_classname_fallback(self) -> None:
+        xml = self.write('<testcase classname="tests.test_a" name="t1" time="1"/>'
+                         '<testcase classname="tests.test_b.TestB" name="t2" time="2"/>'
+                         '<testcase classname="elsewhere.test_c" name="t3" time="4"/>')
+        got = gen_tmuxp.junit_durations(xml, ["tests/test_a.py", "tests/test_b.py", "tests/test_c.py"])
+        self.assertEqual(got, {"tests/test_a.py": 1.0, "tests/test_b.py": 2.0})
+
+    def test_missing_or_broken_file(self) -> None:
+        self.assertEqual(gen_tmuxp.junit_durations(self.tmp / "nope.xml", ["t.py"]), {})
+        broken = self.tmp / "broken.xml"
+        broken.write_text("<testsuites>", encoding="utf-8")
+        self.assertEqual(gen_tmuxp.junit_durations(broken, ["t.py"]), {})
+
+
+class RotateLogTest(TempDirTestCase):
+    def rotate(self, text: str, keep: int = 2, max_bytes: int = 1 << 20) -> None:
+        self.log.write_text(text, encoding="utf-8")
+        gen_tmuxp.rotate_log(self.log, keep=keep, max_bytes=max_bytes)
+
+    def gen(self, i: int) -> Path:
+        return self.log.with_name(f"{self.log.name}.{i}.gz")
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.log = self.tmp / "A01.log"
+
+    def test_generations_shift_and_drop(self) -> None:
+        for text in ("one", "two", "three"):
+            self.rotate(text)
+        self.assertFalse(self.log.exists())
+        self.assertEqual(gzip.decompress(self.gen(1).read_bytes()), b"three")
+        self.assertEqual(gzip.decompress(self.gen(2).read_bytes()), b"two")
+        self.assertFalse(self.gen(3).exists())
+
+    def test_empty_log_is_not_rotated(self) -> None:
+        self.rotate("")
+        self.assertFalse(self.gen(1).exists())
+
+    def test_keep_zero_deletes(self) -> None:
+        self.rotate("x", keep=0)
+        self.assertFalse(self.log.exists())
+        self.assertFalse(self.gen(1).exists())
+
+    def test_total_size_cap(self) -> None:
+        self.rotate(os.urandom(2048).hex(), keep=5)
+        self.rotate(os.urandom(2048).hex(), keep=5, max_bytes=self.gen(1).stat().st_size + 10)
+        self.assertTrue(self.gen(1).exists())
+        self.assertFalse(self.gen(2).exists())
+
+
+class GateCacheSingleFlightTest(TempDirTestCase):
+    def test_waiters_get_owner_result_and_do_not_release(self) -> None:
+        cache = gen_tmuxp.GateCache(self.tmp, {}, "make test")
+        events = []
+
+        async def owner() -> None:
+            hit, owned = await cache.acquire("tree1")
+            self.assertEqual((hit, owned), (None, True))
+            await asyncio.sleep(0.05)
+            cache.put("tree1", {"status": "pass", "exit_code": 0, "elapsed_sec": 1.0, "team": "A01"})
+            events.append("put")
+            cache.release("tree1", owned)
+
+        async def waiter() -> None:
+            await asyncio.sleep(0.01)
+            hit, owned = await cache.acquire("tree1")
+            events.append("hit")
+            self.assertFalse(owned)
+            self.assertEqual(hit["team"], "A01")
+            cache.release("tree1", owned)
+
+        async def main() -> None:
+            await asyncio.gather(owner(), waiter(), waiter())
+
+        asyncio.run(main())
+        self.assertEqual(events, ["put", "hit", "hit"])
+        self.assertEqual(cache._inflight, {})
+
+    def test_non_owner_release_keeps_inflight(self) -> None:
+        cache = gen_tmuxp.GateCache(self.tmp, {}, "make test")
+
+        async def main() -> None:
+            _, owned = await cache.acquire("tree2")
+            cache.release("tree2", False)
+            self.assertIn("tree2", cache._inflight)
+            cache.release("tree2", owned)
+            self.assertNotIn("tree2", cache._inflight)
+
+        asyncio.run(main())
+
+    def test_uncacheable_result_lets_next_waiter_run(self) -> None:
+        cache = gen_tmuxp.GateCache(self.tmp, {}, "make test")
+
+        async def main() -> None:
+            _, first = await cache.acquire("tree3")
+            second = asyncio.ensure_future(cache.acquire("tree3"))
+            await asyncio.sleep(0.01)
+            self.assertFalse(second.done())
+            cache.put("tree3", {"status": "timeout"})
+            cache.release("tree3", first)
+            self.assertEqual(await second, (None, True))
+
+        asyncio.run(main())
+
+
+@unittest.skipUnless(shutil.which("git"), "git not installed")
+class ImpactIndexSelectTest(TempDirTestCase):
+    def git(self, *args: str) -> str:
+        return subprocess.run(["git", *args], cwd=self.tmp, check=True, capture_output=True, text=True).stdout.strip()
+
+    def commit_files(self, files: dict, message: str) -> str:
+        for name, text in files.items():
+            p = self.tmp / name
+            p.parent.mkdir(parents=True, exist_ok=True)
+            p.write_text(text, encoding="utf-8")
+        self.git("add", "-A")
+        self.git("commit", "-q", "-m", message)
+        return self.git("rev-parse", "HEAD")
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.git("init", "-q", "-b", "main")
+        self.git("config", "user.email", "t@example.com")
+        self.git("config", "user.name", "t")
+        (self.tmp / ".git" / "info" / "exclude").write_text(".arena/\n", encoding="utf-8")
+        self.commit_files({
+            "pkg/__init__.py": "",
+            "pkg/a.py": "def f():\n    return 1\n",
+            "pkg/b.py": "def g():\n    return 2\n",
+            "tests/test_a.py": "from pkg.a import f\n\ndef test_f():\n    assert f() == 1\n",
+            "README.md": "# demo\n",
+        }, "base")
+        self.git("checkout", "-q", "-b", "team")
+
+    def select(self, files: dict, cfg: dict = None) -> tuple:
+        commit = self.commit_files(files, "change")
+        cfg = dict({"base_ref": "main", "gate_incremental_cmd": "python3 -m pytest -q {tests}"}, **(cfg or {}))
+        index = gen_tmuxp.ImpactIndex(self.tmp, cfg, "python3 -m pytest -q")
+        return asyncio.run(index.select(commit, self.tmp))
+
+    def test_change_reached_by_a_test(self) -> None:
+        tests, why = self.select({"pkg/a.py": "def f():\n    return 1  # edited\n"})
+        self.assertEqual(tests, ["tests/test_a.py"])
+        self.assertIn("1 affected tests", why)
+
+    def test_changed_test_is_selected(self) -> None:
+        tests, _ = self.select({"tests/test_a.py": "from pkg.a import f\n\ndef test_f():\n    assert f()\n"})
+        self.assertEqual(tests, ["tests/test_a.py"])
+
+    def test_code_no_test_reaches_runs_everything(self) -> None:
+        tests, why = self.select({"pkg/b.py": "def g():\n    return 3\n"})
+        self.assertIsNone(tests)
+        self.assertEqual(why, "no test reaches change: pkg/b.py")
+
+    def test_unindexed_file_runs_everything(self) -> None:
+        tests, why = self.select({"setup.cfg": "[metadata]\n"})
+        self.assertIsNone(tests)
+        self.assertEqual(why, "unmapped change: setup.cfg")
+
+    def test_ignored_only_change(self) -> None:
+        tests, why = self.select({"README.md": "# changed\n"})
+        self.assertIsNone(tests)
+        self.assertEqual(why, "no affected tests")
+        tests, _ = self.select({"README.md": "# changed again\n"}, {"gate_always_run": ["tests/test_a.py"]})
+        self.assertEqual(tests, ["tests/test_a.py"])
+
+    def test_no_template_means_full_run(self) -> None:
+        commit = self.commit_files({"pkg/a.py": "x = 1\n"}, "change")
+        index = gen_tmuxp.ImpactIndex(self.tmp, {"base_ref": "main"}, "make test")
+        tests, _ = asyncio.run(index.select(commit, self.tmp))
+        self.assertIsNone(tests)
+
+
+class LinkTreeTest(TempDirTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.src = self.tmp / "store"
+        (self.src / "pkg" / "sub").mkdir(parents=True)
+        (self.src / "pkg" / "mod.py").write_text("x = 1\n", encoding="utf-8")
+        (self.src / "pkg" / "sub" / "data.txt").write_text("data", encoding="utf-8")
+        os.symlink("pkg/mod.py", self.src / "link.py")
+
+    def test_auto_never_shares_inodes(self) -> None:
+        mode = gen_tmuxp.link_tree(self.src, self.tmp / "wt")
+        self.assertIn(mode, ("reflink", "copy"))
+        out = self.tmp / "wt" / "pkg" / "mod.py"
+        self.assertEqual(os.stat(self.src / "pkg" / "mod.py").st_nlink, 1)
+        out.write_text("x = 2\n", encoding="utf-8")
+        self.assertEqual((self.src / "pkg" / "mod.py").read_text(encoding="utf-8"), "x = 1\n")
+        self.assertEqual((self.tmp / "wt" / "pkg" / "sub" / "data.txt").read_text(encoding="utf-8"), "data")
+        self.assertEqual(os.readlink(self.tmp / "wt" / "link.py"), "pkg/mod.py")
+
+    def test_hardlink_is_opt_in(self) -> None:
+        self.assertEqual(gen_tmuxp.link_tree(self.src, self.tmp / "wt", "hardlink"), "hardlink")
+        self.assertTrue(os.path.samefile(self.src / "pkg" / "mod.py", self.tmp / "wt" / "pkg" / "mod.py"))
+
+    def test_copy(self) -> None:
+        self.assertEqual(gen_tmuxp.link_tree(self.src, self.tmp / "wt", "copy"), "copy")
+        self.assertFalse(os.path.samefile(self.src / "pkg" / "mod.py", self.tmp / "wt" / "pkg" / "mod.py"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -51,6 +51,15 @@ log_error() {
 # tmux ユーティリティ関数
 # =============================================================================
 
+# tools/arena_tmux.py（tmux control mode）で複数の操作を 1 つの tmux クライアントにまとめる
+arena_tmux() {
+    python3 "$SCRIPT_DIR/arena_tmux.py" "$@"
+}
+
+has_arena_tmux() {
+    command -v python3 >/dev/null 2>&1 && [ -f "$SCRIPT_DIR/arena_tmux.py" ]
+}
+
 # ウィンドウの内容をキャプチャ
 capture_window() {
     local target="$1"
@@ -109,6 +118,13 @@ send_prompt_from_file() {
         return 1
     fi
     
+    # 全行を 1 接続で送る（行毎に tmux を fork しない）
+    if has_arena_tmux; then
+        arena_tmux send-file "$target" "$file" --line-delay "$LINE_SEND_DELAY" --delay "$MESSAGE_SEND_DELAY" >/dev/null || return 1
+        log_ok "プロンプト送信完了: $target"
+        return 0
+    fi
+    
     # ファイルの内容を1行ずつ送信
     while IFS= read -r line || [ -n "$line" ]; do
         send_keys "$target" "$line"
@@ -262,18 +278,30 @@ monitor_agent() {
 monitor_all() {
     local agents=("planner" "comp-A-1" "comp-B-1" "comp-C-1" "qa-gate" "integrator")
     
+    # 全エージェントの capture を 1 接続でまとめて取得（取れなかったウィンドウは印を出して非 0）
+    if has_arena_tmux; then
+        arena_tmux capture -n 10 "${agents[@]/#/$ARENA_SESSION:}" || return 1
+        return 0
+    fi
+    
+    local status=0
     for agent in "${agents[@]}"; do
         local target="$ARENA_SESSION:$agent"
+        echo "=== $agent ==="
         if tmux has-session -t "$target" 2>/dev/null; then
-            echo "=== $agent ==="
             get_last_lines "$target" 10
-            echo ""
+        else
+            echo "[capture failed]"
+            status=1
         fi
+        echo ""
     done
+    return $status
 }
 
 # エクスポート
 export -f log_info log_ok log_warn log_error
+export -f arena_tmux has_arena_tmux
 export -f capture_window get_last_lines send_keys send_command send_message
 export -f send_prompt_from_file start_opencode start_agent wake_agent
 export -f get_status set_status show_all_status count_status
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""tools/arena_async.py
+
+gen_tmuxp.py と scripts/sdk_batch_launcher.py が共有する asyncio 実行コア。
+
+  - サブプロセスは 1 つのイベントループ上で起動し、プロセス全体で共有するセマフォ
+    （configure(limit)）で同時実行数を制限する。ジョブ毎のスレッドは使わない。
+  - 各タスクに timeout（秒）と deadline（呼ぶ度に許容秒数を返す関数）を付けられる。
+    超過・タスクのキャンセル時は独自プロセスグループごと SIGTERM → SIGKILL。
+  - 子プロセスの終了は pidfd（Linux）で待ち、`os.wait4` で rusage も回収する。
+    pidfd が無い環境では WNOHANG ポーリングに落ちる。
+  - 出力は行単位で on_line へ流す（ログ追記向け、メモリに溜めない）か、まとめて capture。
+    input で stdin にバイト列を渡せる。errors="surrogateescape" なら capture は
+    `.encode("utf-8", "surrogateescape")` で元のバイト列に戻せる（`git cat-file --batch` 等）。
+  - Runner.exclusive(name) は全スロットを押さえて他の実行を止める（ベンチマーク用）。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import contextvars
+import os
+import signal
+import subprocess
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import arena_trace
+
+READ_CHUNK = 65536
+# exclusive() の区間内（とその子タスク）で True。セマフォを素通りする
+_EXCLUSIVE: "contextvars.ContextVar[bool]" = contextvars.ContextVar("arena_exclusive", default=False)
+
+
+@dataclass
+class ProcResult:
+    """subprocess.CompletedProcess 互換（args/returncode/stdout/stderr）+ 実行情報。"""
+
+    args: List[str]
+    returncode: Optional[int]
+    stdout: str = ""
+    stderr: str = ""
+    elapsed: float = 0.0
+    timed_out: bool = False
+    cancelled: bool = False
+    rusage: Any = None
+
+    def check_returncode(self) -> None:
+        if self.returncode != 0:
+            raise subprocess.CalledProcessError(self.returncode if self.returncode is not None else -1, self.args, self.stdout, self.stderr)
+
+
+async def wait_pid(pid: int) -> Tuple[int, Any]:
+    """子プロセスの終了を待って (wait status, rusage) を返す。"""
+    fd: Optional[int] = None
+    if hasattr(os, "pidfd_open"):
+        try:
+            fd = os.pidfd_open(pid)
+        except OSError:
+            fd = None
+    if fd is not None:
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+        loop.add_reader(fd, lambda: ready.done() or ready.set_result(None))
+        try:
+            await ready
+        finally:
+            loop.remove_reader(fd)
+            os.close(fd)
+        _, status, ru = os.wait4(pid, 0)
+        return status, ru
+    delay = 0.005
+    while True:
+        got, status, ru = os.wait4(pid, os.WNOHANG)
+        if got:
+            return status, ru
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 0.1)
+
+
+async def kill_group(pgid: int, grace_sec: float = 3.0) -> None:
+    """プロセスグループ全体へ SIGTERM、grace_sec 後も残っていれば SIGKILL。"""
+    try:
+        os.killpg(pgid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    end = time.monotonic() + grace_sec
+    while time.monotonic() < end:
+        try:
+            os.killpg(pgid, 0)
+        except ProcessLookupError:
+            return
+        await asyncio.sleep(0.1)
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+async def _pump(pipe: Any, sink: List[str], on_line: Optional[Callable[[str], None]], errors: str = "replace") -> None:
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=READ_CHUNK * 4)
+    transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), pipe)
+    buf = b""
+    try:
+        while True:
+            data = await reader.read(READ_CHUNK)
+            if not data:
+                break
+            if on_line is None:
+                sink.append(data.decode("utf-8", errors=errors))
+                continue
+            buf += data
+            *lines, buf = buf.split(b"\n")
+            for raw in lines:
+                on_line(raw.decode("utf-8", errors="replace") + "\n")
+        if buf and on_line is not None:
+            on_line(buf.decode("utf-8", errors="replace"))
+    finally:
+        transport.close()
+
+
+def _feed(pipe: Any, data: bytes) -> None:
+    """stdin へ data を書いて閉じる（to_thread で呼ぶ。子が先に終了した場合の EPIPE は無視）。"""
+    try:
+        pipe.write(data)
+    except (BrokenPipeError, ValueError):
+        pass
+    finally:
+        try:
+            pipe.close()
+        except (BrokenPipeError, OSError):
+            pass
+
+
+class Runner:
+    """セマフォで同時実行数を絞る非同期サブプロセス実行器。
+
+    セマフォ/ロックは実行中のイベントループに紐づくので、ループが変わったら作り直す
+    （sync 側から asyncio.run() を何度呼んでも同じ Runner を使い回せる）。
+    """
+
+    def __init__(self, limit: int = 0):
+        self.limit = limit or max(4, (os.cpu_count() or 1) * 2)
+        self.spawned = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _bind(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._sem is None or self._loop is not loop:
+            self._loop = loop
+            self._sem = asyncio.Semaphore(self.limit)
+            self._locks = {}
+        return self._sem
+
+    def lock(self, name: str) -> asyncio.Lock:
+        """名前付きの排他区間（同じ名前の区間同士だけを直列化する）。"""
+        self._bind()
+        return self._locks.setdefault(name, asyncio.Lock())
+
+    @contextlib.asynccontextmanager
+    async def exclusive(self, name: str) -> Any:
+        """セマフォの全スロットを押さえ、実行中の他のプロセスが終わってから区間に入る。
+
+        区間内では他のタスクの run() は待たされ、この区間（のタスク）の run() だけが走る
+        （静かなマシンが必要なベンチマーク用）。同じ name の区間同士は lock(name) で直列化。
+        """
+        sem = self._bind()
+        async with self.lock(name):
+            taken = 0
+            try:
+                for _ in range(self.limit):
+                    await sem.acquire()
+                    taken += 1
+                token = _EXCLUSIVE.set(True)
+                try:
+                    yield
+                finally:
+                    _EXCLUSIVE.reset(token)
+            finally:
+                for _ in range(taken):
+                    sem.release()
+
+    async def run(self, cmd: Sequence[str], cwd: Union[str, Path, None] = None, env: Optional[Dict[str, str]] = None, timeout: Optional[float] = None, deadline: Optional[Callable[[], Optional[float]]] = None, on_line: Optional[Callable[[str], None]] = None, merge_stderr: bool = False, grace_sec: float = 3.0, check: bool = False, input: Optional[bytes] = None, errors: str = "replace") -> ProcResult:
+        """cmd を実行して ProcResult を返す。timeout/deadline 超過は例外ではなくフラグで返す。
+
+        on_line を渡すと stdout は行毎にコールバックされ、ProcResult.stdout には残らない。
+        タスク自体がキャンセルされた場合はプロセスグループを kill してから CancelledError を再送出する。
+        """
+        queued = time.monotonic()
+        sem = None if _EXCLUSIVE.get() else self._bind()
+        if sem is not None:
+            await sem.acquire()
+        try:
+            with arena_trace.span("exec", cat="proc", cmd=" ".join(list(cmd)[:3]), wait_ms=round((time.monotonic() - queued) * 1000, 1)) as attrs:
+                res = await self._run(list(cmd), cwd, env, timeout, deadline, on_line, merge_stderr, grace_sec, input, errors)
+                attrs["rc"] = res.returncode
+        finally:
+            if sem is not None:
+                sem.release()
+        if check:
+            res.check_returncode()
+        return res
+
+    async def _run(self, cmd: List[str], cwd: Union[str, Path, None], env: Optional[Dict[str, str]], timeout: Optional[float], deadline: Optional[Callable[[], Optional[float]]], on_line: Optional[Callable[[str], None]], merge_stderr: bool, grace_sec: float, input: Optional[bytes] = None, errors: str = "replace") -> ProcResult:
+        start = time.monotonic()
+        proc = subprocess.Popen(cmd, cwd=str(cwd) if cwd is not None else None, env=env, stdin=subprocess.DEVNULL if input is None else subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT if merge_stderr else subprocess.PIPE, start_new_session=True)
+        self.spawned += 1
+        out: List[str] = []
+        err: List[str] = []
+        readers = [asyncio.ensure_future(_pump(proc.stdout, out, on_line, errors))]
+        if input is not None:
+            readers.append(asyncio.ensure_future(asyncio.to_thread(_feed, proc.stdin, input)))
+        if not merge_stderr:
+            readers.append(asyncio.ensure_future(_pump(proc.stderr, err, None)))
+        waiter = asyncio.ensure_future(wait_pid(proc.pid))
+        timed_out = cancelled = False
+        try:
+            while not waiter.done():
+                tick = 0.25 if deadline else None
+                if timeout is not None:
+                    left = timeout - (time.monotonic() - start)
+                    if left <= 0:
+                        timed_out = True
+                        break
+                    tick = left if tick is None else min(tick, left)
+                await asyncio.wait({waiter}, timeout=tick)
+                limit = deadline() if deadline and not waiter.done() else None
+                if limit is not None and time.monotonic() - start > limit:
+                    cancelled = True
+                    break
+            if timed_out or cancelled:
+                await kill_group(proc.pid, grace_sec)
+            status, ru = await waiter
+        except asyncio.CancelledError:
+            await asyncio.shield(self._abort(proc, waiter, readers, grace_sec))
+            raise
+        try:
+            await asyncio.wait_for(asyncio.gather(*readers), timeout=2.0 if (timed_out or cancelled) else None)
+        except asyncio.TimeoutError:
+            pass
+        rc = os.waitstatus_to_exitcode(status)
+        proc.returncode = rc
+        return ProcResult(args=cmd, returncode=rc, stdout="".join(out), stderr="".join(err), elapsed=time.monotonic() - start, timed_out=timed_out, cancelled=cancelled and not timed_out, rusage=ru)
+
+    async def _abort(self, proc: subprocess.Popen, waiter: "asyncio.Future[Tuple[int, Any]]", readers: List["asyncio.Future[None]"], grace_sec: float) -> None:
+        await kill_group(proc.pid, grace_sec)
+        try:
+            status, _ = await waiter
+            proc.returncode = os.waitstatus_to_exitcode(status)
+        except asyncio.CancelledError:
+            pass
+        for r in readers:
+            r.cancel()
+
+
+_RUNNER = Runner()
+
+
+def runner() -> Runner:
+    return _RUNNER
+
+
+def configure(limit: int) -> Runner:
+    """プロセス全体の同時実行上限を設定する（既定: max(4, CPU数*2)）。"""
+    _RUNNER.limit = max(1, int(limit))
+    _RUNNER._sem = None
+    return _RUNNER
+
+
+async def run(cmd: Sequence[str], cwd: Union[str, Path, None] = None, **kwargs: Any) -> ProcResult:
+    return await _RUNNER.run(cmd, cwd, **kwargs)
+
+
+def run_sync(cmd: Sequence[str], cwd: Union[str, Path, None] = None, **kwargs: Any) -> ProcResult:
+    """イベントループ外（sync なコード）から 1 コマンドだけ実行する。"""
+    return asyncio.run(_RUNNER.run(cmd, cwd, **kwargs))
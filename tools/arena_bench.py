@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""tools/arena_bench.py
+
+arena オーケストレータ自体（gen_tmuxp.py）のスケーラビリティ・ベンチマーク。
+
+  - 合成 Git リポジトリ（ファイル数・履歴長を指定、`git fast-import` で一括生成）を作り、
+    N = 3..150 チームを generate → 各チームに台本どおりのコミット → gate → rank → integrate
+    と流して、サブコマンド毎に以下を計測する:
+      wall_sec / cpu_sec / peak_rss_kb : 子プロセスツリーの wall-clock・CPU 時間・最大 RSS（wait4 の rusage）
+      tasks_spawned                   : 実行中に作られたプロセス/スレッド数（/proc/sys/kernel/ns_last_pid の差分）
+      traced_execs                    : `--trace` で記録された exec スパン数（gen_tmuxp 経由の子プロセス）
+      time_to_first_winner_sec        : 各トラックで最初の pass が出るまでの秒数（gate のみ）
+  - ゲートは偽物（`.bench/gate.sh`）。所要時間（--gate-sec ± --gate-jitter）と失敗率（--fail-rate）は
+    チーム毎に seed から決めてコミットに焼き込むので、同じ引数なら何度回しても同じ負荷になる。
+  - 結果は JSON（--out）。`--compare old.json` で前回結果との比を表示し、wall が
+    --tolerance を超えて悪化した組み合わせがあれば終了コード 1（バージョン間の回帰検出用）。
+
+例:
+  python3 tools/arena_bench.py --teams 3,15,60,150 --files 2000 --history 100 --gate-sec 0.5 --fail-rate 0.2 --out bench.json
+  python3 tools/arena_bench.py --teams 3,15,60,150 --compare bench.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import arena_async
+
+TOOLS_DIR = Path(__file__).resolve().parent
+GEN_TMUXP = TOOLS_DIR / "gen_tmuxp.py"
+SUBCOMMANDS = ("generate", "gate", "rank", "integrate")
+TRACKS = ("A", "B", "C")
+
+GATE_SH = """#!/bin/sh
+# arena_bench の偽ゲート: .bench/teams/<branch> の 1 行目の秒数だけ眠り、2 行目が fail なら失敗する。
+f=".bench/teams/$(git rev-parse --abbrev-ref HEAD | tr / _)"
+sec=$(sed -n 1p "$f" 2>/dev/null)
+sleep "${sec:-%(default_sec)s}"
+[ "$(sed -n 2p "$f" 2>/dev/null)" != fail ]
+"""
+
+
+def now_iso() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S%z")
+
+
+def last_pid() -> Optional[int]:
+    try:
+        return int(Path("/proc/sys/kernel/ns_last_pid").read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def pid_max() -> int:
+    try:
+        return int(Path("/proc/sys/kernel/pid_max").read_text())
+    except (OSError, ValueError):
+        return 32768
+
+
+def git(args: List[str], cwd: Path, stdin: Optional[bytes] = None) -> str:
+    cp = subprocess.run(["git"] + args, cwd=str(cwd), input=stdin, capture_output=True, check=True)
+    return cp.stdout.decode("utf-8", errors="replace").strip()
+
+
+def tool_version() -> Dict[str, Any]:
+    try:
+        commit = git(["rev-parse", "HEAD"], TOOLS_DIR)
+        dirty = bool(git(["status", "--porcelain", "--", "."], TOOLS_DIR))
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": dirty}
+
+
+def split_teams(n: int) -> Dict[str, int]:
+    return {key: n // len(TRACKS) + (1 if i < n % len(TRACKS) else 0) for i, key in enumerate(TRACKS)}
+
+
+def build_repo(root: Path, files: int, history: int, gate_sec: float, rng: random.Random) -> None:
+    """files 個のファイルと history 個のコミットを持つ main ブランチを fast-import で作る。"""
+    root.mkdir(parents=True)
+    git(["init", "-q", "-b", "main"], root)
+    git(["config", "user.email", "bench@example.invalid"], root)
+    git(["config", "user.name", "arena-bench"], root)
+    paths = [f"src/d{i // 100:03d}/f{i:05d}.txt" for i in range(files)]
+    chunks: List[bytes] = []
+
+    def data(payload: str) -> None:
+        raw = payload.encode("utf-8")
+        chunks.append(f"data {len(raw)}\n".encode("utf-8") + raw + b"\n")
+
+    when = 1_700_000_000
+    for c in range(max(1, history)):
+        chunks.append(f"commit refs/heads/main\nmark :{c + 1}\ncommitter arena-bench <bench@example.invalid> {when + c * 60} +0000\n".encode("utf-8"))
+        data(f"bench commit {c}\n")
+        if c == 0:
+            for i, p in enumerate(paths):
+                chunks.append(f"M 100644 inline {p}\n".encode("utf-8"))
+                data(f"file {i}\n{rng.getrandbits(64):016x}\n")
+            chunks.append(b"M 100755 inline .bench/gate.sh\n")
+            data(GATE_SH % {"default_sec": f"{gate_sec:g}"})
+            continue
+        chunks.append(f"from :{c}\n".encode("utf-8"))
+        for p in rng.sample(paths, min(3, len(paths))):
+            chunks.append(f"M 100644 inline {p}\n".encode("utf-8"))
+            data(f"{p}\nrev {c} {rng.getrandbits(64):016x}\n")
+    git(["fast-import", "--quiet"], root, stdin=b"".join(chunks))
+    git(["reset", "-q", "--hard", "main"], root)
+
+
+async def commit_team(wt: Path, tid: str, commits: int, sec: float, fail: bool) -> None:
+    """チーム worktree に台本どおりのコミットを積む（チーム固有ファイルだけを触るので統合は衝突しない）。"""
+    branch_file = wt / ".bench" / "teams" / f"arena_{tid}"
+    for k in range(commits):
+        (wt / "teams" / tid).mkdir(parents=True, exist_ok=True)
+        (wt / "teams" / tid / f"change-{k}.txt").write_text(f"{tid} change {k}\n", encoding="utf-8")
+        branch_file.parent.mkdir(parents=True, exist_ok=True)
+        branch_file.write_text(f"{sec:.3f}\n{'fail' if fail else 'pass'}\n", encoding="utf-8")
+        await arena_async.run(["git", "add", "-A", "teams", ".bench/teams"], wt, check=True)
+        await arena_async.run(["git", "-c", "user.email=bench@example.invalid", "-c", "user.name=arena-bench", "commit", "-q", "-m", f"{tid}: change {k}"], wt, check=True)
+
+
+def script_commits(repo: Path, counts: Dict[str, int], commits: int, gate_sec: float, jitter: float, fail_rate: float, rng: random.Random) -> Dict[str, Any]:
+    plan: Dict[str, Tuple[float, bool]] = {}
+    for key in TRACKS:
+        for i in range(1, counts[key] + 1):
+            tid = f"{key}{i:02d}"
+            plan[tid] = (max(0.0, gate_sec * (1 + rng.uniform(-jitter, jitter))), rng.random() < fail_rate)
+
+    async def run_all() -> None:
+        await asyncio.gather(*(commit_team(repo / "worktrees" / tid, tid, commits, sec, fail) for tid, (sec, fail) in plan.items()))
+
+    start = time.monotonic()
+    asyncio.run(run_all())
+    return {"wall_sec": round(time.monotonic() - start, 3), "failing_teams": sorted(t for t, (_, fail) in plan.items() if fail)}
+
+
+def trace_stats(path: Path, sub: str) -> Dict[str, Any]:
+    try:
+        events = [e for e in json.loads(path.read_text(encoding="utf-8"))["traceEvents"] if e.get("ph") == "X"]
+    except (OSError, ValueError, KeyError):
+        return {"traced_execs": None, "time_to_first_winner_sec": None}
+    roots = [e for e in events if e["name"] == sub and e["args"].get("parent_id") is None]
+    t0 = roots[0]["ts"] if roots else min((e["ts"] for e in events), default=0.0)
+    first: Dict[str, float] = {}
+    for e in events:
+        args = e["args"]
+        if e["name"] == "gate.team" and args.get("status") == "pass":
+            end = (e["ts"] + e["dur"] - t0) / 1e6
+            track = str(args.get("track"))
+            first[track] = round(min(end, first.get(track, end)), 3)
+    return {"traced_execs": sum(1 for e in events if e["name"] == "exec"), "time_to_first_winner_sec": first or None}
+
+
+def measure(repo: Path, sub: str, args: List[str], log_path: Path, timeout: float) -> Dict[str, Any]:
+    trace = log_path.parent / f"trace-{sub}.json"
+    cmd = [sys.executable, str(GEN_TMUXP), sub] + args + ["--trace", str(trace), "--trace-top", "0"]
+    before = last_pid()
+    with log_path.open("a", encoding="utf-8") as log:
+        log.write(f"\n$ {' '.join(cmd)}\n")
+        res = arena_async.run_sync(cmd, repo, timeout=timeout, on_line=log.write, merge_stderr=True)
+    after = last_pid()
+    tasks = None
+    if before is not None and after is not None:
+        tasks = (after - before - 1) % pid_max()
+    ru = res.rusage
+    out: Dict[str, Any] = {
+        "subcommand": sub,
+        "exit_code": res.returncode,
+        "timed_out": res.timed_out,
+        "wall_sec": round(res.elapsed, 3),
+        "cpu_sec": round(ru.ru_utime + ru.ru_stime, 3) if ru else None,
+        "peak_rss_kb": int(ru.ru_maxrss) if ru else None,
+        "tasks_spawned": tasks,
+    }
+    out.update(trace_stats(trace, sub))
+    return out
+
+
+def bench_one(n: int, opts: argparse.Namespace, workdir: Path) -> Dict[str, Any]:
+    rng = random.Random(f"{opts.seed}:{n}")
+    repo = workdir / f"n{n:03d}" / "repo"
+    log_path = workdir / f"n{n:03d}" / "arena.log"
+    t = time.monotonic()
+    build_repo(repo, opts.files, opts.history, opts.gate_sec, rng)
+    setup = {"repo_sec": round(time.monotonic() - t, 3)}
+    counts = split_teams(n)
+    sub_args = {
+        "generate": ["--nA", str(counts["A"]), "--nB", str(counts["B"]), "--nC", str(counts["C"]), "--base-ref", "main", "--gate-cmd", "sh .bench/gate.sh", "--gate-timeout", str(int(opts.timeout))],
+        "gate": ["--jobs", str(opts.jobs)],
+        "rank": [],
+        "integrate": ["--reset", "--final-gate"],
+    }
+    results: List[Dict[str, Any]] = []
+    for sub in SUBCOMMANDS:
+        r = measure(repo, sub, sub_args[sub], log_path, opts.timeout)
+        if sub in opts.subcommands:
+            results.append(dict(r, teams=n))
+            ttfw = r.get("time_to_first_winner_sec")
+            ttfw_str = f", first winner {min(ttfw.values()):0.2f}s" if ttfw else ""
+            print(f"[bench] N={n:<3} {sub:<9} rc={r['exit_code']} wall {r['wall_sec']:8.2f}s cpu {r['cpu_sec'] or 0:7.2f}s rss {(r['peak_rss_kb'] or 0) // 1024:4d}MB tasks {r['tasks_spawned'] if r['tasks_spawned'] is not None else '-'}{ttfw_str}")
+        if sub == "generate":
+            if r["exit_code"] != 0:
+                print(f"[bench] N={n}: generate failed (see {log_path})")
+                break
+            setup.update(script_commits(repo, counts, opts.commits, opts.gate_sec, opts.gate_jitter, opts.fail_rate, rng))
+    return {"teams": n, "tracks": counts, "setup": setup, "results": results}
+
+
+def compare(current: Dict[str, Any], baseline_path: Path, tolerance: float) -> int:
+    base = json.loads(baseline_path.read_text(encoding="utf-8"))
+    old = {(r["teams"], r["subcommand"]): r for run in base.get("runs", []) for r in run["results"]}
+    regressions = 0
+    print(f"[bench] compare with {baseline_path} ({(base.get('version') or {}).get('commit') or '?'}):")
+    for run in current["runs"]:
+        for r in run["results"]:
+            o = old.get((r["teams"], r["subcommand"]))
+            if not o or not o.get("wall_sec"):
+                continue
+            ratio = r["wall_sec"] / o["wall_sec"]
+            worse = ratio > 1 + tolerance and r["wall_sec"] - o["wall_sec"] > 0.2
+            regressions += 1 if worse else 0
+            tasks = f"tasks {o.get('tasks_spawned')}→{r.get('tasks_spawned')}" if o.get("tasks_spawned") is not None else ""
+            print(f"  N={r['teams']:<3} {r['subcommand']:<9} wall {o['wall_sec']:8.2f}s → {r['wall_sec']:8.2f}s (x{ratio:0.2f}) {tasks}{'  REGRESSION' if worse else ''}")
+    return 1 if regressions else 0
+
+
+def parse_teams(spec: str) -> List[int]:
+    teams = sorted({int(x) for x in spec.split(",") if x.strip()})
+    if not teams or teams[0] < 3 or teams[-1] > 150:
+        raise argparse.ArgumentTypeError("team counts must be within 3..150")
+    return teams
+
+
+def main(argv: List[str]) -> int:
+    p = argparse.ArgumentParser(description="scalability benchmark for tools/gen_tmuxp.py")
+    p.add_argument("--teams", type=parse_teams, default=parse_teams("3,15,60,150"), help="comma separated team counts (3..150), split across tracks A/B/C")
+    p.add_argument("--files", type=int, default=1000, help="files in the synthetic repo")
+    p.add_argument("--history", type=int, default=50, help="commits on the synthetic base branch")
+    p.add_argument("--commits", type=int, default=1, help="scripted commits per team before gating")
+    p.add_argument("--gate-sec", type=float, default=0.5, help="fake gate duration per team")
+    p.add_argument("--gate-jitter", type=float, default=0.5, help="relative +/- jitter of the fake gate duration")
+    p.add_argument("--fail-rate", type=float, default=0.2, help="fraction of teams whose fake gate fails")
+    p.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1, help="gate --jobs")
+    p.add_argument("--subcommands", default=",".join(SUBCOMMANDS), help="subcommands to report (the whole chain always runs so later steps see real state)")
+    p.add_argument("--timeout", type=float, default=1800, help="per-subcommand timeout in seconds")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--workdir", default=None, help="where synthetic repos are built (default: temp dir)")
+    p.add_argument("--keep", action="store_true", help="keep synthetic repos, logs and traces")
+    p.add_argument("--out", default="arena-bench.json")
+    p.add_argument("--compare", default=None, metavar="OLD.json", help="compare wall times with a previous result")
+    p.add_argument("--tolerance", type=float, default=0.2, help="allowed wall-time slowdown ratio before flagging a regression")
+    opts = p.parse_args(argv)
+    opts.subcommands = {s.strip() for s in opts.subcommands.split(",") if s.strip()}
+    unknown = opts.subcommands - set(SUBCOMMANDS)
+    if unknown:
+        p.error(f"unknown subcommands: {', '.join(sorted(unknown))}")
+    if shutil.which("git") is None:
+        print("[bench] ERROR: git not found", file=sys.stderr)
+        return 2
+
+    workdir = Path(opts.workdir).resolve() if opts.workdir else Path(tempfile.mkdtemp(prefix="arena-bench-"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    params = {k: v for k, v in vars(opts).items() if k not in ("out", "compare", "workdir", "keep")}
+    params["subcommands"] = sorted(opts.subcommands)
+    report: Dict[str, Any] = {
+        "timestamp": now_iso(),
+        "version": tool_version(),
+        "host": {"python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count()},
+        "params": params,
+        "runs": [],
+    }
+    print(f"[bench] workdir {workdir}")
+    try:
+        for n in opts.teams:
+            report["runs"].append(bench_one(n, opts, workdir))
+    finally:
+        if not opts.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+        out = Path(opts.out).resolve()
+        tmp = out.with_name(f".{out.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, out)
+        print(f"[bench] wrote {out}")
+    if opts.compare:
+        return compare(report, Path(opts.compare), opts.tolerance)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
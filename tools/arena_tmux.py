@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""tools/arena_tmux.py
+
+tmux の control mode（`tmux -C`）ドライバ。scripts/sdk_batch_launcher.py と tools/arena-utils.sh 共通。
+
+  - 1 本の `tmux -C` クライアント接続を開いたまま、コマンドを行単位で書き込んでパイプライン実行する。
+    応答は `%begin`/`%end`（失敗時 `%error`）のブロックとして送った順に返るので FIFO で対応付ける。
+    コマンド毎に tmux クライアントを fork しない（50 プロジェクト起動でも tmux プロセスは 1 つ）。
+  - ブロック外の `%window-add` / `%sessions-changed` / `%exit` などの通知はパースして
+    on_notification へ渡す。ペイン出力（`%output`）は既定で止める（`refresh-client -f no-output`）。
+  - 引数は tmux のコマンドパーサ向けにクォートする（二重引用符 + `\\` `"` `$` 改行のエスケープ）。
+
+CLI（シェルからの監視・送信用。複数ターゲットを 1 接続でまとめて処理する）:
+  python3 tools/arena_tmux.py capture arena:planner arena:qa-gate -n 20
+  python3 tools/arena_tmux.py send arena:planner "続行してください"
+  python3 tools/arena_tmux.py send-file arena:comp-A-1 prompt.txt --line-delay 0.1
+  python3 tools/arena_tmux.py windows arena
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import collections
+import os
+import re
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Deque, List, Optional, Sequence, Tuple, Union
+
+import arena_trace
+
+PLACEHOLDER_WINDOW = "__arena_ctl__"
+REPLY_TIMEOUT_SEC = 10.0
+
+_SAFE_ARG = re.compile(r"[A-Za-z0-9_@%+=:,./-]+")
+_OCTAL = re.compile(r"\\([0-7]{3})")
+
+
+class TmuxError(RuntimeError):
+    """tmux がコマンドに `%error` を返した、または control クライアントが終了した。"""
+
+
+@dataclass
+class Reply:
+    command: str
+    ok: bool
+    lines: List[str] = field(default_factory=list)
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.lines)
+
+
+def quote(arg: str) -> str:
+    """tmux コマンドパーサ向けのクォート（control mode は 1 行 1 コマンドなので改行もエスケープ）。"""
+    if _SAFE_ARG.fullmatch(arg):
+        return arg
+    esc = arg.replace("\\", "\\\\").replace('"', '\\"').replace("$", "\\$").replace("\n", "\\n").replace("\r", "\\r").replace("\t", "\\t")
+    return f'"{esc}"'
+
+
+def command_line(args: Sequence[str]) -> str:
+    return " ".join(quote(str(a)) for a in args)
+
+
+def unescape_output(data: str) -> str:
+    """`%output` の値（非表示文字と `\\` は 8 進エスケープされている）を戻す。"""
+    return _OCTAL.sub(lambda m: chr(int(m.group(1), 8)), data)
+
+
+class TmuxControl:
+    """`tmux -C` 1 接続の上で tmux コマンドを実行するクライアント。
+
+    create=True なら `new-session -A`（無ければ作る、あれば attach）、False なら既存セッションへ attach。
+    新規作成時はプレースホルダのウィンドウが 1 つできるので、ウィンドウを作り終えたら
+    drop_placeholder() で消す。
+    """
+
+    def __init__(self, session: str, create: bool = True, start_dir: Union[str, Path, None] = None, socket_name: Optional[str] = None, on_notification: Optional[Callable[[str, List[str]], None]] = None, pane_output: bool = False):
+        self.session = session
+        self.create = create
+        self.start_dir = start_dir
+        self.socket_name = socket_name
+        self.on_notification = on_notification
+        self.pane_output = pane_output
+        self.notifications = 0
+        self.commands = 0
+        self._proc: Optional[asyncio.subprocess.Process] = None
+        self._pending: Deque[Tuple[str, "asyncio.Future[Reply]"]] = collections.deque()
+        self._reader: Optional["asyncio.Task[None]"] = None
+        self._closed: Optional[str] = None
+        self._attached: Optional["asyncio.Future[Reply]"] = None
+
+    async def __aenter__(self) -> "TmuxControl":
+        return await self.connect()
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.close()
+
+    def _base(self) -> List[str]:
+        return ["tmux"] + (["-L", self.socket_name] if self.socket_name else [])
+
+    async def connect(self) -> "TmuxControl":
+        if self.create:
+            attach = ["new-session", "-A", "-s", self.session, "-n", PLACEHOLDER_WINDOW] + (["-c", str(self.start_dir)] if self.start_dir else [])
+        else:
+            attach = ["attach-session", "-t", self.session]
+        with arena_trace.span("tmux.connect", cat="tmux", session=self.session):
+            self._proc = await asyncio.create_subprocess_exec(*self._base(), "-C", *attach, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL, start_new_session=True, limit=1 << 20)
+            assert self._proc.stdout is not None
+            self._attached = asyncio.get_running_loop().create_future()
+            self._reader = asyncio.ensure_future(self._read_loop(self._proc.stdout))
+            try:
+                # コマンドラインの attach / new-session の応答（flags 0）を待ってから送る。
+                # 先に送ったコマンドは attach 前に実行され、失敗しても別セッション相手に応答が返る
+                attached = await asyncio.wait_for(self._attached, REPLY_TIMEOUT_SEC)
+                if not attached.ok:
+                    raise TmuxError(attached.text or "error")
+                if not self.pane_output:
+                    # tmux < 3.2 は -f を知らないが、その場合は %output を読み捨てるだけ
+                    await self.command("refresh-client", "-f", "no-output", check=False)
+                else:
+                    await self.command("display-message", "-p", "")
+            except (TmuxError, asyncio.TimeoutError):
+                await self.close()
+                raise TmuxError(f"cannot {'create or attach' if self.create else 'attach'} tmux session: {self.session}") from None
+        return self
+
+    async def _read_loop(self, stdout: asyncio.StreamReader) -> None:
+        block: Optional[Tuple[str, List[str]]] = None
+        try:
+            while True:
+                raw = await stdout.readline()
+                if not raw:
+                    break
+                line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+                if block is not None:
+                    if line.startswith(("%end ", "%error ")) and line.split(" ")[2:3] == [block[0]]:
+                        flags = line.split(" ")[3] if len(line.split(" ")) > 3 else "0"
+                        if flags != "0" and self._pending:
+                            cmd, fut = self._pending.popleft()
+                            if not fut.done():
+                                fut.set_result(Reply(cmd, line.startswith("%end "), block[1]))
+                        elif flags == "0" and self._attached is not None and not self._attached.done():
+                            self._attached.set_result(Reply("attach", line.startswith("%end "), block[1]))
+                        block = None
+                    else:
+                        block[1].append(line)
+                    continue
+                if line.startswith("%begin "):
+                    block = (line.split(" ")[2], [])
+                    continue
+                if line.startswith("%"):
+                    name, _, rest = line[1:].partition(" ")
+                    self.notifications += 1
+                    if name == "exit":
+                        self._closed = rest or "exit"
+                    if self.on_notification:
+                        args = rest.split(" ", 1) if name == "output" else rest.split(" ") if rest else []
+                        if name == "output" and len(args) == 2:
+                            args[1] = unescape_output(args[1])
+                        self.on_notification(name, args)
+        finally:
+            self._closed = self._closed or "eof"
+            if self._attached is not None and not self._attached.done():
+                self._attached.set_exception(TmuxError(f"tmux control client closed ({self._closed}) before attach"))
+            while self._pending:
+                cmd, fut = self._pending.popleft()
+                if not fut.done():
+                    fut.set_exception(TmuxError(f"tmux control client closed ({self._closed}) before reply to: {cmd}"))
+
+    def _send(self, args: Sequence[str]) -> "asyncio.Future[Reply]":
+        if self._proc is None or self._proc.stdin is None:
+            raise TmuxError("tmux control client not connected")
+        if self._closed:
+            raise TmuxError(f"tmux control client closed ({self._closed})")
+        line = command_line(args)
+        fut: "asyncio.Future[Reply]" = asyncio.get_running_loop().create_future()
+        self._pending.append((line, fut))
+        self._proc.stdin.write(line.encode("utf-8") + b"\n")
+        self.commands += 1
+        return fut
+
+    async def _wait(self, futs: List["asyncio.Future[Reply]"], check: bool, timeout: float) -> List[Reply]:
+        assert self._proc is not None and self._proc.stdin is not None
+        await self._proc.stdin.drain()
+        replies = list(await asyncio.wait_for(asyncio.gather(*futs), timeout))
+        if check:
+            for r in replies:
+                if not r.ok:
+                    raise TmuxError(f"{r.command}: {r.text or 'error'}")
+        return replies
+
+    async def command(self, *args: str, check: bool = True, timeout: float = REPLY_TIMEOUT_SEC) -> Reply:
+        with arena_trace.span("tmux", cat="tmux", cmd=str(args[0]) if args else ""):
+            return (await self._wait([self._send(args)], check, timeout))[0]
+
+    async def pipeline(self, commands: Sequence[Sequence[str]], check: bool = True, timeout: float = REPLY_TIMEOUT_SEC) -> List[Reply]:
+        """複数コマンドをまとめて書き込み、応答を順に返す（往復 1 回分の待ち）。"""
+        with arena_trace.span("tmux.pipeline", cat="tmux", commands=len(commands)):
+            return await self._wait([self._send(c) for c in commands], check, timeout)
+
+    async def close(self) -> None:
+        if self._proc is None:
+            return
+        proc, self._proc = self._proc, None
+        if proc.stdin is not None and not proc.stdin.is_closing():
+            proc.stdin.close()
+        try:
+            await asyncio.wait_for(proc.wait(), 5.0)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+        if self._reader is not None:
+            await self._reader
+
+    # --- よく使うコマンド -------------------------------------------------
+
+    async def has_session(self, session: str) -> bool:
+        return (await self.command("has-session", "-t", session, check=False)).ok
+
+    async def list_windows(self, session: Optional[str] = None) -> List[str]:
+        reply = await self.command("list-windows", "-t", session or self.session, "-F", "#{window_name}")
+        return reply.lines
+
+    def new_window_args(self, name: str, cwd: Union[str, Path, None] = None, env: Optional[dict] = None, session: Optional[str] = None) -> List[str]:
+        """デタッチ状態でウィンドウを作り window id（`@N`）を出力する new-window（pipeline 用）。"""
+        args = ["new-window", "-d", "-P", "-F", "#{window_id}", "-t", f"{session or self.session}:", "-n", name]
+        if cwd is not None:
+            args += ["-c", str(cwd)]
+        for k, v in (env or {}).items():
+            args += ["-e", f"{k}={v}"]
+        return args
+
+    async def new_window(self, name: str, cwd: Union[str, Path, None] = None, env: Optional[dict] = None, session: Optional[str] = None) -> str:
+        return (await self.command(*self.new_window_args(name, cwd, env, session))).text.strip()
+
+    async def send_keys(self, target: str, *keys: str, literal: bool = False) -> Reply:
+        return await self.command("send-keys", "-t", target, *(["-l"] if literal else []), "--", *keys)
+
+    async def send_line(self, target: str, text: str, enter_delay: float = 0.0) -> None:
+        """text をそのまま入力して Enter（TUI が入力を拾うまで enter_delay 秒待つ）。"""
+        if enter_delay > 0:
+            await self.send_keys(target, text, literal=True)
+            await asyncio.sleep(enter_delay)
+            await self.send_keys(target, "Enter")
+        else:
+            await self.pipeline([["send-keys", "-t", target, "-l", "--", text], ["send-keys", "-t", target, "Enter"]])
+
+    async def capture(self, target: str, lines: int = 50) -> Optional[str]:
+        reply = await self.command("capture-pane", "-p", "-t", target, "-S", f"-{lines}", check=False)
+        return reply.text if reply.ok else None
+
+    async def capture_many(self, targets: Sequence[str], lines: int = 50) -> List[Optional[str]]:
+        replies = await self.pipeline([["capture-pane", "-p", "-t", t, "-S", f"-{lines}"] for t in targets], check=False)
+        return [r.text if r.ok else None for r in replies]
+
+    async def drop_placeholder(self, session: Optional[str] = None) -> None:
+        """connect() が作ったプレースホルダのウィンドウを、他にウィンドウがあれば消す。"""
+        names = await self.list_windows(session)
+        if PLACEHOLDER_WINDOW in names and len(names) > 1:
+            await self.command("kill-window", "-t", f"{session or self.session}:{PLACEHOLDER_WINDOW}", check=False)
+
+
+def session_of(target: str) -> str:
+    return target.split(":", 1)[0] or os.environ.get("ARENA_SESSION", "arena")
+
+
+def last_lines(text: str, n: int) -> str:
+    lines = text.rstrip("\n").split("\n")
+    return "\n".join(lines[-n:])
+
+
+async def cli(args: argparse.Namespace) -> int:
+    session = args.session if args.cmd == "windows" else session_of(args.target[0] if args.cmd == "capture" else args.target)
+    try:
+        async with TmuxControl(session, create=False, socket_name=args.socket) as tmux:
+            if args.cmd == "capture":
+                outputs = await tmux.capture_many(args.target, args.lines)
+                for target, text in zip(args.target, outputs):
+                    print(f"=== {target} ===")
+                    print(last_lines(text, args.lines) if text is not None else "[capture failed]")
+                    print()
+                failed = [t for t, text in zip(args.target, outputs) if text is None]
+                if failed:
+                    print(f"[arena_tmux] ERROR: capture failed: {' '.join(failed)}", file=sys.stderr)
+                    return 1
+            elif args.cmd == "send":
+                await tmux.send_line(args.target, " ".join(args.message), args.delay)
+                print(f"[OK] Message sent to {args.target}")
+            elif args.cmd == "send-file":
+                for line in Path(args.file).read_text(encoding="utf-8").splitlines():
+                    await tmux.send_keys(args.target, line, literal=True)
+                    await asyncio.sleep(args.line_delay)
+                await asyncio.sleep(args.delay)
+                await tmux.send_keys(args.target, "Enter")
+                print(f"[OK] Prompt sent to {args.target}")
+            elif args.cmd == "windows":
+                for name in await tmux.list_windows():
+                    print(name)
+    except (TmuxError, OSError, asyncio.TimeoutError) as e:
+        print(f"[arena_tmux] ERROR: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def main(argv: List[str]) -> int:
+    p = argparse.ArgumentParser(description="tmux control-mode helper (one tmux client per invocation)")
+    p.add_argument("-L", "--socket", default=None, help="tmux socket name")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    cap = sub.add_parser("capture", help="print the last lines of one or more panes")
+    cap.add_argument("target", nargs="+")
+    cap.add_argument("-n", "--lines", type=int, default=20)
+    snd = sub.add_parser("send", help="type a message into a pane and press Enter")
+    snd.add_argument("target")
+    snd.add_argument("message", nargs="+")
+    snd.add_argument("--delay", type=float, default=0.5, help="wait before Enter so the TUI registers the text")
+    sf = sub.add_parser("send-file", help="type a file line by line, then press Enter")
+    sf.add_argument("target")
+    sf.add_argument("file")
+    sf.add_argument("--line-delay", type=float, default=0.1)
+    sf.add_argument("--delay", type=float, default=0.5)
+    win = sub.add_parser("windows", help="list window names of a session")
+    win.add_argument("session")
+    return asyncio.run(cli(p.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
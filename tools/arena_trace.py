@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""tools/arena_trace.py
+
+opt-in のスパン計測（`--trace out.json`）。gen_tmuxp.py / scripts/sdk_batch_launcher.py 共通。
+
+  - span(name, **attrs) は入れ子にでき、親子関係は contextvars で辿るので asyncio タスクを
+    跨いでも正しく繋がる。属性（team, track, commit など）は with の中で後から足してもよい。
+  - 出力は Chrome trace-event 形式（Perfetto / chrome://tracing でそのまま開ける）。
+    各スパンは "X" イベントで、args に span_id / parent_id と属性を持つ。
+  - 並行に走るスパン同士が同じ行で重ならないよう、レーン（tid）を自動で割り当てる。
+  - summary(n) は所要時間の長い上位 n スパンと、スパン名毎の合計を返す。
+  - 無効時（既定）の span() は何も記録しない。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+MAX_EVENTS = 200_000
+
+_current: "contextvars.ContextVar[Optional[Tuple[int, int]]]" = contextvars.ContextVar("arena_trace_span", default=None)
+
+
+class Tracer:
+    def __init__(self) -> None:
+        self.enabled = False
+        self.events: List[Dict[str, Any]] = []
+        self.dropped = 0
+        self.started_at = ""
+        self._t0 = time.perf_counter_ns()
+        self._next_id = 1
+        self._lanes: Dict[int, List[int]] = {}
+        self._lock = threading.Lock()
+
+    def enable(self) -> None:
+        self.enabled = True
+        self.started_at = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+        self._t0 = time.perf_counter_ns()
+
+    def _lane_for(self, parent: Optional[Tuple[int, int]]) -> int:
+        lane = parent[1] if parent else 0
+        stack = self._lanes.get(lane)
+        if not stack or (parent is not None and stack[-1] == parent[0]):
+            return lane
+        lane = 0
+        while self._lanes.get(lane):
+            lane += 1
+        return lane
+
+    @contextmanager
+    def span(self, name: str, cat: str = "arena", **attrs: Any) -> Iterator[Dict[str, Any]]:
+        if not self.enabled:
+            yield attrs
+            return
+        parent = _current.get()
+        with self._lock:
+            sid = self._next_id
+            self._next_id += 1
+            lane = self._lane_for(parent)
+            self._lanes.setdefault(lane, []).append(sid)
+        token = _current.set((sid, lane))
+        start = time.perf_counter_ns()
+        try:
+            yield attrs
+        except BaseException as e:
+            attrs["error"] = type(e).__name__
+            raise
+        finally:
+            end = time.perf_counter_ns()
+            _current.reset(token)
+            args = {"span_id": sid, "parent_id": parent[0] if parent else None}
+            args.update({k: v for k, v in attrs.items() if v is not None})
+            event = {"name": name, "cat": cat, "ph": "X", "ts": (start - self._t0) / 1000.0, "dur": (end - start) / 1000.0, "pid": os.getpid(), "tid": lane, "args": args}
+            with self._lock:
+                self._lanes[lane].remove(sid)
+                if len(self.events) < MAX_EVENTS:
+                    self.events.append(event)
+                else:
+                    self.dropped += 1
+
+    def write(self, path: Path, process_name: str = "arena") -> None:
+        with self._lock:
+            events = list(self.events)
+        pid = os.getpid()
+        meta: List[Dict[str, Any]] = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": process_name}}]
+        for lane in sorted({e["tid"] for e in events}):
+            meta.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": lane, "args": {"name": "main" if lane == 0 else f"lane {lane}"}})
+        out = {"traceEvents": meta + sorted(events, key=lambda e: e["ts"]), "displayTimeUnit": "ms", "otherData": {"started_at": self.started_at, "argv": sys.argv, "dropped_events": self.dropped}}
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(out, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def summary(self, top: int = 15) -> str:
+        with self._lock:
+            events = list(self.events)
+        lines = [f"[trace] top {min(top, len(events))} slowest spans (of {len(events)}):"]
+        for e in sorted(events, key=lambda e: e["dur"], reverse=True)[:top]:
+            attrs = " ".join(f"{k}={v}" for k, v in e["args"].items() if k not in ("span_id", "parent_id"))
+            lines.append(f"  {e['dur'] / 1e6:9.3f}s  {e['name']:<20} {attrs}".rstrip())
+        totals: Dict[str, Tuple[int, float]] = {}
+        for e in events:
+            n, d = totals.get(e["name"], (0, 0.0))
+            totals[e["name"]] = (n + 1, d + e["dur"])
+        lines.append("[trace] total by span name:")
+        for name, (n, d) in sorted(totals.items(), key=lambda kv: kv[1][1], reverse=True):
+            lines.append(f"  {d / 1e6:9.3f}s  {name:<20} x{n}")
+        return "\n".join(lines)
+
+
+TRACER = Tracer()
+span = TRACER.span
+
+
+def enable() -> Tracer:
+    TRACER.enable()
+    return TRACER
+
+
+def enabled() -> bool:
+    return TRACER.enabled
+
+
+def traced(name: str, **static: Any) -> Any:
+    """関数全体を 1 スパンにするデコレータ（sync / async 両対応）。"""
+
+    def wrap(fn: Any) -> Any:
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def run_async(*args: Any, **kwargs: Any) -> Any:
+                with span(name, **static):
+                    return await fn(*args, **kwargs)
+            return run_async
+
+        @functools.wraps(fn)
+        def run(*args: Any, **kwargs: Any) -> Any:
+            with span(name, **static):
+                return fn(*args, **kwargs)
+        return run
+
+    return wrap
@@ -4,26 +4,83 @@
 Ubuntu 24 + Ghostty + tmux + tmuxp + Git worktree + OpenCode(opencode) で、
 図の「品質ゲート→ランキング→勝者統合」までを tmux 上で一気に回すための 1 ファイル。
 
-このスクリプトは 6 つのサブコマンドを持ちます：
+このスクリプトは 9 つのサブコマンドを持ちます：
 
   - generate : worktree 作成 + tmuxp 設定生成（.tmuxp/arena.json）
   - gate     : Quality Gate（自動テスト）を全チームへ実行し結果を保存
   - rank     : gate 結果からランキング/勝者を算出し保存
   - integrate: 勝者ブランチを統合ブランチへマージし、最終ゲートも実行
-  - pipeline : gate→rank→integrate を順に実行（Enter待ちも可能）
+  - pipeline : gate→rank→integrate をトラック単位で流して実行（Enter待ちも可能）
   - start    : 要件ファイルを受け取り、generate + tmuxp load を自動実行
+  - serve    : gate --watch + rank を 1 プロセスで常駐実行し、/metrics（Prometheus）と /status（JSON）を公開
+  - status   : serve デーモンの状態をコンパクトに表示（デーモン不在時は winners.json）
+  - pool     : 使い終わった worktree のウォームプールを表示 / 返却（release）/ 縮小（trim）
 
 特徴:
   - 旧仕様互換: `python3 tools/gen_tmuxp.py --n 5` のようにサブコマンド無しでも generate 扱い。
   - worktree を大量生成しても、ゲートは「コミットが変わったチームだけ」再実行（watch向き）。
+  - worktree は上限付き並列（`generate --worktree-jobs N`）で作成し、進捗と worktree 毎の所要時間を表示。
+    `generate --sparse DIR` で `--no-checkout` + sparse（cone）チェックアウト。既に正しいブランチ・
+    チェックアウト方式の worktree は `.git` ファイルの読みだけで判定し、再実行時は git を呼ばない。
+  - `generate --new-round` / `start --new-round` は既存 worktree を `<worktrees_dir>/.pool/` に退避し、
+    新ラウンドの worktree はプールから move + reset + clean で再利用する（ignored なビルドキャッシュは
+    残す。`--purge-ignored` で削除）。プールは `--pool-size` を超えると最終利用が古い順に削除。
+  - ゲート結果は (tree hash, gate_cmd, 環境fingerprint) で `.arena/cache/gate/` に共有キャッシュされ、
+    同一ツリーのチームや INTEGRATION は再実行せずに結果を再利用（件数/期間で evict）。
+  - `--incremental`（generate で既定化、gate/pipeline/serve/integrate で都度指定）はチームのコミットと
+    base_ref の差分から影響するテストだけを実行する。索引（import の静的解析でファイル→テスト）は
+    base_ref のコミット毎に `.arena/impact/` に 1 回だけ作り、索引に無いファイルの変更は全テストへ
+    フォールバック。最終ゲートは `--full-gate-every N` 回毎、または `--full-gate` で全テスト。
+  - `generate --final-shards K`（integrate/pipeline は `--shards K`）で最終ゲートのテストファイルを
+    過去の所要時間で均した K シャードに分け、`<worktrees_dir>/.shards/` の使い回し worktree で並行実行。
+    シャード毎のログ・exit code・所要時間は integration.json にまとめる。
+  - `generate --dep-cache` で依存（node_modules / .venv）を lockfile のハッシュ毎に `.arena/cache/deps/` へ
+    1 回だけ install し、各 worktree へは reflink（非対応なら copy）で展開してからゲートする。
+    スイープ毎にヒット率とストア/展開サイズを表示し、履歴にも記録。
+  - git メタデータ（branch/commit/tree）は `git worktree list` + `git for-each-ref` で全 worktree
+    分をスイープ毎に一括取得し、gate/rank/integrate で共有（dirty 判定のみ必要時に worktree 単位）。
+  - ゲート出力は `.arena/logs/<team>.log` へ逐次書き出し（`tail -f` 可、メモリは末尾のみ保持）。
+    前回までのログは `<team>.log.N.gz` に圧縮ローテーション（gate_log_keep / gate_log_max_bytes）。
+  - 全ゲート実行は `.arena/arena.db`（SQLite/WAL）に履歴として記録。rank は索引付きクエリで算出し、
+    `results/*.json` と `winners.json` は互換用にアトミック書き込みでエクスポート。
+  - ゲート待ち行列は履歴（所要時間・pass 率・コミット変化）から「勝者が早く出る順」に並べ、
+    トラック間は交互に実行（`--schedule fifo` で従来順）。トラック毎の time-to-first-winner を表示。
+  - `gate --race` / `pipeline --race`: トラックの暫定首位より長く走っているゲートは
+    プロセスグループごと打ち切り（cancelled）、rank は pass が出る度に逐次更新。
+  - 各ゲートの rusage（user/sys CPU、最大 RSS、ブロック I/O）を結果に記録。
+    `generate --rank-by {elapsed,cpu,rss,io}`（config の rank_by）でランキング指標を選べる。
+  - `generate --bench-cmd ... --bench-metric NAME` で pass 後にベンチマーク（JSON lines）を
+    warmup + K 回実行し、指標毎の中央値/ばらつき/95%CI を記録。rank は中央値で並べ、
+    CI が重なるチームは同着（ties）として報告する。
+  - integrate は `git merge-tree --write-tree` で勝者の組み合わせを worktree に触れずに事前検証し、
+    コンフリクトするトラックは次点の pass チームへ自動フォールバック（clean な組み合わせだけを実マージ）。
+  - pipeline はトラック毎の DAG：トラックの全ゲートが終わった時点で順位を確定して勝者を即マージし、
+    他トラックのゲートと並行させる。最後の勝者が入った直後に最終ゲート。各ステージの開始/終了と
+    critical path は `.arena/timeline.json` に記録（`pipeline --barrier` で従来の一括実行）。
+  - ゲートは独自プロセスグループで実行し、期限超過時は孫プロセスごと kill して `timeout` と記録。
+    チームの期限は base ブランチの p95 所要時間から適応的に決める（上限 gate_timeout_sec）。
+  - 全サブコマンドで `--trace out.json` を付けると、worktree 作成・git probe・ゲート・rank・マージ・
+    最終ゲートを入れ子のスパン（team/track/commit 属性付き）として記録し、Chrome trace-event 形式
+    （Perfetto で開ける）で書き出す。終了時に遅いスパン上位（`--trace-top N`）とスパン名毎の合計を表示。
+  - `serve`（`generate --daemon` で quality-gate ペインに配置）はキュー長・実行中ゲート・チーム毎の
+    所要時間ヒストグラム・キャッシュヒット率・勝者の在位時間をメモリに持ち、HTTP で返す。
+    起動時に `.arena/arena.db` の履歴からヒストグラムを復元し、接続先は `.arena/daemon.json` に書く。
+  - `gate --watch` / `rank --watch` はイベント駆動（inotify、無い環境では stat ポーリング）。
+    コミットしたチームだけを debounce してゲートし、rank は結果ファイルが変わった時だけ再計算。
+    `--interval`（既定 20 秒）は以前の「一定間隔で全チームを再スイープする周期」ではなく、
+    inotify が使えない時の stat ポーリング間隔になった。
+  - ゲート・git probe・マージは `tools/arena_async.py`（asyncio 実行コア）上のタスクとして 1 スレッドで
+    並行実行する。同時実行数は共有セマフォで制限し、timeout / キャンセル時はプロセスグループごと kill。
+  - ゲートは `gate --jobs N`（既定: CPU数）で並列実行。結果は終わった順に表示し、
+    スイープ毎に wall-clock / ゲート合計時間 / CPU時間のサマリを出す。
   - OpenCode(opencode) のCLIオプションが環境差で変わっても落ちにくいように、
     pane では `opencode --help` を見て `--agent/--model` を付けられる時だけ付ける。
 
 生成される tmux セッションの主なウィンドウ:
   - planner       : 中央プランナー（opencode）
   - comp-A/B/C... : 第1レベル競争層（opencode）
-  - quality-gate  : gateのwatch実行 + QAエージェント（opencode）
-  - ranking       : rankのwatch実行 + winners.json表示
+  - quality-gate  : gateのwatch実行（--daemon 時は serve）+ QAエージェント（opencode）
+  - ranking       : rankのwatch実行 + status表示（--daemon 時は status のみ）
   - integration   : 統合手順シェル + integratorエージェント（opencode）
   - pipeline      : Enter一発で gate→rank→integrate(final gate) 実行
 
@@ -39,15 +96,41 @@ Ubuntu 24 + Ghostty + tmux + tmuxp + Git worktree + OpenCode(opencode) で、
 from __future__ import annotations
 
 import argparse
+import ast
+import asyncio
+import ctypes
+import ctypes.util
+import fcntl
+import fnmatch
+import gzip
+import hashlib
 import json
+import math
 import os
+import platform
 import re
+import resource
+import select
+import shlex
+import shutil
+import signal
+import sqlite3
+import statistics
+import struct
 import subprocess
 import sys
+import threading
 import time
-from dataclasses import dataclass
+import urllib.request
+from collections import deque
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+from xml.etree import ElementTree
+
+import arena_async
+import arena_trace
 
 
 def now_iso() -> str:
@@ -63,7 +146,8 @@ def human_sec(sec: float) -> str:
 
 
 def sh(cmd: List[str], cwd: Path, check: bool) -> subprocess.CompletedProcess:
-    return subprocess.run(cmd, cwd=str(cwd), text=True, capture_output=True, check=check)
+    with arena_trace.span("exec", cat="proc", cmd=" ".join(cmd[:3])):
+        return subprocess.run(cmd, cwd=str(cwd), text=True, capture_output=True, check=check)
 
 
 def git_out(args: List[str], cwd: Path) -> str:
@@ -87,12 +171,120 @@ def is_dirty(repo: Path) -> bool:
     return bool(cp.stdout.strip())
 
 
-def branch_exists(branch: str, repo_root: Path) -> bool:
-    cp = subprocess.run(
-        ["git", "show-ref", "--verify", "--quiet", f"refs/heads/{branch}"],
-        cwd=str(repo_root), text=True, capture_output=True,
-    )
-    return cp.returncode == 0
+@dataclass
+class WorktreeInfo:
+    path: str
+    commit: str
+    branch: str
+    tree: Optional[str] = None
+
+
+class GitMeta:
+    """全 worktree の branch/commit/tree を `git worktree list` + `git for-each-ref` の 2 回で取得する。
+
+    1 スイープの間だけ使うスナップショット。dirty 判定だけは worktree ごとに
+    `git status` が必要なので、必要になった worktree に限って遅延実行しキャッシュする。
+    """
+
+    def __init__(self, repo_root: Path):
+        self.repo_root = repo_root
+        self.worktrees: Dict[str, WorktreeInfo] = {}
+        self.refs: Dict[str, Tuple[str, str]] = {}
+        self._dirty: Dict[str, bool] = {}
+        self._lock = threading.Lock()
+        self.refresh()
+
+    @arena_trace.traced("git.meta")
+    def refresh(self) -> None:
+        refs: Dict[str, Tuple[str, str]] = {}
+        for line in git_out(["for-each-ref", "--format=%(refname) %(objectname) %(tree)", "refs/heads"], self.repo_root).splitlines():
+            parts = line.split()
+            if len(parts) >= 2:
+                refs[parts[0][len("refs/heads/"):]] = (parts[1], parts[2] if len(parts) > 2 else "")
+        worktrees: Dict[str, WorktreeInfo] = {}
+        cur: Dict[str, str] = {}
+        for line in git_out(["worktree", "list", "--porcelain"], self.repo_root).splitlines() + [""]:
+            if line:
+                k, _, v = line.partition(" ")
+                cur[k] = v
+                continue
+            if "worktree" in cur:
+                branch = cur.get("branch", "").replace("refs/heads/", "", 1) or "HEAD"
+                commit = cur.get("HEAD", "")
+                ref = refs.get(branch)
+                tree = ref[1] if ref and ref[0] == commit and ref[1] else None
+                path = os.path.realpath(cur["worktree"])
+                worktrees[path] = WorktreeInfo(path=path, commit=commit, branch=branch, tree=tree)
+            cur = {}
+        with self._lock:
+            self.refs = refs
+            self.worktrees = worktrees
+            self._dirty.clear()
+
+    def worktree(self, wt_path: Path) -> WorktreeInfo:
+        info = self.worktrees.get(os.path.realpath(str(wt_path)))
+        if info is None:
+            branch = git_out(["rev-parse", "--abbrev-ref", "HEAD"], wt_path)
+            info = WorktreeInfo(path=os.path.realpath(str(wt_path)), commit=git_out(["rev-parse", "HEAD"], wt_path), branch=branch)
+            with self._lock:
+                self.worktrees[info.path] = info
+        return info
+
+    def tree(self, wt_path: Path) -> str:
+        info = self.worktree(wt_path)
+        if not info.tree:
+            info.tree = git_out(["rev-parse", f"{info.commit}^{{tree}}"], self.repo_root)
+        return info.tree
+
+    async def probe(self, wt_path: Path) -> Tuple[WorktreeInfo, bool]:
+        """worktree() + dirty() の非同期版。ゲートのイベントループ内から arena_async 経由で git を呼ぶ。"""
+        key = os.path.realpath(str(wt_path))
+        info = self.worktrees.get(key)
+        if info is None:
+            cp = await arena_async.run(["git", "rev-parse", "HEAD", "--abbrev-ref", "HEAD"], wt_path, check=True)
+            commit, branch = cp.stdout.split()
+            info = WorktreeInfo(path=key, commit=commit, branch=branch)
+            with self._lock:
+                self.worktrees[key] = info
+        with self._lock:
+            dirty = self._dirty.get(key)
+        if dirty is None:
+            cp = await arena_async.run(["git", "status", "--porcelain"], wt_path)
+            dirty = bool(cp.stdout.strip())
+            with self._lock:
+                self._dirty[key] = dirty
+        return info, dirty
+
+    async def tree_async(self, wt_path: Path) -> str:
+        info = self.worktree(wt_path)
+        if not info.tree:
+            cp = await arena_async.run(["git", "rev-parse", f"{info.commit}^{{tree}}"], self.repo_root, check=True)
+            info.tree = cp.stdout.strip()
+        return info.tree
+
+    def dirty(self, wt_path: Path) -> bool:
+        key = os.path.realpath(str(wt_path))
+        with self._lock:
+            if key in self._dirty:
+                return self._dirty[key]
+        d = is_dirty(wt_path)
+        with self._lock:
+            self._dirty[key] = d
+        return d
+
+    def branch_exists(self, branch: str) -> bool:
+        return branch in self.refs
+
+    def ref_tree(self, ref: str) -> Optional[str]:
+        hit = self.refs.get(ref)
+        if hit and hit[1]:
+            return hit[1]
+        cp = sh(["git", "rev-parse", "--verify", "--quiet", f"{ref}^{{tree}}"], cwd=self.repo_root, check=False)
+        return cp.stdout.strip() or None
+
+    def branch_commit(self, branch: str) -> Optional[str]:
+        ref = self.refs.get(branch)
+        return ref[0] if ref else None
 
 
 def config_path(repo_root: Path) -> Path:
@@ -111,7 +303,179 @@ def result_path(repo_root: Path, team: str) -> Path:
     return results_dir(repo_root) / f"{team}.json"
 
 
+def store_path(repo_root: Path) -> Path:
+    return repo_root / ".arena" / "arena.db"
+
+
+def track_of(team: str) -> str:
+    return team.rstrip("0123456789")
+
+
+RANK_METRICS = {"elapsed": "elapsed_sec", "cpu": "cpu_sec", "rss": "max_rss_kb", "io": "io_blocks"}
+
+
+class ArenaStore:
+    """`.arena/arena.db`（SQLite, WAL）にゲート実行履歴を全件保存する。
+
+    スレッド毎に接続を持ち、書き込みは 1 トランザクションで行うので並列ゲートからも安全。
+    results/*.json と winners.json は互換のためのエクスポート。
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS gate_runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        team TEXT NOT NULL,
+        track TEXT NOT NULL,
+        branch TEXT,
+        commit_sha TEXT,
+        tree TEXT,
+        status TEXT,
+        exit_code INTEGER,
+        elapsed_sec REAL,
+        cpu_sec REAL,
+        max_rss_kb INTEGER,
+        io_blocks INTEGER,
+        gate_cmd TEXT,
+        cache TEXT,
+        timestamp TEXT,
+        started_at REAL,
+        finished_at REAL NOT NULL,
+        data TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_gate_runs_team ON gate_runs(team, id);
+    CREATE INDEX IF NOT EXISTS idx_gate_runs_track ON gate_runs(track, team, id);
+    CREATE INDEX IF NOT EXISTS idx_gate_runs_tree ON gate_runs(tree, status);
+    CREATE INDEX IF NOT EXISTS idx_gate_runs_status ON gate_runs(status, finished_at);
+    CREATE TABLE IF NOT EXISTS gate_sweeps (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        started_at REAL NOT NULL,
+        wall_sec REAL,
+        jobs INTEGER,
+        schedule TEXT,
+        gated INTEGER,
+        data TEXT NOT NULL
+    );
+    """
+
+    ADDED_COLUMNS = [("cpu_sec", "REAL"), ("max_rss_kb", "INTEGER"), ("io_blocks", "INTEGER")]
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._local = threading.local()
+        ensure_dir(path.parent)
+        with self._conn() as conn:
+            conn.executescript(self.SCHEMA)
+            cols = {row["name"] for row in conn.execute("PRAGMA table_info(gate_runs)")}
+            for col, typ in self.ADDED_COLUMNS:
+                if col not in cols:
+                    conn.execute(f"ALTER TABLE gate_runs ADD COLUMN {col} {typ}")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30.0)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def record_run(self, data: Dict[str, Any]) -> int:
+        finished = time.time()
+        elapsed = data.get("elapsed_sec")
+        team = data["team"]
+        ru = data.get("rusage") or {}
+        row = (team, data.get("track") or track_of(team), data.get("branch"), data.get("commit"), data.get("tree"), data.get("status"), data.get("exit_code"), elapsed, ru.get("cpu_sec"), ru.get("max_rss_kb"), ru.get("io_blocks"), data.get("gate_cmd"), data.get("cache"), data.get("timestamp"), finished - float(elapsed or 0), finished, json.dumps(data, ensure_ascii=False))
+        with self._conn() as conn:
+            cur = conn.execute("INSERT INTO gate_runs (team, track, branch, commit_sha, tree, status, exit_code, elapsed_sec, cpu_sec, max_rss_kb, io_blocks, gate_cmd, cache, timestamp, started_at, finished_at, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+            return int(cur.lastrowid or 0)
+
+    def latest(self, team: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT data FROM gate_runs WHERE team = ? ORDER BY id DESC LIMIT 1", (team,)).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def ranked(self, track: str, teams: List[str], rank_by: str = "elapsed") -> List[Dict[str, Any]]:
+        """トラック内各チームの最新結果を (status, rank_by 指標) 順で返す。"""
+        if not teams:
+            return []
+        col = RANK_METRICS.get(rank_by, "elapsed_sec")
+        marks = ",".join("?" * len(teams))
+        sql = f"""
+            SELECT r.data FROM gate_runs r
+            JOIN (SELECT team, MAX(id) AS id FROM gate_runs WHERE track = ? AND team IN ({marks}) GROUP BY team) m ON r.id = m.id
+            ORDER BY CASE r.status WHEN 'pass' THEN 0 WHEN 'dirty' THEN 1 WHEN 'fail' THEN 2 ELSE 3 END,
+                     COALESCE(NULLIF(r.{col}, 0), 9999999), r.team
+        """
+        return [json.loads(row["data"]) for row in self._conn().execute(sql, [track] + teams)]
+
+    def team_stats(self, teams: List[str], window: int = 10) -> Dict[str, Dict[str, Any]]:
+        """各チーム直近 window 回の実ゲート（キャッシュ再利用を除く）の回数・pass 数・所要時間中央値。"""
+        if not teams:
+            return {}
+        marks = ",".join("?" * len(teams))
+        sql = f"""
+            SELECT team, status, elapsed_sec FROM (
+                SELECT team, status, elapsed_sec, ROW_NUMBER() OVER (PARTITION BY team ORDER BY id DESC) AS rn
+                FROM gate_runs WHERE team IN ({marks}) AND status IN ('pass', 'fail') AND cache IS NULL
+            ) WHERE rn <= ?
+        """
+        stats: Dict[str, Dict[str, Any]] = {}
+        durations: Dict[str, List[float]] = {}
+        for row in self._conn().execute(sql, teams + [window]):
+            st = stats.setdefault(row["team"], {"runs": 0, "passes": 0, "median_elapsed": None})
+            st["runs"] += 1
+            st["passes"] += 1 if row["status"] == "pass" else 0
+            if row["elapsed_sec"]:
+                durations.setdefault(row["team"], []).append(float(row["elapsed_sec"]))
+        for team, ds in durations.items():
+            stats[team]["median_elapsed"] = statistics.median(ds)
+        return stats
+
+    def base_durations(self, tree: Optional[str], limit: int = 50) -> List[float]:
+        """base_ref と同じ tree、または INTEGRATION で実際に走った pass ゲートの所要時間（新しい順）。"""
+        rows = self._conn().execute(
+            "SELECT elapsed_sec, data FROM gate_runs WHERE status = 'pass' AND cache IS NULL AND elapsed_sec IS NOT NULL AND (tree = ? OR team = 'INTEGRATION') ORDER BY id DESC LIMIT ?",
+            (tree or "", limit * 2),
+        )
+        # incremental / sharded の最終ゲートは一部のテストしか走らない（sharded は壁時計も短い）ので、全テストの期限の見積もりには使わない
+        return [float(r["elapsed_sec"]) for r in rows if json.loads(r["data"]).get("scope") in (None, "full")][:limit]
+
+    def record_sweep(self, started_at: float, wall_sec: float, jobs: int, schedule: str, gated: int, data: Dict[str, Any]) -> None:
+        with self._conn() as conn:
+            conn.execute("INSERT INTO gate_sweeps (started_at, wall_sec, jobs, schedule, gated, data) VALUES (?, ?, ?, ?, ?, ?)", (started_at, wall_sec, jobs, schedule, gated, json.dumps(data, ensure_ascii=False)))
+
+    def history(self, team: str, limit: int = 20) -> List[Dict[str, Any]]:
+        rows = self._conn().execute("SELECT data FROM gate_runs WHERE team = ? ORDER BY id DESC LIMIT ?", (team, limit))
+        return [json.loads(row["data"]) for row in rows]
+
+
+_STORES: Dict[str, ArenaStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def arena_store(repo_root: Path) -> ArenaStore:
+    key = str(store_path(repo_root))
+    with _STORES_LOCK:
+        if key not in _STORES:
+            _STORES[key] = ArenaStore(store_path(repo_root))
+        return _STORES[key]
+
+
+def existing_store(repo_root: Path) -> Optional[ArenaStore]:
+    """読むだけの経路（rank / status）用。`.arena/arena.db` がまだ無ければ作らずに None。"""
+    key = str(store_path(repo_root))
+    with _STORES_LOCK:
+        if key in _STORES:
+            return _STORES[key]
+    return arena_store(repo_root) if store_path(repo_root).exists() else None
+
+
 def read_result(repo_root: Path, team: str) -> Optional[Dict[str, Any]]:
+    store = existing_store(repo_root)
+    r = store.latest(team) if store else None
+    if r:
+        return r
     p = result_path(repo_root, team)
     if not p.exists():
         return None
@@ -122,8 +486,622 @@ def read_result(repo_root: Path, team: str) -> Optional[Dict[str, Any]]:
 
 
 def write_result(repo_root: Path, team: str, data: Dict[str, Any]) -> None:
-    ensure_dir(results_dir(repo_root))
-    result_path(repo_root, team).write_text(json.dumps(data, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    arena_store(repo_root).record_run(data)
+    write_json_atomic(result_path(repo_root, team), data)
+
+
+def write_json_atomic(path: Path, data: Any) -> None:
+    ensure_dir(path.parent)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_text(json.dumps(data, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def gate_cache_dir(repo_root: Path) -> Path:
+    return repo_root / ".arena" / "cache" / "gate"
+
+
+DEFAULT_CACHE_ENV = ["PATH", "PYTHONPATH", "VIRTUAL_ENV", "NODE_ENV", "NODE_OPTIONS", "GOFLAGS", "CARGO_BUILD_TARGET", "RUSTFLAGS", "CI"]
+
+
+def env_fingerprint(cfg: Dict[str, Any]) -> str:
+    names = cfg.get("gate_cache_env") or DEFAULT_CACHE_ENV
+    parts = [platform.system(), platform.machine(), platform.python_version()]
+    parts.extend(f"{n}={os.environ.get(n, '')}" for n in sorted(names))
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+class GateCache:
+    """(tree hash, gate_cmd, 環境fingerprint) をキーにしたゲート結果の共有キャッシュ。"""
+
+    def __init__(self, repo_root: Path, cfg: Dict[str, Any], gate_cmd: str):
+        self.root = gate_cache_dir(repo_root)
+        self.gate_cmd = gate_cmd
+        self.env = env_fingerprint(cfg)
+        self.enabled = bool(cfg.get("gate_cache", True))
+        self.max_entries = int(cfg.get("gate_cache_max_entries", 512))
+        self.max_age_sec = int(cfg.get("gate_cache_max_age_sec", 7 * 24 * 3600))
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Event] = {}
+
+    def key(self, tree: str) -> str:
+        return hashlib.sha256(f"{tree}\0{self.gate_cmd}\0{self.env}".encode("utf-8")).hexdigest()
+
+    def _path(self, tree: str) -> Path:
+        return self.root / f"{self.key(tree)}.json"
+
+    def get(self, tree: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        p = self._path(tree)
+        entry: Optional[Dict[str, Any]] = None
+        try:
+            if time.time() - p.stat().st_mtime <= self.max_age_sec:
+                entry = json.loads(p.read_text(encoding="utf-8"))
+                os.utime(p)
+        except (OSError, ValueError):
+            entry = None
+        with self._lock:
+            if entry:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return entry
+
+    async def acquire(self, tree: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """キャッシュを引き (entry, owned) を返す。
+
+        同じ tree を実行中の呼び出しがあれば終わるまで待つ。miss の場合だけ実行権を取って owned=True を
+        返すので、呼び出し側は release(tree, owned) 必須（待っていた側が他人の実行権を解放しないように）。
+        """
+        while tree in self._inflight:
+            await self._inflight[tree].wait()
+        entry = self.get(tree)
+        if entry:
+            return entry, False
+        self._inflight[tree] = asyncio.Event()
+        return None, True
+
+    def release(self, tree: str, owned: bool) -> None:
+        if not owned:
+            return
+        ev = self._inflight.pop(tree, None)
+        if ev is not None:
+            ev.set()
+
+    def peek(self, tree: str) -> bool:
+        return self.enabled and self._path(tree).exists()
+
+    def put(self, tree: str, result: Dict[str, Any]) -> None:
+        if not self.enabled or result.get("status") not in ("pass", "fail"):
+            return
+        entry = {"tree": tree, "gate_cmd": self.gate_cmd, "env": self.env, "created": now_iso()}
+        entry.update({k: result.get(k) for k in ("status", "exit_code", "elapsed_sec", "rusage", "bench", "team", "commit")})
+        write_json_atomic(self._path(tree), entry)
+        self.evict()
+
+    def evict(self) -> None:
+        try:
+            entries = [(p.stat().st_mtime, p) for p in self.root.glob("*.json")]
+        except OSError:
+            return
+        entries.sort(reverse=True)
+        cutoff = time.time() - self.max_age_sec
+        for i, (mtime, p) in enumerate(entries):
+            if i >= self.max_entries or mtime < cutoff:
+                try:
+                    p.unlink()
+                except OSError:
+                    pass
+
+    def summary(self) -> str:
+        total = self.hits + self.misses
+        rate = (100.0 * self.hits / total) if total else 0.0
+        return f"cache hit {self.hits} / miss {self.misses} ({rate:0.0f}%)"
+
+
+def dep_cache_dir(repo_root: Path) -> Path:
+    return repo_root / ".arena" / "cache" / "deps"
+
+
+# lock が worktree にあるエコシステムだけが対象。dir は worktree 直下に置く（info/exclude で ignore）
+DEFAULT_DEP_SPECS: List[Dict[str, Any]] = [
+    {"name": "npm", "lock": "package-lock.json", "manifests": ["package.json"], "dir": "node_modules", "install": "npm ci --no-audit --no-fund", "path": "node_modules/.bin"},
+    {"name": "yarn", "lock": "yarn.lock", "manifests": ["package.json"], "dir": "node_modules", "install": "yarn install --frozen-lockfile", "path": "node_modules/.bin"},
+    {"name": "pnpm", "lock": "pnpm-lock.yaml", "manifests": ["package.json"], "dir": "node_modules", "install": "pnpm install --frozen-lockfile", "path": "node_modules/.bin"},
+    {"name": "pip", "lock": "requirements.txt", "manifests": ["requirements-dev.txt"], "dir": ".venv", "install": "python3 -m venv .venv && for f in requirements*.txt; do .venv/bin/pip install -q -r \"$f\" || exit 1; done", "path": ".venv/bin"},
+]
+DEP_META = "arena-deps.json"
+DEP_STAMP = ".arena-deps.json"
+FICLONE = 0x40049409
+
+
+def reflink_file(src: str, dst: str) -> None:
+    """FICLONE（btrfs/XFS 等）で CoW コピー。非対応なら OSError。"""
+    with open(src, "rb") as fs, open(dst, "wb") as fd:
+        fcntl.ioctl(fd.fileno(), FICLONE, fs.fileno())
+    shutil.copystat(src, dst)
+
+
+def link_tree(src: Path, dst: Path, mode: str = "auto") -> str:
+    """src 以下を dst へ複製し、実際に使った方式を返す（auto は reflink → copy）。
+
+    hardlink は inode を共有し、ゲートがファイルをその場で書き換える（.pyc やパッチ当て）と
+    ストアと他チームの依存まで変わるので、mode="hardlink" を明示したときだけ使う。
+    """
+    order = {"auto": ["reflink", "copy"], "reflink": ["reflink", "copy"], "hardlink": ["hardlink", "copy"], "copy": ["copy"]}[mode]
+    ops: Dict[str, Callable[[str, str], Any]] = {"reflink": reflink_file, "hardlink": os.link, "copy": shutil.copy2}
+    for root, dirs, files in os.walk(src):
+        rel = os.path.relpath(root, src)
+        out = dst if rel == "." else dst / rel
+        out.mkdir(exist_ok=True)
+        for name in dirs + files:
+            s = os.path.join(root, name)
+            d = str(out / name)
+            if os.path.islink(s):
+                os.symlink(os.readlink(s), d)
+                if name in dirs:
+                    dirs.remove(name)
+                continue
+            if name in dirs:
+                continue
+            while True:
+                try:
+                    ops[order[0]](s, d)
+                    break
+                except OSError:
+                    if len(order) == 1:
+                        raise
+                    if os.path.lexists(d):
+                        os.unlink(d)
+                    order = order[1:]
+    return order[0]
+
+
+def tree_size(path: Path) -> Tuple[int, int]:
+    files = size = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            try:
+                st = os.lstat(os.path.join(root, name))
+            except OSError:
+                continue
+            files += 1
+            size += st.st_size
+    return files, size
+
+
+def human_bytes(n: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(n) < 1024 or unit == "GB":
+            return f"{n:0.0f}{unit}" if unit == "B" else f"{n:0.1f}{unit}"
+        n /= 1024
+    return f"{n:0.1f}GB"
+
+
+class DepCache:
+    """lockfile/manifest のハッシュをキーにした依存（node_modules / .venv 等）の共有キャッシュ。
+
+    同じ依存セットは `.arena/cache/deps/<name>-<key>/` に 1 回だけ install し、各 worktree へは
+    reflink（非対応なら copy、hardlink は dep_cache_link=hardlink のときだけ）で展開する
+    （stamp が一致していれば何もしない）。別プロセスとの同時 install は flock で直列化し、
+    ストアは dep_cache_max_entries を超えたら最終利用が古い順に削除。
+    """
+
+    def __init__(self, repo_root: Path, cfg: Dict[str, Any]):
+        self.repo_root = repo_root
+        self.root = dep_cache_dir(repo_root)
+        self.enabled = bool(cfg.get("dep_cache", False))
+        self.specs: List[Dict[str, Any]] = cfg.get("dep_cache_specs") or DEFAULT_DEP_SPECS
+        self.link_mode = str(cfg.get("dep_cache_link", "auto"))
+        self.max_entries = int(cfg.get("dep_cache_max_entries", 8))
+        self.timeout_sec = int(cfg.get("dep_cache_timeout_sec", 1800))
+        self.env = env_fingerprint(cfg)
+        self.cfg = cfg
+        self.hits = 0
+        self.misses = 0
+        self.failed = 0
+        self.linked_bytes = 0
+        self.modes: Set[str] = set()
+        self.used: Set[str] = set()
+        self._locks: Dict[str, asyncio.Lock] = {}
+        if self.enabled:
+            self._exclude_dirs()
+
+    def _exclude_dirs(self) -> None:
+        """展開先を共有 info/exclude に足し、worktree が dirty 扱いにならないようにする。"""
+        common = git_out(["rev-parse", "--git-common-dir"], self.repo_root)
+        if not common:
+            return
+        exclude = (self.repo_root / common).resolve() / "info" / "exclude"
+        try:
+            lines = exclude.read_text(encoding="utf-8").splitlines() if exclude.exists() else []
+        except OSError:
+            return
+        want = [f"/{d}/" for d in dict.fromkeys(spec["dir"] for spec in self.specs) if f"/{d}/" not in lines]
+        if want:
+            ensure_dir(exclude.parent)
+            with open(exclude, "a", encoding="utf-8") as f:
+                f.write("".join(f"{w}\n" for w in want))
+
+    def match(self, wt_path: Path) -> List[Tuple[Dict[str, Any], str]]:
+        """worktree に lock があるスペック毎に (spec, key) を返す（展開先 dir 毎に最初の 1 つ）。"""
+        out: List[Tuple[Dict[str, Any], str]] = []
+        taken: Set[str] = set()
+        for spec in self.specs:
+            if spec["dir"] in taken or not (wt_path / spec["lock"]).is_file():
+                continue
+            h = hashlib.sha256(f"{spec['name']}\0{spec['install']}\0{self.env}".encode("utf-8"))
+            for name in [spec["lock"]] + list(spec.get("manifests", [])):
+                p = wt_path / name
+                if p.is_file():
+                    h.update(f"\0{name}\0".encode("utf-8") + p.read_bytes())
+            out.append((spec, h.hexdigest()[:20]))
+            taken.add(spec["dir"])
+        return out
+
+    def _entry(self, spec: Dict[str, Any], key: str) -> Path:
+        return self.root / f"{spec['name']}-{key}"
+
+    def _meta(self, entry: Path) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads((entry / DEP_META).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    async def _build(self, spec: Dict[str, Any], key: str, wt_path: Path, entry: Path) -> Optional[Dict[str, Any]]:
+        """ストアに依存セットを install する。パスが venv 等に焼き込まれるので最終ディレクトリで直接作る。"""
+        lock_path = self.root / f".{entry.name}.lock"
+        ensure_dir(self.root)
+        fd = os.open(lock_path, os.O_CREAT | os.O_RDWR, 0o644)
+        try:
+            await asyncio.to_thread(fcntl.flock, fd, fcntl.LOCK_EX)
+            meta = self._meta(entry)
+            if meta:
+                return meta
+            shutil.rmtree(entry, ignore_errors=True)
+            entry.mkdir(parents=True)
+            for name in [spec["lock"]] + list(spec.get("manifests", [])):
+                if (wt_path / name).is_file():
+                    shutil.copy2(wt_path / name, entry / name)
+            log_path = gate_log_path(self.repo_root, f"deps-{entry.name}", self.cfg)
+            with arena_trace.span("deps.install", dep=spec["name"], key=key[:12]) as attrs:
+                run = await run_streamed_async(spec["install"], entry, log_path, f"# Deps: {spec['name']} {key}\ncmd: {spec['install']}\n", self.timeout_sec)
+                attrs["rc"] = run.exit_code
+            if run.exit_code != 0 or run.timed_out or not (entry / spec["dir"]).is_dir():
+                print(f"[deps] {spec['name']} {key[:12]}: install failed (exit {run.exit_code}); see {log_path}")
+                shutil.rmtree(entry, ignore_errors=True)
+                return None
+            files, size = await asyncio.to_thread(tree_size, entry / spec["dir"])
+            meta = {"name": spec["name"], "key": key, "dir": spec["dir"], "created": now_iso(), "install_sec": round(run.elapsed, 3), "files": files, "bytes": size}
+            write_json_atomic(entry / DEP_META, meta)
+            print(f"[deps] {spec['name']} {key[:12]}: installed {files} files, {human_bytes(size)} in {human_sec(run.elapsed)}")
+            return meta
+        finally:
+            os.close(fd)
+
+    async def prepare(self, team_id: str, wt_path: Path) -> str:
+        """worktree に依存を揃え、ゲートコマンドの前に付けるシェル断片を返す（bin を PATH 先頭へ）。
+
+        ゲートは `bash -lc` で走り profile が PATH を組み直すので、環境変数ではなくコマンド側で足す。
+        """
+        if not self.enabled:
+            return ""
+        found = self.match(wt_path)
+        if not found:
+            return ""
+        bins: List[str] = []
+        for spec, key in found:
+            entry = self._entry(spec, key)
+            target = wt_path / spec["dir"]
+            with arena_trace.span("deps.prepare", team=team_id, dep=spec["name"], key=key[:12]) as attrs:
+                meta = self._meta(entry)
+                attrs["hit"] = bool(meta)
+                if meta:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+                    lock = self._locks.setdefault(entry.name, asyncio.Lock())
+                    async with lock:
+                        meta = await self._build(spec, key, wt_path, entry)
+                if not meta:
+                    self.failed += 1
+                    continue
+                self.used.add(entry.name)
+                os.utime(entry / DEP_META)
+                try:
+                    stamp = json.loads((target / DEP_STAMP).read_text(encoding="utf-8"))
+                except (OSError, ValueError):
+                    stamp = {}
+                if stamp.get("key") != key:
+                    tmp = wt_path / f".{spec['dir']}.arena-tmp"
+                    shutil.rmtree(tmp, ignore_errors=True)
+                    mode = await asyncio.to_thread(link_tree, entry / spec["dir"], tmp, self.link_mode)
+                    shutil.rmtree(target, ignore_errors=True)
+                    os.replace(tmp, target)
+                    write_json_atomic(target / DEP_STAMP, {"key": key, "name": spec["name"], "mode": mode, "linked": now_iso()})
+                    attrs["linked"] = mode
+                    stamp = {"mode": mode}
+                self.modes.add(stamp.get("mode", "?"))
+                self.linked_bytes += int(meta.get("bytes", 0))
+            if spec.get("path"):
+                bins.append(str(wt_path / spec["path"]))
+        if not bins:
+            return ""
+        return f"export PATH={shlex.quote(os.pathsep.join(bins))}:\"$PATH\"; "
+
+    def evict(self) -> None:
+        try:
+            entries = [(p.stat().st_mtime, p.parent) for p in self.root.glob(f"*/{DEP_META}")]
+        except OSError:
+            return
+        entries.sort(reverse=True)
+        for i, (_, entry) in enumerate(entries):
+            if i >= self.max_entries and entry.name not in self.used:
+                shutil.rmtree(entry, ignore_errors=True)
+
+    def footprint(self) -> Tuple[int, int]:
+        """(ストアのセット数, ストアの合計バイト数)。サイズは install 時に記録した値を使う。"""
+        sets = size = 0
+        for p in self.root.glob(f"*/{DEP_META}"):
+            meta = self._meta(p.parent)
+            if meta:
+                sets += 1
+                size += int(meta.get("bytes", 0))
+        return sets, size
+
+    def summary(self) -> str:
+        total = self.hits + self.misses
+        rate = (100.0 * self.hits / total) if total else 0.0
+        sets, size = self.footprint()
+        modes = "/".join(sorted(self.modes)) or "-"
+        saved = self.linked_bytes if self.modes and self.modes <= {"reflink", "hardlink"} else 0
+        return f"deps hit {self.hits} / miss {self.misses} ({rate:0.0f}%), failed {self.failed}; store {sets} sets {human_bytes(size)}, linked {human_bytes(self.linked_bytes)} into worktrees via {modes} (saved ~{human_bytes(saved)})"
+
+    def stats(self) -> Dict[str, Any]:
+        sets, size = self.footprint()
+        return {"hits": self.hits, "misses": self.misses, "failed": self.failed, "store_sets": sets, "store_bytes": size, "linked_bytes": self.linked_bytes, "link_modes": sorted(self.modes)}
+
+
+def impact_dir(repo_root: Path) -> Path:
+    return repo_root / ".arena" / "impact"
+
+
+DEFAULT_TEST_GLOBS = ["test_*.py", "*_test.py", "*.test.js", "*.test.ts", "*.test.jsx", "*.test.tsx", "*.spec.js", "*.spec.ts"]
+DEFAULT_IMPACT_IGNORE = ["*.md", "*.rst", "*.txt", "docs/*", "LICENSE*", ".github/*"]
+JS_EXTS = (".js", ".jsx", ".ts", ".tsx", ".mjs", ".cjs")
+JS_IMPORT_RE = re.compile(r"""(?:\bfrom\s*|\bimport\s*\(?\s*|\brequire\s*\(\s*)['"](\.{1,2}/[^'"]+)['"]""")
+IMPACT_VERSION = 1
+
+
+def python_module_names(path: str) -> List[str]:
+    """a/b/c.py → ["a.b.c"]（src/ レイアウトなら "b.c" も）。__init__.py はパッケージ名。"""
+    parts = path[:-3].split("/")
+    if parts[-1] == "__init__":
+        parts = parts[:-1]
+    if not parts:
+        return []
+    names = [".".join(parts)]
+    if parts[0] in ("src", "lib") and len(parts) > 1:
+        names.append(".".join(parts[1:]))
+    return names
+
+
+def python_imports(path: str, source: bytes) -> List[Tuple[str, int]]:
+    """(モジュール名, 相対 import の level) の列。構文エラーのファイルは空（= 未解決扱い）。"""
+    try:
+        tree = ast.parse(source, filename=path)
+    except (SyntaxError, ValueError):
+        return []
+    out: List[Tuple[str, int]] = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            out.extend((alias.name, 0) for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            base = node.module or ""
+            out.append((base, node.level))
+            out.extend((f"{base}.{alias.name}" if base else alias.name, node.level) for alias in node.names if alias.name != "*")
+    return out
+
+
+class ImpactIndex:
+    """base_ref のコミット毎に作る「ファイル → 影響するテスト」の索引（`.arena/impact/<commit>.json`）。
+
+    Python は ast で import を、JS/TS は相対 import/require を静的に辿り、テスト毎の依存閉包を
+    逆引きにする（conftest.py は同じディレクトリ以下のテスト全部に効く）。索引に無いファイルや、
+    どのテストからも辿れないコードが変わった場合は安全側に倒して全テストを実行する。ファイルは worktree ではなく
+    `git cat-file --batch` でコミットから直接読む。
+    """
+
+    def __init__(self, repo_root: Path, cfg: Dict[str, Any], gate_cmd: str):
+        self.repo_root = repo_root
+        self.gate_cmd = gate_cmd
+        self.test_globs: List[str] = cfg.get("gate_test_globs") or DEFAULT_TEST_GLOBS
+        self.ignore: List[str] = cfg.get("gate_incremental_ignore") or DEFAULT_IMPACT_IGNORE
+        self.always: List[str] = list(cfg.get("gate_always_run") or [])
+        self.template: Optional[str] = cfg.get("gate_incremental_cmd") or self.default_template(gate_cmd)
+        self.base_ref = cfg.get("base_ref", "main")
+        self.base_commit = ""
+        self.data: Dict[str, Any] = {}
+        self._lock: Optional[asyncio.Lock] = None
+
+    @staticmethod
+    def default_template(gate_cmd: str) -> Optional[str]:
+        """テストパスを後ろに付けられる既知のランナーだけ自動でテンプレート化する。"""
+        if re.search(r"\bpytest\b", gate_cmd):
+            return gate_cmd + " {tests}"
+        if re.match(r"\s*(npm|yarn|pnpm)\s+(run\s+)?test\b", gate_cmd):
+            return gate_cmd + (" -- {tests}" if gate_cmd.strip().startswith("npm") else " {tests}")
+        if re.search(r"\b(jest|vitest)\b", gate_cmd):
+            return gate_cmd + " {tests}"
+        return None
+
+    def is_test(self, path: str) -> bool:
+        name = path.rsplit("/", 1)[-1]
+        return any(fnmatch.fnmatch(name, g) or fnmatch.fnmatch(path, g) for g in self.test_globs)
+
+    def _path(self) -> Path:
+        return impact_dir(self.repo_root) / f"{self.base_commit}.json"
+
+    async def load(self) -> bool:
+        """base_ref の索引を読み込む（無ければ作る）。テンプレートが無い・base が解決できない時は False。"""
+        if self.template is None:
+            return False
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self.data:
+                return True
+            res = await arena_async.run(["git", "rev-parse", "--verify", f"{self.base_ref}^{{commit}}"], self.repo_root)
+            if res.returncode != 0:
+                return False
+            self.base_commit = res.stdout.strip()
+            try:
+                data = json.loads(self._path().read_text(encoding="utf-8"))
+                if data.get("version") == IMPACT_VERSION and data.get("test_globs") == self.test_globs:
+                    self.data = data
+                    return True
+            except (OSError, ValueError):
+                pass
+            with arena_trace.span("impact.build", base=self.base_commit[:12]) as attrs:
+                self.data = await self.build()
+                attrs.update(files=len(self.data["files"]), tests=len(self.data["tests"]))
+            write_json_atomic(self._path(), self.data)
+            print(f"[impact] indexed {self.base_ref} @ {self.base_commit[:7]}: {len(self.data['tests'])} tests over {len(self.data['files'])} files")
+            return True
+
+    async def build(self) -> Dict[str, Any]:
+        res = await arena_async.run(["git", "ls-tree", "-r", "-z", self.base_commit], self.repo_root, check=True)
+        entries = [(head.split()[2], path) for head, _, path in (line.partition("\t") for line in res.stdout.split("\0") if line) if head.split()[1] == "blob"]
+        code = [(obj, path) for obj, path in entries if path.endswith(".py") or path.endswith(JS_EXTS)]
+        blobs = await self._read_blobs([obj for obj, _ in code])
+        files = {path for _, path in code}
+        modules: Dict[str, str] = {}
+        for path in files:
+            if path.endswith(".py"):
+                for name in python_module_names(path):
+                    modules.setdefault(name, path)
+        graph: Dict[str, Set[str]] = {}
+        for obj, path in code:
+            graph[path] = self._edges(path, blobs.get(obj, b""), modules, files)
+        tests = sorted(p for p in files if self.is_test(p))
+        conftests = [p for p in files if p.rsplit("/", 1)[-1] == "conftest.py"]
+        deps: Dict[str, List[str]] = {}
+        for test in tests:
+            seen = {test}
+            stack = [test] + [c for c in conftests if test.startswith(c[: -len("conftest.py")])]
+            while stack:
+                cur = stack.pop()
+                seen.add(cur)
+                stack.extend(d for d in graph.get(cur, ()) if d not in seen)
+            for f in seen:
+                deps.setdefault(f, []).append(test)
+        return {"version": IMPACT_VERSION, "base_ref": self.base_ref, "base_commit": self.base_commit, "built": now_iso(), "test_globs": self.test_globs, "files": sorted(files), "tests": tests, "deps": {f: sorted(ts) for f, ts in sorted(deps.items())}}
+
+    async def _read_blobs(self, objs: List[str]) -> Dict[str, bytes]:
+        """全 blob を 1 本の `git cat-file --batch` で読む（共有セマフォ配下、出力はバイト列に戻す）。"""
+        if not objs:
+            return {}
+        res = await arena_async.run(["git", "cat-file", "--batch"], self.repo_root, input=("\n".join(objs) + "\n").encode("utf-8"), errors="surrogateescape", check=True)
+        out = res.stdout.encode("utf-8", "surrogateescape")
+        blobs: Dict[str, bytes] = {}
+        pos = 0
+        while pos < len(out):
+            nl = out.index(b"\n", pos)
+            head = out[pos:nl].split()
+            if len(head) < 3:
+                pos = nl + 1
+                continue
+            size = int(head[2])
+            blobs[head[0].decode()] = out[nl + 1 : nl + 1 + size]
+            pos = nl + 1 + size + 1
+        return blobs
+
+    @staticmethod
+    def _edges(path: str, source: bytes, modules: Dict[str, str], files: Set[str]) -> Set[str]:
+        out: Set[str] = set()
+        if path.endswith(".py"):
+            pkg = path.rsplit("/", 1)[0].split("/") if "/" in path else []
+            for name, level in python_imports(path, source):
+                if level:
+                    base = pkg[: len(pkg) - (level - 1)] if level - 1 <= len(pkg) else []
+                    name = ".".join(base + ([name] if name else []))
+                parts = name.split(".")
+                # a.b.c を import すると a/__init__.py, a/b/__init__.py も実行される
+                for i in range(1, len(parts) + 1):
+                    hit = modules.get(".".join(parts[:i]))
+                    if hit and hit != path:
+                        out.add(hit)
+            return out
+        here = path.rsplit("/", 1)[0] if "/" in path else ""
+        for spec in JS_IMPORT_RE.findall(source.decode("utf-8", errors="replace")):
+            target = os.path.normpath(os.path.join(here, spec)).replace(os.sep, "/")
+            for cand in [target] + [target + ext for ext in JS_EXTS] + [f"{target}/index{ext}" for ext in JS_EXTS]:
+                if cand in files:
+                    out.add(cand)
+                    break
+        return out
+
+    async def select(self, commit: str, wt_path: Path) -> Tuple[Optional[List[str]], str]:
+        """commit で走らせるテストを返す。(None, 理由) は全テスト実行。"""
+        if not await self.load():
+            return None, "no incremental command template for gate_cmd" if self.template is None else f"cannot resolve {self.base_ref}"
+        res = await arena_async.run(["git", "diff", "--name-only", "--no-renames", "-z", f"{self.base_commit}...{commit}"], self.repo_root)
+        if res.returncode != 0:
+            return None, "diff against base failed"
+        changed = [p for p in res.stdout.split("\0") if p]
+        deps: Dict[str, List[str]] = self.data["deps"]
+        known = set(self.data["files"])
+        picked: Set[str] = set()
+        for path in changed:
+            if self.is_test(path):
+                picked.add(path)
+            elif path in deps:
+                picked.update(deps[path])
+            elif any(fnmatch.fnmatch(path, g) for g in self.ignore):
+                continue
+            elif path in known:
+                # 静的に辿れないだけかもしれない（root/src/lib 以外の配置、動的 import）ので全テスト
+                return None, f"no test reaches change: {path}"
+            else:
+                return None, f"unmapped change: {path}"
+        tests = [t for t in sorted(picked) if (wt_path / t).is_file()]
+        if not changed:
+            return None, "no changes vs base"
+        if not tests and not self.always:
+            return None, "no affected tests"
+        return sorted(set(tests) | set(self.always)), f"{len(changed)} changed files, {len(tests)} affected tests"
+
+    def command(self, tests: List[str]) -> str:
+        assert self.template is not None
+        return self.template.replace("{tests}", " ".join(shlex.quote(t) for t in tests))
+
+
+def final_gate_full(repo_root: Path, cfg: Dict[str, Any]) -> Tuple[bool, str]:
+    """最終ゲートを全テストで回すか。on demand（final_gate_full）か、incremental が full_every 回続いたら full。"""
+    if not cfg.get("gate_incremental"):
+        return True, "incremental off"
+    if cfg.get("final_gate_full"):
+        return True, "requested"
+    every = int(cfg.get("final_gate_full_every", 5))
+    try:
+        since = int(json.loads((impact_dir(repo_root) / "final_gate.json").read_text(encoding="utf-8")).get("incremental_since_full", 0))
+    except (OSError, ValueError):
+        since = every
+    if every <= 0 or since + 1 >= every:
+        return True, f"scheduled (every {every} final gates)"
+    return False, f"{since + 1}/{every} before next full run"
+
+
+def note_final_gate(repo_root: Path, full: bool) -> None:
+    p = impact_dir(repo_root) / "final_gate.json"
+    try:
+        since = int(json.loads(p.read_text(encoding="utf-8")).get("incremental_since_full", 0))
+    except (OSError, ValueError):
+        since = 0
+    write_json_atomic(p, {"incremental_since_full": 0 if full else since + 1, "updated": now_iso()})
 
 
 def load_config(repo_root: Path) -> Dict[str, Any]:
@@ -142,28 +1120,277 @@ def team_ids(track_key: str, count: int) -> List[str]:
     return [f"{track_key}{i:02d}" for i in range(1, count + 1)]
 
 
-def ensure_worktree(team_id: str, repo_root: Path, worktrees_dir: Path, base_ref: str) -> Path:
-    wt_path = worktrees_dir / team_id
-    branch = f"arena/{team_id}"
-    if wt_path.exists():
-        return wt_path
-    ensure_dir(wt_path.parent)
-    if branch_exists(branch, repo_root):
-        sh(["git", "worktree", "add", str(wt_path), branch], cwd=repo_root, check=True)
-    else:
-        sh(["git", "worktree", "add", "-b", branch, str(wt_path), base_ref], cwd=repo_root, check=True)
-    return wt_path
+WORKTREE_PROFILE = "arena-profile.json"
+GIT_LOCK_RETRIES = 4
+
+
+def default_worktree_jobs() -> int:
+    return max(4, default_jobs())
+
+
+def worktree_gitdir(wt_path: Path) -> Optional[Path]:
+    """worktree の `.git` ファイル（`gitdir: ...`）から管理ディレクトリを読む。git は呼ばない。"""
+    try:
+        text = (wt_path / ".git").read_text(encoding="utf-8").strip()
+    except OSError:
+        return None
+    if not text.startswith("gitdir: "):
+        return None
+    gitdir = Path(text[len("gitdir: "):])
+    if not gitdir.is_absolute():
+        gitdir = (wt_path / gitdir).resolve()
+    return gitdir if gitdir.is_dir() else None
+
 
+def worktree_profile(sparse: Optional[List[str]], cone: bool = True) -> Dict[str, Any]:
+    """チェックアウト方式（フル / sparse パターン + cone）。worktree の管理ディレクトリに記録して比較する。"""
+    return {"sparse": list(sparse or []), "cone": bool(cone) if sparse else None}
 
-def ensure_integration_worktree(repo_root: Path, worktrees_dir: Path, base_ref: str, integration_branch: str) -> Path:
-    wt_path = (worktrees_dir / "INTEGRATION").resolve()
-    if wt_path.exists():
-        return wt_path
-    if branch_exists(integration_branch, repo_root):
-        sh(["git", "worktree", "add", str(wt_path), integration_branch], cwd=repo_root, check=True)
+
+def worktree_state(wt_path: Path, branch: str, profile: Dict[str, Any]) -> str:
+    """missing / ok / reprofile（ブランチは正しいが sparse 設定が違う）/ mismatch をファイル読みだけで判定する。"""
+    if not wt_path.exists():
+        return "missing"
+    gitdir = worktree_gitdir(wt_path)
+    if gitdir is None:
+        return "mismatch"
+    try:
+        head = (gitdir / "HEAD").read_text(encoding="utf-8").strip()
+    except OSError:
+        return "mismatch"
+    if head != f"ref: refs/heads/{branch}":
+        return "mismatch"
+    try:
+        saved = json.loads((gitdir / WORKTREE_PROFILE).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        saved = worktree_profile(None)
+    return "ok" if saved == profile else "reprofile"
+
+
+async def git_retry(args: List[str], cwd: Path) -> arena_async.ProcResult:
+    """並行 worktree 操作で共有 ref/config のロックが衝突した時だけ少し待って再試行する。"""
+    for attempt in range(GIT_LOCK_RETRIES + 1):
+        cp = await arena_async.run(["git"] + args, cwd)
+        if cp.returncode == 0:
+            return cp
+        if ".lock" not in cp.stderr or attempt == GIT_LOCK_RETRIES:
+            break
+        await asyncio.sleep(0.05 * (2 ** attempt))
+    raise RuntimeError(f"git {' '.join(args[:3])} failed in {cwd}: {cp.stderr.strip()}")
+
+
+async def provision_worktree(repo_root: Path, wt_path: Path, branch: str, base_ref: str, has_branch: bool, profile: Dict[str, Any], state: str, slot: Optional[Path] = None, new_round: bool = False, keep_ignored: bool = True) -> str:
+    """worktree 1 つを揃える。
+
+    slot（プールの worktree）があれば `git worktree move` して base_ref へリセット・clean して再利用する。
+    無ければ新規作成（sparse 指定時は --no-checkout → sparse-checkout set → read-tree）。
+    new_round なら既存ブランチも base_ref から作り直す（旧コミットは reflog に残る）。
+    """
+    fresh = new_round or not has_branch
+    if state == "missing" and slot is not None:
+        ensure_dir(wt_path.parent)
+        await git_retry(["worktree", "move", str(slot), str(wt_path)], repo_root)
+        gitdir = worktree_gitdir(wt_path)
+        saved = None
+        if gitdir is not None:
+            try:
+                saved = json.loads((gitdir / WORKTREE_PROFILE).read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                saved = worktree_profile(None)
+        if saved != profile:
+            if profile["sparse"]:
+                await git_retry(["sparse-checkout", "set", "--cone" if profile["cone"] else "--no-cone"] + profile["sparse"], wt_path)
+            else:
+                await git_retry(["sparse-checkout", "disable"], wt_path)
+        await git_retry(["checkout", "--quiet", "--force", "-B", branch, base_ref] if fresh else ["checkout", "--quiet", "--force", branch], wt_path)
+        await git_retry(["clean", "-fdq"] + ([] if keep_ignored else ["-x"]), wt_path)
+        result = "recycled"
+    elif state == "missing":
+        ensure_dir(wt_path.parent)
+        add = ["worktree", "add", "--quiet"] + (["--no-checkout"] if profile["sparse"] else [])
+        add += ["-B" if has_branch else "-b", branch, str(wt_path), base_ref] if fresh else [str(wt_path), branch]
+        await git_retry(add, repo_root)
+        if profile["sparse"]:
+            await git_retry(["sparse-checkout", "set", "--cone" if profile["cone"] else "--no-cone"] + profile["sparse"], wt_path)
+            await git_retry(["read-tree", "-mu", "HEAD"], wt_path)
+        result = "created"
     else:
-        sh(["git", "worktree", "add", "-b", integration_branch, str(wt_path), base_ref], cwd=repo_root, check=True)
-    return wt_path
+        if profile["sparse"]:
+            await git_retry(["sparse-checkout", "set", "--cone" if profile["cone"] else "--no-cone"] + profile["sparse"], wt_path)
+        else:
+            await git_retry(["sparse-checkout", "disable"], wt_path)
+        result = "reprofiled"
+    gitdir = worktree_gitdir(wt_path)
+    if gitdir is not None:
+        write_json_atomic(gitdir / WORKTREE_PROFILE, profile)
+    return result
+
+
+DEFAULT_POOL_MAX = 16
+
+
+def pool_path(repo_root: Path) -> Path:
+    return repo_root / ".arena" / "worktree_pool.json"
+
+
+class WorktreePool:
+    """使い終わった worktree を `<worktrees_dir>/.pool/` に detached のまま保持するウォームプール。
+
+    再利用は新規 checkout ではなく move + reset + clean（ignored なビルドキャッシュは既定で残す）。
+    最終利用時刻は `.arena/worktree_pool.json` に持ち、capacity を超えたら古い順に削除する。
+    """
+
+    def __init__(self, repo_root: Path, worktrees_dir: Path, capacity: int = 16):
+        self.repo_root = repo_root
+        self.dir = worktrees_dir / ".pool"
+        self.capacity = max(0, int(capacity))
+        try:
+            data = json.loads(pool_path(repo_root).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            data = {}
+        self.slots: Dict[str, Dict[str, Any]] = {name: meta for name, meta in data.get("slots", {}).items() if worktree_gitdir(self.dir / name) is not None}
+
+    def save(self) -> None:
+        write_json_atomic(pool_path(self.repo_root), {"slots": self.slots})
+
+    def take(self, names: List[str]) -> Dict[str, Path]:
+        """names の各 worktree に割り当てるスロットを取り出す。
+
+        同じ名前から戻ったスロット（そのチームのキャッシュが残っている）を優先し、残りは最近使った順。
+        """
+        order = sorted(self.slots, key=lambda k: self.slots[k].get("last_used", 0), reverse=True)
+        got: Dict[str, Path] = {}
+        for name in names:
+            same = next((k for k in order if self.slots[k].get("from") == name), None)
+            if same is not None:
+                got[name] = self.dir / same
+                order.remove(same)
+        for name in names:
+            if name not in got and order:
+                got[name] = self.dir / order.pop(0)
+        for slot in got.values():
+            del self.slots[slot.name]
+        return got
+
+    def _free_name(self) -> str:
+        i = 1
+        while f"w{i:04d}" in self.slots or (self.dir / f"w{i:04d}").exists():
+            i += 1
+        return f"w{i:04d}"
+
+    @arena_trace.traced("worktree.park")
+    def park(self, worktrees: List[Tuple[str, Path]]) -> int:
+        """worktree をプールへ移して HEAD を detach する（ブランチは残るので次の -B で付け替えられる）。"""
+        live = [(name, path) for name, path in worktrees if worktree_gitdir(path) is not None]
+        if not live:
+            return 0
+        ensure_dir(self.dir)
+        moves = []
+        for name, path in live:
+            slot = self._free_name()
+            self.slots[slot] = {"last_used": time.time(), "from": name}
+            moves.append((name, path, self.dir / slot))
+
+        async def run_all() -> None:
+            async def one(name: str, path: Path, slot: Path) -> None:
+                try:
+                    await git_retry(["worktree", "move", str(path), str(slot)], self.repo_root)
+                    await git_retry(["checkout", "--quiet", "--detach"], slot)
+                except RuntimeError as e:
+                    self.slots.pop(slot.name, None)
+                    print(f"[pool] WARNING: could not park {name}: {e}")
+            await asyncio.gather(*(one(*m) for m in moves))
+
+        asyncio.run(run_all())
+        self.save()
+        return len(moves)
+
+    @arena_trace.traced("worktree.evict")
+    def evict(self, capacity: Optional[int] = None) -> int:
+        cap = self.capacity if capacity is None else max(0, capacity)
+        names = sorted(self.slots, key=lambda k: self.slots[k].get("last_used", 0))
+        victims = names[: max(0, len(names) - cap)]
+        for name in victims:
+            cp = sh(["git", "worktree", "remove", "--force", str(self.dir / name)], cwd=self.repo_root, check=False)
+            if cp.returncode != 0:
+                shutil.rmtree(self.dir / name, ignore_errors=True)
+            del self.slots[name]
+        if victims:
+            sh(["git", "worktree", "prune"], cwd=self.repo_root, check=False)
+            self.save()
+        return len(victims)
+
+
+@arena_trace.traced("worktree.provision")
+def provision_worktrees(repo_root: Path, worktrees_dir: Path, specs: List[Tuple[str, str]], base_ref: str, jobs: Optional[int] = None, sparse: Optional[List[str]] = None, cone: bool = True, pool: Optional[WorktreePool] = None, new_round: bool = False, keep_ignored: bool = True) -> Dict[str, Path]:
+    """specs（(ディレクトリ名, ブランチ) の列）の worktree を上限 jobs 並列で揃え、名前→パスを返す。
+
+    既に正しいブランチ・チェックアウト方式の worktree はファイル読みだけで判定して git を呼ばない。
+    new_round なら既存の worktree を一旦プールへ戻し、全チームを base_ref から始め直す。
+    足りない worktree はプールから再利用し、それでも足りない分だけ新規作成する。
+    """
+    profile = worktree_profile(sparse, cone)
+    paths = {name: (worktrees_dir / name).resolve() for name, _ in specs}
+    if new_round and pool is not None:
+        parked = pool.park([(name, paths[name]) for name, _ in specs if paths[name].exists()])
+        if parked:
+            print(f"[worktree] new round: parked {parked} worktrees in {pool.dir}")
+    states = {name: worktree_state(paths[name], branch, profile) for name, branch in specs}
+    for name, branch in specs:
+        if states[name] == "mismatch":
+            print(f"[worktree] WARNING: {paths[name]} is not a worktree on {branch}; leaving it as is")
+    todo = [(name, branch) for name, branch in specs if states[name] in ("missing", "reprofile")]
+    if not todo:
+        print(f"[worktree] {len(specs)} worktrees already in place")
+        return paths
+    ensure_dir(worktrees_dir)
+    sh(["git", "worktree", "prune"], cwd=repo_root, check=False)
+    branches = set(git_out(["for-each-ref", "--format=%(refname:short)", "refs/heads"], repo_root).splitlines())
+    if profile["sparse"]:
+        # sparse 設定は worktree 毎（config.worktree）。共有 config への書き込みは並列化前に 1 回だけ
+        sh(["git", "config", "extensions.worktreeConfig", "true"], cwd=repo_root, check=True)
+    missing = [name for name, _ in todo if states[name] == "missing"]
+    slots = pool.take(missing) if pool is not None else {}
+    jobs = max(1, jobs or default_worktree_jobs())
+    wall_start = time.monotonic()
+    done: List[Tuple[str, str, float]] = []
+    failed: List[str] = []
+
+    async def one(sem: asyncio.Semaphore, name: str, branch: str) -> None:
+        async with sem:
+            t = time.monotonic()
+            with arena_trace.span("worktree", team=name, branch=branch, state=states[name], pooled=name in slots) as attrs:
+                try:
+                    result = await provision_worktree(repo_root, paths[name], branch, base_ref, branch in branches, profile, states[name], slots.get(name), new_round, keep_ignored)
+                except RuntimeError as e:
+                    attrs["error"] = "git"
+                    failed.append(name)
+                    print(f"[worktree] ({len(done) + len(failed)}/{len(todo)}) {name}: ERROR {e}")
+                    return
+            elapsed = time.monotonic() - t
+            done.append((name, result, elapsed))
+            print(f"[worktree] ({len(done) + len(failed)}/{len(todo)}) {name}: {result} ({human_sec(elapsed)})")
+
+    async def run_all() -> None:
+        sem = asyncio.Semaphore(jobs)
+        await asyncio.gather(*(one(sem, name, branch) for name, branch in todo))
+
+    asyncio.run(run_all())
+    if pool is not None:
+        pool.save()
+        pool.evict()
+    summed = sum(e for _, _, e in done)
+    recycled = sum(1 for _, r, _ in done if r == "recycled")
+    mode = f"sparse{' cone' if profile['cone'] else ''}: {' '.join(profile['sparse'])}" if profile["sparse"] else "full checkout"
+    print(f"[worktree] {len(done)} provisioned ({recycled} from pool), {len(specs) - len(todo)} already in place, {len(failed)} failed; jobs={jobs}, wall {human_sec(time.monotonic() - wall_start)}, summed {human_sec(summed)} ({mode})")
+    if failed:
+        raise RuntimeError(f"worktree provisioning failed for: {', '.join(sorted(failed))}")
+    return paths
+
+
+def arena_worktree_specs(tracks: List[Tuple[str, int]], integration_branch: str) -> List[Tuple[str, str]]:
+    specs = [(tid, f"arena/{tid}") for key, count in tracks for tid in team_ids(key, count)]
+    return specs + [("INTEGRATION", integration_branch)]
 
 
 def detect_gate_cmd(repo_root: Path) -> Optional[str]:
@@ -188,33 +1415,623 @@ def detect_gate_cmd(repo_root: Path) -> Optional[str]:
     return None
 
 
-def run_gate_one(repo_root: Path, team_id: str, wt_path: Path, gate_cmd: str, timeout_sec: int, force: bool) -> Dict[str, Any]:
-    branch = git_out(["rev-parse", "--abbrev-ref", "HEAD"], wt_path)
-    commit = git_out(["rev-parse", "HEAD"], wt_path)
-    dirty = is_dirty(wt_path)
+def rotate_log(log_path: Path, keep: int = 5, max_bytes: int = 50 * 1024 * 1024) -> None:
+    """既存ログを <name>.1.gz へ圧縮して世代をずらす。世代数 keep・合計 max_bytes を超えた古い世代は削除。"""
+    if keep <= 0:
+        if log_path.exists():
+            log_path.unlink()
+        return
+    gens = [log_path.with_name(f"{log_path.name}.{i}.gz") for i in range(1, keep + 2)]
+    if log_path.exists() and log_path.stat().st_size > 0:
+        for i in range(keep - 1, 0, -1):
+            if gens[i - 1].exists():
+                os.replace(gens[i - 1], gens[i])
+        with open(log_path, "rb") as src, gzip.open(gens[0], "wb", compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst)
+        log_path.unlink()
+    total = 0
+    for g in gens:
+        if not g.exists():
+            continue
+        total += g.stat().st_size
+        if g == gens[-1] or total > max_bytes:
+            g.unlink()
+
+
+def gate_log_path(repo_root: Path, name: str, cfg: Optional[Dict[str, Any]] = None) -> Path:
+    cfg = cfg or {}
+    ensure_dir(logs_dir(repo_root))
+    p = logs_dir(repo_root) / f"{name}.log"
+    rotate_log(p, keep=int(cfg.get("gate_log_keep", 5)), max_bytes=int(cfg.get("gate_log_max_bytes", 50 * 1024 * 1024)))
+    return p
+
+
+@dataclass
+class GateRun:
+    exit_code: int
+    elapsed: float
+    tail: List[str]
+    cancelled: bool = False
+    timed_out: bool = False
+    rusage: Dict[str, Any] = field(default_factory=dict)
+
+
+def rusage_dict(ru: Any) -> Dict[str, Any]:
+    """wait4 の rusage（ゲートと、それが wait した子孫の合計）を記録用 dict にする。"""
+    rss_kb = ru.ru_maxrss // 1024 if sys.platform == "darwin" else ru.ru_maxrss
+    return {"cpu_user_sec": round(ru.ru_utime, 3), "cpu_sys_sec": round(ru.ru_stime, 3), "cpu_sec": round(ru.ru_utime + ru.ru_stime, 3), "max_rss_kb": int(rss_kb), "io_in_blocks": int(ru.ru_inblock), "io_out_blocks": int(ru.ru_oublock), "io_blocks": int(ru.ru_inblock + ru.ru_oublock)}
+
+
+async def run_streamed_async(cmd: str, cwd: Path, log_path: Path, header: str, timeout_sec: int, tail_lines: int = 40, deadline: Optional[Callable[[], Optional[float]]] = None, on_line: Optional[Callable[[str], None]] = None, append: bool = False) -> GateRun:
+    """`bash -lc cmd` の stdout/stderr を逐次ログへ書き出す（`tail -f` 可）。メモリには末尾 tail_lines 行だけ保持。
+
+    実行は arena_async（共有セマフォ配下の非同期サブプロセス）。コマンドは独自のプロセスグループで
+    起動し、timeout_sec を超えたら孫プロセスも含めてグループごと kill して timed_out として返す
+    （例外は投げない）。deadline() が返す秒数を経過した場合も同様に打ち切り、cancelled として返す（race モード用）。
+    """
+    tail: Deque[str] = deque(maxlen=max(1, tail_lines))
+    with open(log_path, "a" if append else "w", encoding="utf-8", buffering=1) as log:
+        log.write(header + "\n--- OUTPUT (stdout+stderr) ---\n")
+
+        def emit(line: str) -> None:
+            log.write(line)
+            tail.append(line.rstrip("\n"))
+            if on_line:
+                on_line(line)
+
+        res = await arena_async.run(["bash", "-lc", cmd], cwd, timeout=timeout_sec, deadline=deadline, on_line=emit, merge_stderr=True)
+        note = " (timeout)" if res.timed_out else " (cancelled)" if res.cancelled else ""
+        log.write(f"\n--- END ---\nexit: {res.returncode}{note}\nelapsed: {res.elapsed:.3f}s\n")
+    return GateRun(exit_code=res.returncode if res.returncode is not None else -1, elapsed=res.elapsed, tail=list(tail), cancelled=res.cancelled, timed_out=res.timed_out, rusage=rusage_dict(res.rusage))
+
+
+def run_streamed(cmd: str, cwd: Path, log_path: Path, header: str, timeout_sec: int, tail_lines: int = 40, deadline: Optional[Callable[[], Optional[float]]] = None, on_line: Optional[Callable[[str], None]] = None, append: bool = False) -> GateRun:
+    """run_streamed_async の sync 版（イベントループ外から 1 本だけ実行する時用）。"""
+    return asyncio.run(run_streamed_async(cmd, cwd, log_path, header, timeout_sec, tail_lines, deadline, on_line, append))
+
+
+class RaceBoard:
+    """race モード: トラック毎の暫定首位（pass の最短 elapsed）を保持する。
+
+    rank は (status, elapsed) 順なので、首位より長く走っているゲートはもう勝てない。
+    limit() をゲートの deadline に渡すと、その時点で打ち切られる。
+    incremental（部分実行）の結果は全テスト実行と比べられないので首位にしない。
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.leaders: Dict[str, Tuple[float, str]] = {}
+
+    def offer(self, team: str, elapsed: Optional[float], scope: Optional[str] = None) -> bool:
+        if not elapsed or scope == "incremental":
+            return False
+        track = track_of(team)
+        with self._lock:
+            cur = self.leaders.get(track)
+            if cur is None or elapsed < cur[0]:
+                self.leaders[track] = (float(elapsed), team)
+                return True
+        return False
+
+    def limit(self, team: str) -> Optional[float]:
+        with self._lock:
+            cur = self.leaders.get(track_of(team))
+        return cur[0] if cur else None
+
+    def leader(self, team: str) -> Optional[Tuple[float, str]]:
+        with self._lock:
+            return self.leaders.get(track_of(team))
+
+
+def parse_bench_line(line: str) -> Dict[str, float]:
+    """bench_cmd の 1 行（JSON lines）から指標を取り出す。
+
+    `{"metric": "name", "value": 1.2}` 形式と `{"name": 1.2, ...}` 形式の両方を受け付け、
+    JSON でない行は無視する。
+    """
+    line = line.strip()
+    if not line.startswith("{"):
+        return {}
+    try:
+        obj = json.loads(line)
+    except ValueError:
+        return {}
+    if not isinstance(obj, dict):
+        return {}
+    if "metric" in obj and isinstance(obj.get("value"), (int, float)):
+        return {str(obj["metric"]): float(obj["value"])}
+    return {str(k): float(v) for k, v in obj.items() if isinstance(v, (int, float)) and not isinstance(v, bool)}
+
+
+def median_ci(values: List[float], conf: float = 0.95) -> Tuple[float, float]:
+    """中央値の分布によらない信頼区間（二項分布の順序統計量）。標本が少ない時は [min, max]。"""
+    xs = sorted(values)
+    n = len(xs)
+    k = 0
+    cum = 0.0
+    for i in range(n // 2):
+        cum += math.comb(n, i) / (2 ** n)
+        if 2 * cum > 1 - conf:
+            break
+        k = i + 1
+    k = max(k, 1)
+    return xs[k - 1], xs[n - k]
+
+
+def summarize_samples(values: List[float]) -> Dict[str, Any]:
+    med = statistics.median(values)
+    lo, hi = median_ci(values)
+    return {
+        "n": len(values),
+        "median": med,
+        "mean": statistics.fmean(values),
+        "stdev": statistics.stdev(values) if len(values) > 1 else 0.0,
+        "mad": statistics.median([abs(v - med) for v in values]),
+        "min": min(values),
+        "max": max(values),
+        "ci95": [lo, hi],
+        "samples": values,
+    }
+
+
+@arena_trace.traced("bench")
+async def run_bench(repo_root: Path, team_id: str, wt_path: Path, cfg: Dict[str, Any]) -> Dict[str, Any]:
+    """pass したチームで bench_cmd を warmup + K 回実行し、指標毎の中央値とばらつきを返す。
+
+    並列ゲートの干渉でノイズが乗らないよう、実行中のゲートが終わるのを待ってランナーの全スロットを
+    押さえ（arena_async.Runner.exclusive）、その間はベンチマークだけを 1 本ずつ実行する。
+    """
+    bench_cmd = cfg["bench_cmd"]
+    runs = max(1, int(cfg.get("bench_runs", 5)))
+    warmup = max(0, int(cfg.get("bench_warmup", 1)))
+    timeout_sec = int(cfg.get("bench_timeout_sec", cfg.get("gate_timeout_sec", 1800)))
+    log_path = gate_log_path(repo_root, f"{team_id}.bench", cfg)
+    samples: Dict[str, List[float]] = {}
+    out: Dict[str, Any] = {"cmd": bench_cmd, "runs": runs, "warmup": warmup, "status": "ok"}
+    async with arena_async.runner().exclusive("bench"):
+        for i in range(warmup + runs):
+            label = f"warmup {i + 1}/{warmup}" if i < warmup else f"run {i - warmup + 1}/{runs}"
+            got: Dict[str, float] = {}
+            run = await run_streamed_async(bench_cmd, wt_path, log_path, f"# Bench: {team_id} ({label})\ncmd: {bench_cmd}\n", timeout_sec, on_line=lambda line: got.update(parse_bench_line(line)), append=i > 0)
+            if run.timed_out or run.exit_code != 0:
+                out.update({"status": "fail", "exit_code": run.exit_code, "note": f"bench {label} failed", "log_tail": run.tail})
+                break
+            if i >= warmup:
+                for k, v in got.items():
+                    samples.setdefault(k, []).append(v)
+    out["metrics"] = {k: summarize_samples(v) for k, v in sorted(samples.items())}
+    return out
+
+
+def needs_bench(cfg: Optional[Dict[str, Any]], result: Dict[str, Any]) -> bool:
+    if not cfg or not cfg.get("bench_cmd") or result.get("status") != "pass":
+        return False
+    return (result.get("bench") or {}).get("cmd") != cfg["bench_cmd"]
+
+
+async def run_gate_one(repo_root: Path, team_id: str, wt_path: Path, gate_cmd: str, timeout_sec: int, force: bool, cache: Optional[GateCache] = None, meta: Optional[GitMeta] = None, cfg: Optional[Dict[str, Any]] = None, race: Optional[RaceBoard] = None, deps: Optional[DepCache] = None, impact: Optional[ImpactIndex] = None) -> Dict[str, Any]:
+    meta = meta or GitMeta(repo_root)
+    with arena_trace.span("git.probe", team=team_id):
+        info, dirty = await meta.probe(wt_path)
+    branch = info.branch
+    commit = info.commit
     prev = read_result(repo_root, team_id)
-    if prev and (not force) and (prev.get("commit") == commit) and (prev.get("dirty") == dirty):
-        return prev
+    # 部分実行（incremental）の結果は全テスト実行の代わりにならない。ゲートコマンドが変わった場合も再実行
+    reusable = prev is not None and prev.get("gate_cmd") == gate_cmd and (impact is not None or prev.get("scope") != "incremental")
+    # 適応期限（base の p95 由来）で打ち切った timeout は再利用せず、固定の gate_timeout_sec で取り直す
+    cap = int((cfg or {}).get("gate_timeout_sec", timeout_sec))
+    if prev and prev.get("status") == "timeout" and prev.get("commit") == commit and int(prev.get("deadline_sec") or cap) < cap:
+        reusable = False
+        timeout_sec = max(timeout_sec, cap)
+    if prev and reusable and (not force) and (prev.get("commit") == commit) and (prev.get("dirty") == dirty) and prev.get("status") != "cancelled":
+        if race and prev.get("status") == "pass":
+            race.offer(team_id, prev.get("elapsed_sec"), prev.get("scope"))
+        return dict(prev, reused=True)
     result: Dict[str, Any] = {"team": team_id, "branch": branch, "commit": commit, "dirty": dirty, "gate_cmd": gate_cmd, "timestamp": now_iso()}
-    ensure_dir(logs_dir(repo_root))
-    log_path = logs_dir(repo_root) / f"{team_id}.log"
+    log_path = gate_log_path(repo_root, team_id, cfg)
     if dirty:
         result.update({"status": "dirty", "exit_code": None, "elapsed_sec": None, "note": "Worktree has uncommitted changes."})
         log_path.write_text("[DIRTY] Uncommitted changes exist.\n", encoding="utf-8")
         write_result(repo_root, team_id, result)
         return result
-    start = time.monotonic()
-    proc = subprocess.run(["bash", "-lc", gate_cmd], cwd=str(wt_path), text=True, capture_output=True, timeout=timeout_sec)
-    elapsed = time.monotonic() - start
-    log_text = f"# Gate Result: {team_id}\ntimestamp: {result['timestamp']}\nbranch: {branch}\ncommit: {commit}\ncmd: {gate_cmd}\nexit: {proc.returncode}\nelapsed: {elapsed:.3f}s\n\n--- STDOUT ---\n{proc.stdout or ''}\n--- STDERR ---\n{proc.stderr or ''}\n"
-    log_path.write_text(log_text, encoding="utf-8")
-    status = "pass" if proc.returncode == 0 else "fail"
-    result.update({"status": status, "exit_code": proc.returncode, "elapsed_sec": round(elapsed, 3)})
-    write_result(repo_root, team_id, result)
+    tree = await meta.tree_async(wt_path)
+    result["tree"] = tree
+    with arena_trace.span("gate.cache", tree=tree[:12]) as attrs:
+        hit, owned = await cache.acquire(tree) if (cache and not force) else (None, False)
+        attrs["hit"] = bool(hit)
+    if hit:
+        result.update({"status": hit["status"], "exit_code": hit.get("exit_code"), "elapsed_sec": hit.get("elapsed_sec"), "rusage": hit.get("rusage") or {}, "cache": "hit", "cached_from": hit.get("team")})
+        if hit.get("bench"):
+            result["bench"] = hit["bench"]
+        log_path.write_text(f"# Gate Result: {team_id}\ntimestamp: {result['timestamp']}\nbranch: {branch}\ncommit: {commit}\ntree: {tree}\ncmd: {gate_cmd}\n\n[CACHED] reused result of {hit.get('team')} @ {str(hit.get('commit'))[:7]} ({hit.get('created')}): exit {hit.get('exit_code')}\n", encoding="utf-8")
+        if needs_bench(cfg, result):
+            assert cfg is not None
+            result["bench"] = await run_bench(repo_root, team_id, wt_path, cfg)
+        write_result(repo_root, team_id, result)
+        if race and result["status"] == "pass":
+            race.offer(team_id, result["elapsed_sec"], result.get("scope"))
+        return dict(result, reused=True)
+    try:
+        run_cmd = gate_cmd
+        if impact:
+            with arena_trace.span("impact.select", team=team_id) as attrs:
+                tests, why = await impact.select(commit, wt_path)
+                attrs.update(tests=len(tests) if tests is not None else None, reason=why)
+            result.update({"scope": "incremental" if tests is not None else "full", "impact": why})
+            if tests is not None:
+                run_cmd = impact.command(tests)
+                result["tests_selected"] = tests
+        header = f"# Gate Result: {team_id}\ntimestamp: {result['timestamp']}\nbranch: {branch}\ncommit: {commit}\ntree: {tree}\ncmd: {run_cmd}\n"
+        prefix = await deps.prepare(team_id, wt_path) if deps else ""
+        with arena_trace.span("gate.run", team=team_id, track=track_of(team_id), commit=commit[:12]):
+            run = await run_streamed_async(prefix + run_cmd, wt_path, log_path, header, timeout_sec, int((cfg or {}).get("gate_log_tail_lines", 40)), deadline=(lambda: race.limit(team_id)) if race else None)
+        if run.timed_out:
+            status = "timeout"
+            result["note"] = f"gate exceeded deadline {human_sec(timeout_sec)}; process group killed"
+        elif run.cancelled:
+            status = "cancelled"
+            leader = race.leader(team_id) if race else None
+            result["note"] = f"race: cannot beat leader {leader[1]} ({human_sec(leader[0])})" if leader else "race: cancelled"
+        else:
+            status = "pass" if run.exit_code == 0 else "fail"
+        result.update({"status": status, "exit_code": None if run.timed_out else run.exit_code, "elapsed_sec": round(run.elapsed, 3), "deadline_sec": timeout_sec, "rusage": run.rusage})
+        if status != "pass":
+            result["log_tail"] = run.tail
+        if needs_bench(cfg, result):
+            assert cfg is not None
+            result["bench"] = await run_bench(repo_root, team_id, wt_path, cfg)
+        write_result(repo_root, team_id, result)
+        if race and status == "pass":
+            race.offer(team_id, result["elapsed_sec"], result.get("scope"))
+        if cache and result.get("scope") != "incremental" and not (status == "timeout" and timeout_sec < cap):
+            cache.put(tree, result)
+    finally:
+        if cache:
+            cache.release(tree, owned)
     return result
 
 
-def run_gate_all(repo_root: Path, cfg: Dict[str, Any], watch: bool, interval: int, force: bool) -> int:
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_ALL = "*"
+
+
+class ChangeWatcher:
+    """ファイル変更を待つ。Linux では inotify（ctypes）、使えない環境では stat ポーリング。
+
+    add() で「監視するファイル → キー」を登録し、wait() は変化したキーの集合を返す。
+    inotify はファイルの親ディレクトリを監視するので、git の lock→rename 更新も拾える。
+    """
+
+    def __init__(self, poll_interval: float = 1.0):
+        self.poll_interval = max(0.1, float(poll_interval))
+        self.backend = "poll"
+        self._keys: Dict[str, Set[str]] = {}
+        self._fd: Optional[int] = None
+        self._wd: Dict[int, str] = {}
+        self._snap: Dict[str, Optional[Tuple[int, int, int]]] = {}
+
+    def add(self, path: Path, key: str) -> None:
+        self._keys.setdefault(os.path.abspath(str(path)), set()).add(key)
+
+    def start(self) -> str:
+        dirs = sorted({os.path.dirname(p) for p in self._keys})
+        if sys.platform.startswith("linux") and all(os.path.isdir(d) for d in dirs):
+            try:
+                self._start_inotify(dirs)
+                self.backend = "inotify"
+            except OSError:
+                self.close()
+        if self.backend == "poll":
+            self._snap = {p: self._stat(p) for p in self._keys}
+        return self.backend
+
+    def _start_inotify(self, dirs: List[str]) -> None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._fd = fd
+        mask = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+        for d in dirs:
+            wd = libc.inotify_add_watch(fd, d.encode(), mask)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed: {d}")
+            self._wd[wd] = d
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = None
+        self._wd.clear()
+
+    @staticmethod
+    def _stat(p: str) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(p)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def _poll_once(self) -> Set[str]:
+        changed: Set[str] = set()
+        for p, keys in self._keys.items():
+            cur = self._stat(p)
+            if cur != self._snap.get(p):
+                self._snap[p] = cur
+                changed |= keys
+        return changed
+
+    def _read_inotify(self, timeout: Optional[float]) -> Set[str]:
+        assert self._fd is not None
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+        data = os.read(self._fd, 64 * 1024)
+        changed: Set[str] = set()
+        off = 0
+        while off + 16 <= len(data):
+            wd, mask, _cookie, length = struct.unpack_from("iIII", data, off)
+            name = data[off + 16 : off + 16 + length].split(b"\0", 1)[0].decode(errors="replace")
+            off += 16 + length
+            if mask & IN_Q_OVERFLOW:
+                changed.add(WATCH_ALL)
+                continue
+            d = self._wd.get(wd)
+            if d is not None:
+                changed |= self._keys.get(os.path.join(d, name), set())
+        return changed
+
+    def _next(self, timeout: Optional[float]) -> Set[str]:
+        if self.backend == "inotify":
+            return self._read_inotify(timeout)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            step = self.poll_interval if deadline is None else min(self.poll_interval, max(0.0, deadline - time.monotonic()))
+            time.sleep(step)
+            changed = self._poll_once()
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+    def wait(self, debounce: float = 2.0) -> Set[str]:
+        """変化が起きるまで待ち、その後 debounce 秒静かになるまで変化をまとめて返す。"""
+        changed: Set[str] = set()
+        while not changed:
+            changed = self._next(None)
+        limit = time.monotonic() + max(10.0, debounce * 5)
+        while debounce > 0 and time.monotonic() < limit:
+            more = self._next(debounce)
+            if not more:
+                break
+            changed |= more
+        return changed
+
+
+def worktree_git_dirs(wt_path: Path) -> Tuple[Path, Path]:
+    """worktree の (gitdir, commondir) を git を起動せずに .git ファイルから解決する。"""
+    dot_git = wt_path / ".git"
+    if dot_git.is_dir():
+        return dot_git, dot_git
+    text = dot_git.read_text(encoding="utf-8").strip()
+    gitdir = Path(text.split(":", 1)[1].strip())
+    if not gitdir.is_absolute():
+        gitdir = (wt_path / gitdir).resolve()
+    common = gitdir
+    cd = gitdir / "commondir"
+    if cd.exists():
+        common = Path(cd.read_text(encoding="utf-8").strip())
+        if not common.is_absolute():
+            common = (gitdir / common).resolve()
+    return gitdir, common
+
+
+def watch_team_refs(watcher: ChangeWatcher, teams: List[Tuple[str, Path]]) -> None:
+    for tid, wt in teams:
+        gitdir, common = worktree_git_dirs(wt)
+        watcher.add(gitdir / "HEAD", tid)
+        watcher.add(common / "refs" / "heads" / "arena" / tid, tid)
+        watcher.add(common / "packed-refs", WATCH_ALL)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+@arena_trace.traced("gate.deadline")
+def adaptive_deadline(repo_root: Path, cfg: Dict[str, Any], meta: GitMeta) -> Tuple[int, str]:
+    """base ブランチのゲート所要時間 p95 × gate_deadline_factor をチームのゲート期限にする。
+
+    履歴が gate_deadline_min_samples 件未満なら gate_timeout_sec をそのまま使う。
+    結果は [gate_deadline_min_sec, gate_timeout_sec] に丸める。
+    """
+    cap = int(cfg.get("gate_timeout_sec", 1800))
+    if not cfg.get("gate_adaptive_deadline", True):
+        return cap, "fixed"
+    base_ref = cfg.get("base_ref", "main")
+    tree = meta.ref_tree(base_ref)
+    samples = arena_store(repo_root).base_durations(tree)
+    if len(samples) < int(cfg.get("gate_deadline_min_samples", 3)):
+        return cap, f"fixed (only {len(samples)} base runs)"
+    p95 = percentile(samples, 95)
+    factor = float(cfg.get("gate_deadline_factor", 3.0))
+    floor = int(cfg.get("gate_deadline_min_sec", 120))
+    deadline = int(min(cap, max(floor, math.ceil(p95 * factor))))
+    return deadline, f"adaptive: p95 {human_sec(p95)} x {factor:g} over {len(samples)} base runs, cap {human_sec(cap)}"
+
+
+@arena_trace.traced("gate.schedule")
+def schedule_gates(repo_root: Path, todo: List[Tuple[str, Path]], meta: GitMeta, cache: Optional[GateCache], force: bool, track_major: bool = False) -> List[Tuple[str, Path]]:
+    """勝者が最も早く出そうな順（shortest expected job first）にゲート待ち行列を並べる。
+
+    チーム毎の期待コスト = 過去の所要時間中央値 / 直近 pass 率（Laplace 平滑化）。
+    コミット未変更やキャッシュ命中で即座に結果が出るチームはコスト 0 とみなして先頭へ。
+    各トラック内でコスト順に並べ、トラック間はラウンドロビンで公平に交互に詰める。
+    track_major=True ではトラック単位で詰め（期待コスト合計の小さいトラックから）、
+    ランキング確定（=全チーム終了）が早いトラックを作る。streaming pipeline 用。
+    """
+    store = arena_store(repo_root)
+    stats = store.team_stats([tid for tid, _ in todo])
+    known = [st["median_elapsed"] for st in stats.values() if st.get("median_elapsed")]
+    prior = statistics.median(known) if known else 1.0
+    per_track: Dict[str, List[Tuple[float, int, str, Path]]] = {}
+    for idx, (tid, wt) in enumerate(todo):
+        info = meta.worktree(wt)
+        prev = store.latest(tid)
+        unchanged = bool(prev and not force and prev.get("commit") == info.commit)
+        cached = bool(cache and not force and info.tree and cache.peek(info.tree))
+        st = stats.get(tid, {"runs": 0, "passes": 0, "median_elapsed": None})
+        p_pass = (st["passes"] + 1) / (st["runs"] + 2)
+        cost = 0.0 if (unchanged or cached) else (st.get("median_elapsed") or prior) / max(p_pass, 0.05)
+        per_track.setdefault(track_of(tid), []).append((cost, idx, tid, wt))
+    queues = [sorted(q) for q in per_track.values()]
+    ordered: List[Tuple[str, Path]] = []
+    if track_major:
+        queues.sort(key=lambda q: (sum(c for c, _, _, _ in q), q[0][1]))
+        return [(tid, wt) for q in queues for _, _, tid, wt in q]
+    queues.sort(key=lambda q: q[0][:2])
+    while any(queues):
+        for q in queues:
+            if q:
+                _, _, tid, wt = q.pop(0)
+                ordered.append((tid, wt))
+    return ordered
+
+
+# ゲート用の jobs 枠とは別に、git probe / merge 用に確保する同時実行枠（arena_async の共有セマフォ）
+GIT_SLOTS = 4
+
+
+def default_jobs() -> int:
+    return max(1, os.cpu_count() or 1)
+
+
+def children_cpu_sec() -> float:
+    ru = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return ru.ru_utime + ru.ru_stime
+
+
+async def gate_sweep(repo_root: Path, cfg: Dict[str, Any], gate_cmd: str, todo: List[Tuple[str, Path]], jobs: int, force: bool, use_cache: bool = True, schedule: str = "sejf", race: bool = False, on_result: Optional[Callable[[str, Optional[Dict[str, Any]], float, float], None]] = None, state: Optional[ArenaState] = None) -> None:
+    """todo の各チームを jobs 並列でゲートし、終わった順に表示する（1 スイープ分）。
+
+    チーム毎にスレッドは作らず、1 つのイベントループ上のタスクとして実行する。jobs 個の枠は
+    待ち行列順（schedule）に割り当てる。on_result(team, result, start, end) は結果が出る度に
+    ループ内で呼ばれる（例外で結果が無い場合は result=None、start/end は time.monotonic()）。
+    """
+    cache = GateCache(repo_root, cfg, gate_cmd)
+    cache.enabled = cache.enabled and use_cache
+    deps = DepCache(repo_root, cfg)
+    impact = ImpactIndex(repo_root, cfg, gate_cmd) if cfg.get("gate_incremental") else None
+    if impact and impact.template is None:
+        print(f"[gate] WARN: --incremental needs gate_incremental_cmd (e.g. \"pytest -q {{tests}}\") for {gate_cmd!r}; running full gates.")
+        impact = None
+    meta = GitMeta(repo_root)
+    if schedule in ("sejf", "track"):
+        todo = schedule_gates(repo_root, todo, meta, cache, force, track_major=schedule == "track")
+    deadline_sec, deadline_note = adaptive_deadline(repo_root, cfg, meta)
+    if todo:
+        print(f"[gate] deadline per team: {human_sec(deadline_sec)} ({deadline_note})")
+    started_at = time.time()
+    wall_start = time.monotonic()
+    cpu_start = children_cpu_sec()
+    gated = 0
+    summed = 0.0
+    first_winner: Dict[str, Tuple[float, str]] = {}
+    board = RaceBoard() if race and cfg.get("rank_by", "elapsed") == "elapsed" and cfg.get("rank_policy", "gate") == "gate" else None
+    if race and board is None:
+        print("[gate] WARN: --race needs rank_by=elapsed and rank_policy=gate; running without race.")
+
+    slots = asyncio.Semaphore(jobs)
+    if state:
+        state.queue([tid for tid, _ in todo])
+
+    async def timed(tid: str, wt: Path) -> Tuple[str, float, Any]:
+        async with slots:
+            t = time.monotonic()
+            if state:
+                state.start(tid)
+            with arena_trace.span("gate.team", team=tid, track=track_of(tid)) as attrs:
+                try:
+                    res = await run_gate_one(repo_root, tid, wt, gate_cmd, deadline_sec, force, cache, meta, cfg, board, deps, impact)
+                except Exception as e:
+                    if state:
+                        state.finish(tid, None)
+                    return tid, t, e
+                if state:
+                    state.finish(tid, res)
+                attrs.update(commit=(res.get("commit") or "")[:12], status=res.get("status"), reused=bool(res.get("reused")))
+                return tid, t, res
+
+    with arena_trace.span("gate.sweep", jobs=jobs, teams=len(todo), schedule=schedule):
+        tasks = [asyncio.ensure_future(timed(tid, wt)) for tid, wt in todo]
+        try:
+            for fut in asyncio.as_completed(tasks):
+                tid, t_start, res = await fut
+                if isinstance(res, Exception):
+                    print(f"[gate] {tid}: ERROR ({res})")
+                    if on_result:
+                        on_result(tid, None, t_start, time.monotonic())
+                    continue
+                st = res.get("status", "?")
+                elapsed = res.get("elapsed_sec")
+                elapsed_str = human_sec(elapsed) if elapsed else "-"
+                if elapsed and not res.get("reused"):
+                    gated += 1
+                    summed += elapsed
+                if st == "pass" and track_of(tid) not in first_winner:
+                    first_winner[track_of(tid)] = (time.monotonic() - wall_start, tid)
+                note = f" [cache: {res.get('cached_from')}]" if res.get("cache") == "hit" else ""
+                if res.get("scope") == "incremental" and not res.get("reused"):
+                    note += f" [incremental: {len(res.get('tests_selected') or [])} tests]"
+                elif res.get("scope") == "full" and not res.get("reused"):
+                    note += f" [full: {res.get('impact')}]"
+                print(f"[gate] {tid}: {st.upper()} ({elapsed_str}{format_usage(res)}){note}", flush=True)
+                if st == "fail" and not res.get("reused"):
+                    for line in (res.get("log_tail") or [])[-5:]:
+                        print(f"[gate]   | {line}")
+                if st in ("cancelled", "timeout") and not res.get("reused"):
+                    print(f"[gate]   {res.get('note')}")
+                if board and st == "pass":
+                    ranked = compute_rank(repo_root, cfg)
+                    if state:
+                        state.ranked(ranked)
+                if on_result:
+                    on_result(tid, res, t_start, time.monotonic())
+        finally:
+            for t in tasks:
+                t.cancel()
+    wall = time.monotonic() - wall_start
+    cpu = children_cpu_sec() - cpu_start
+    speedup = (summed / wall) if wall > 0 else 0.0
+    if state:
+        state.sweep(cache.hits, cache.misses, wall)
+    if board:
+        compute_rank(repo_root, cfg)
+    print(f"[gate] sweep: {gated}/{len(todo)} gated, jobs={jobs}, wall {human_sec(wall)}, summed gate time {human_sec(summed)}, CPU {human_sec(cpu)}, speedup x{speedup:0.2f}, {cache.summary()}")
+    if deps.enabled and (deps.hits or deps.misses):
+        deps.evict()
+        print(f"[gate] {deps.summary()}")
+    track_keys = sorted({track_of(tid) for tid, _ in todo})
+    if track_keys:
+        ttfw = ", ".join(f"{k} {human_sec(first_winner[k][0])} ({first_winner[k][1]})" if k in first_winner else f"{k} -" for k in track_keys)
+        print(f"[gate] time to first winner ({schedule}): {ttfw}")
+    arena_store(repo_root).record_sweep(started_at, wall, jobs, schedule, gated, {"order": [tid for tid, _ in todo], "summed_sec": round(summed, 3), "cpu_sec": round(cpu, 3), "cache_hits": cache.hits, "cache_misses": cache.misses, "deps": deps.stats() if deps.enabled else None, "time_to_first_winner": {k: {"sec": round(v[0], 3), "team": v[1]} for k, v in first_winner.items()}})
+
+
+def worktrees_root(repo_root: Path, cfg: Dict[str, Any]) -> Path:
+    wt_dir = Path(cfg["worktrees_dir"])
+    return wt_dir if wt_dir.is_absolute() else repo_root / wt_dir
+
+
+def run_gate_all(repo_root: Path, cfg: Dict[str, Any], watch: bool, interval: int, force: bool, jobs: Optional[int] = None, use_cache: bool = True, debounce: float = 2.0, schedule: str = "sejf", race: bool = False, state: Optional[ArenaState] = None) -> int:
     gate_cmd = cfg.get("gate_cmd")
     if not gate_cmd:
         auto = detect_gate_cmd(repo_root)
@@ -222,95 +2039,437 @@ def run_gate_all(repo_root: Path, cfg: Dict[str, Any], watch: bool, interval: in
             print("[gate] ERROR: gate_cmd not set and could not auto-detect.")
             return 2
         gate_cmd = auto
-    timeout_sec = int(cfg.get("gate_timeout_sec", 1800))
+    jobs = max(1, int(jobs or default_jobs()))
+    arena_async.configure(jobs + GIT_SLOTS)
     tracks = cfg["tracks"]
     all_team_ids: List[str] = []
     for t in tracks:
         all_team_ids.extend(team_ids(t["key"], int(t["count"])))
     ensure_dir(results_dir(repo_root))
-    wt_dir = Path(cfg["worktrees_dir"])
-    if not wt_dir.is_absolute():
-        wt_dir = repo_root / wt_dir
+    wt_dir = worktrees_root(repo_root, cfg)
 
-    def run_once() -> None:
+    def run_once(only: Optional[Set[str]] = None) -> None:
+        todo: List[Tuple[str, Path]] = []
         for tid in all_team_ids:
+            if only is not None and tid not in only:
+                continue
             wt = wt_dir / tid
             if not wt.exists():
                 print(f"[gate] WARN: worktree missing: {wt}")
                 continue
-            res = run_gate_one(repo_root, tid, wt, gate_cmd, timeout_sec, force)
-            st = res.get("status", "?")
-            elapsed = res.get("elapsed_sec")
-            elapsed_str = human_sec(elapsed) if elapsed else "-"
-            print(f"[gate] {tid}: {st.upper()} ({elapsed_str})")
+            todo.append((tid, wt))
+        asyncio.run(gate_sweep(repo_root, cfg, gate_cmd, todo, jobs, force, use_cache, schedule, race, state=state))
+        if state:
+            state.ranked(compute_rank(repo_root, cfg))
 
     if not watch:
         run_once()
         return 0
-    print(f"[gate] watching every {interval}s. Ctrl+C to stop.")
+    watcher = ChangeWatcher(poll_interval=interval)
+    watch_team_refs(watcher, [(tid, wt_dir / tid) for tid in all_team_ids if (wt_dir / tid).exists()])
+    backend = watcher.start()
+    print(f"[gate] watching worktree refs ({backend}, debounce {debounce}s). Ctrl+C to stop.")
+    run_once()
     while True:
-        run_once()
-        print(f"[gate] sleeping {interval}s...")
-        time.sleep(interval)
+        changed = watcher.wait(debounce)
+        only = None if WATCH_ALL in changed else changed
+        print(f"[gate] change detected: {', '.join(sorted(changed))}")
+        try:
+            run_once(only)
+        except Exception as e:
+            print(f"[gate] ERROR: sweep failed: {e}")
 
 
-def run_rank(repo_root: Path, cfg: Dict[str, Any], watch: bool, interval: int) -> int:
-    tracks = cfg["tracks"]
+def rank_metric(r: Dict[str, Any], rank_by: str = "elapsed") -> Optional[float]:
+    if rank_by == "elapsed":
+        return r.get("elapsed_sec")
+    return (r.get("rusage") or {}).get(RANK_METRICS.get(rank_by, ""))
 
-    def rank_once() -> Dict[str, Any]:
-        winners: Dict[str, str] = {}
-        ranking: Dict[str, List[Dict[str, Any]]] = {}
-        for t in tracks:
-            key = t["key"]
-            ids = team_ids(key, int(t["count"]))
-            results: List[Dict[str, Any]] = []
-            for tid in ids:
-                r = read_result(repo_root, tid)
-                if r:
-                    results.append(r)
-
-            def sort_key(r: Dict[str, Any]) -> Tuple[int, float]:
-                st = r.get("status", "fail")
-                order = {"pass": 0, "dirty": 1, "fail": 2}.get(st, 3)
-                elapsed = r.get("elapsed_sec") or 9999999
-                return (order, elapsed)
-
-            results.sort(key=sort_key)
-            ranking[key] = results
-            for r in results:
-                if r.get("status") == "pass":
-                    winners[key] = r["team"]
-                    break
-        out = {"timestamp": now_iso(), "winners": winners, "ranking": ranking}
-        ensure_dir(repo_root / ".arena")
-        (repo_root / ".arena" / "winners.json").write_text(json.dumps(out, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
-        return out
 
-    def print_rank(out: Dict[str, Any]) -> None:
-        print(f"\n[rank] {out['timestamp']}")
-        for key, results in out["ranking"].items():
-            print(f"  Track {key}:")
-            for i, r in enumerate(results, 1):
-                st = r.get("status", "?").upper()
-                elapsed = r.get("elapsed_sec")
-                elapsed_str = human_sec(elapsed) if elapsed else "-"
-                mark = "★" if out["winners"].get(key) == r["team"] else " "
-                print(f"    {mark} {i}. {r['team']}: {st} ({elapsed_str})")
-        print(f"  Winners: {out['winners']}")
+def rank_sort_key(r: Dict[str, Any], rank_by: str = "elapsed") -> Tuple[int, int, float]:
+    """(status, 部分実行か, 指標)。incremental の結果は全テスト実行と指標を比べず、その後ろに並べる。"""
+    st = r.get("status", "fail")
+    order = {"pass": 0, "dirty": 1, "fail": 2}.get(st, 3)
+    subset = 1 if r.get("scope") == "incremental" else 0
+    value = rank_metric(r, rank_by) or 9999999
+    return (order, subset, value)
+
 
+def format_usage(r: Dict[str, Any]) -> str:
+    ru = r.get("rusage") or {}
+    if not ru:
+        return ""
+    return f", cpu {human_sec(ru.get('cpu_sec') or 0)}, rss {(ru.get('max_rss_kb') or 0) / 1024:0.0f}MB, io {ru.get('io_blocks', 0)}blk"
+
+
+def bench_stat(r: Dict[str, Any], metric: str) -> Optional[Dict[str, Any]]:
+    if r.get("status") != "pass":
+        return None
+    bench = r.get("bench") or {}
+    if bench.get("status") != "ok":
+        return None
+    return (bench.get("metrics") or {}).get(metric)
+
+
+def rank_by_bench(results: List[Dict[str, Any]], metric: str, goal: str, rank_by: str) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """bench 指標の中央値で pass チームを並べる。首位と 95% CI が重なるチームは同着扱い。
+
+    同着グループ内の勝者はノイズではなくゲート指標（rank_by）で決め、同着チーム一覧も返す。
+    """
+    sign = -1.0 if goal == "max" else 1.0
+
+    def key(r: Dict[str, Any]) -> Tuple[int, float, Tuple[int, int, float]]:
+        stat = bench_stat(r, metric)
+        if stat:
+            return (0, sign * float(stat["median"]), rank_sort_key(r, rank_by))
+        return (1, 0.0, rank_sort_key(r, rank_by))
+
+    ordered = sorted(results, key=key)
+    if not ordered or not bench_stat(ordered[0], metric):
+        return ordered, []
+    lo, hi = bench_stat(ordered[0], metric)["ci95"]
+    tied = [r for r in ordered if (bench_stat(r, metric) or {}).get("ci95") and bench_stat(r, metric)["ci95"][0] <= hi and lo <= bench_stat(r, metric)["ci95"][1]]
+    if len(tied) < 2:
+        return ordered, []
+    tied.sort(key=lambda r: rank_sort_key(r, rank_by))
+    rest = [r for r in ordered if r not in tied]
+    return tied + rest, [r["team"] for r in tied]
+
+
+@arena_trace.traced("rank")
+def compute_rank(repo_root: Path, cfg: Dict[str, Any]) -> Dict[str, Any]:
+    meta = GitMeta(repo_root)
+    store = existing_store(repo_root)
+    rank_by = cfg.get("rank_by", "elapsed")
+    policy = cfg.get("rank_policy", "gate")
+    metric = cfg.get("bench_metric", "")
+    winners: Dict[str, str] = {}
+    ties: Dict[str, List[str]] = {}
+    ranking: Dict[str, List[Dict[str, Any]]] = {}
+    for t in cfg["tracks"]:
+        key = t["key"]
+        ids = team_ids(key, int(t["count"]))
+        results = store.ranked(key, ids, rank_by) if store else []
+        seen = {r["team"] for r in results}
+        for tid in ids:
+            if tid not in seen:
+                legacy = read_result(repo_root, tid)
+                if legacy:
+                    results.append(legacy)
+        for r in results:
+            head = meta.branch_commit(r.get("branch") or f"arena/{r['team']}")
+            r["stale"] = bool(head and r.get("commit") and head != r.get("commit"))
+        results.sort(key=lambda r: rank_sort_key(r, rank_by))
+        if policy == "bench" and metric:
+            results, tied = rank_by_bench(results, metric, cfg.get("bench_goal", "min"), rank_by)
+            if tied:
+                ties[key] = tied
+        ranking[key] = results
+        for r in results:
+            if r.get("status") == "pass":
+                winners[key] = r["team"]
+                break
+    out = {"timestamp": now_iso(), "rank_by": rank_by, "rank_policy": f"bench:{metric}" if policy == "bench" and metric else "gate", "winners": winners, "ties": ties, "ranking": ranking}
+    write_json_atomic(repo_root / ".arena" / "winners.json", out)
+    return out
+
+
+def print_rank(out: Dict[str, Any]) -> None:
+    policy = out.get("rank_policy", "gate")
+    by = policy if policy != "gate" else out.get("rank_by", "elapsed")
+    metric = policy.split(":", 1)[1] if policy.startswith("bench:") else ""
+    print(f"\n[rank] {out['timestamp']} (by {by})")
+    for key, results in out["ranking"].items():
+        tied = out.get("ties", {}).get(key) or []
+        print(f"  Track {key}:" + (f"  TIE (overlapping 95% CI): {', '.join(tied)} — tie broken by gate {out.get('rank_by', 'elapsed')}" if tied else ""))
+        for i, r in enumerate(results, 1):
+            st = r.get("status", "?").upper()
+            elapsed = r.get("elapsed_sec")
+            elapsed_str = human_sec(elapsed) if elapsed else "-"
+            mark = "★" if out["winners"].get(key) == r["team"] else " "
+            stale = " [stale: branch moved since gate]" if r.get("stale") else ""
+            stat = bench_stat(r, metric) if metric else None
+            bench = f" {metric}={stat['median']:g} [{stat['ci95'][0]:g}, {stat['ci95'][1]:g}] n={stat['n']}" if stat else ""
+            if metric and r.get("status") == "pass" and not stat:
+                bench = f" {metric}=- ({(r.get('bench') or {}).get('note', 'no bench')})"
+            print(f"    {mark} {i}. {r['team']}: {st} ({elapsed_str}{format_usage(r)}){bench}{stale}")
+    print(f"  Winners: {out['winners']}")
+
+
+def run_rank(repo_root: Path, cfg: Dict[str, Any], watch: bool, interval: int, debounce: float = 1.0) -> int:
+    tracks = cfg["tracks"]
     if not watch:
-        out = rank_once()
-        print_rank(out)
+        print_rank(compute_rank(repo_root, cfg))
         return 0
-    print(f"[rank] watching every {interval}s. Ctrl+C to stop.")
+    ensure_dir(results_dir(repo_root))
+    watcher = ChangeWatcher(poll_interval=interval)
+    for t in tracks:
+        for tid in team_ids(t["key"], int(t["count"])):
+            watcher.add(result_path(repo_root, tid), tid)
+    backend = watcher.start()
+    print(f"[rank] watching {results_dir(repo_root)} ({backend}). Ctrl+C to stop.")
+    print_rank(compute_rank(repo_root, cfg))
     while True:
-        out = rank_once()
-        print_rank(out)
-        print(f"[rank] sleeping {interval}s...")
-        time.sleep(interval)
+        watcher.wait(debounce)
+        print_rank(compute_rank(repo_root, cfg))
+
 
+def merge_tree(repo_root: Path, ours: str, theirs: str) -> Optional[str]:
+    """`git merge-tree --write-tree` でワークツリーに触れずにマージを試す。clean なら tree を返す。"""
+    return merge_tree_result(sh(["git", "merge-tree", "--write-tree", "--no-messages", ours, theirs], cwd=repo_root, check=False))
 
-def integrate_winners(repo_root: Path, cfg: Dict[str, Any], reset: bool, final_gate: bool) -> int:
+
+async def merge_tree_async(repo_root: Path, ours: str, theirs: str) -> Optional[str]:
+    return merge_tree_result(await arena_async.run(["git", "merge-tree", "--write-tree", "--no-messages", ours, theirs], repo_root))
+
+
+def merge_tree_result(cp: Any) -> Optional[str]:
+    if cp.returncode == 0:
+        return cp.stdout.split()[0]
+    if cp.returncode == 1:
+        return None
+    raise RuntimeError(cp.stderr.strip() or f"git merge-tree failed ({cp.returncode})")
+
+
+@arena_trace.traced("integrate.precheck")
+def precheck_merges(repo_root: Path, start: str, candidates: List[Tuple[str, List[str]]], meta: GitMeta, max_calls: int = 200) -> Tuple[Optional[Dict[str, str]], Dict[str, Any]]:
+    """トラック順に勝者をメモリ上でマージし、clean にマージできる組み合わせを探す。
+
+    各トラックはランキング順に候補を試し、コンフリクトしたら次点へ。どの候補も入らない
+    トラックがあれば前のトラックの選択に戻って探し直す（深さ優先、merge-tree 呼び出しは max_calls まで）。
+    途中結果は `git commit-tree` の一時コミットとして積むだけで、どの worktree も変更しない。
+    """
+    info: Dict[str, Any] = {"start": start, "merge_tree_calls": 0, "conflicts": []}
+    memo: Dict[Tuple[str, str], Optional[str]] = {}
+
+    def merge(cur: str, team: str) -> Optional[str]:
+        theirs = meta.branch_commit(f"arena/{team}") or ""
+        if (cur, theirs) in memo:
+            return memo[(cur, theirs)]
+        if info["merge_tree_calls"] >= max_calls:
+            raise RuntimeError(f"precheck gave up after {max_calls} merge-tree calls")
+        info["merge_tree_calls"] += 1
+        tree = merge_tree(repo_root, cur, theirs)
+        nxt = None
+        if tree:
+            nxt = git_out(["commit-tree", tree, "-p", cur, "-p", theirs, "-m", f"arena precheck: merge {team}"], repo_root)
+        else:
+            info["conflicts"].append(team)
+        memo[(cur, theirs)] = nxt
+        return nxt
+
+    def search(i: int, cur: str, chosen: Dict[str, str]) -> Optional[Dict[str, str]]:
+        if i == len(candidates):
+            info["tree"] = git_out(["rev-parse", f"{cur}^{{tree}}"], repo_root)
+            return dict(chosen)
+        track, teams = candidates[i]
+        for team in teams:
+            nxt = merge(cur, team)
+            if nxt is None:
+                continue
+            chosen[track] = team
+            found = search(i + 1, nxt, chosen)
+            if found:
+                return found
+            chosen.pop(track, None)
+        return None
+
+    return search(0, start, {}), info
+
+
+def test_durations_path(repo_root: Path) -> Path:
+    return impact_dir(repo_root) / "test_durations.json"
+
+
+def balance_shards(tests: List[str], durations: Dict[str, float], k: int) -> List[Tuple[List[str], float]]:
+    """LPT（長い順に最も軽いシャードへ）でテストファイルを k 個に分ける。未計測は既知の中央値とみなす。"""
+    known = [durations[t] for t in tests if t in durations]
+    default = statistics.median(known) if known else 1.0
+    bins: List[Tuple[List[str], float]] = [([], 0.0) for _ in range(max(1, min(k, len(tests))))]
+    for t in sorted(tests, key=lambda t: (-durations.get(t, default), t)):
+        i = min(range(len(bins)), key=lambda j: bins[j][1])
+        bins[i] = (bins[i][0] + [t], bins[i][1] + durations.get(t, default))
+    return [(sorted(ts), est) for ts, est in bins]
+
+
+def junit_durations(xml_path: Path, tests: List[str]) -> Dict[str, float]:
+    """pytest の junitxml から testcase の time をテストファイル毎に合計する。"""
+    try:
+        root = ElementTree.parse(xml_path).getroot()
+    except (OSError, ElementTree.ParseError):
+        return {}
+    by_module = {t[:-3].replace("/", "."): t for t in tests if t.endswith(".py")}
+    out: Dict[str, float] = {}
+    for case in root.iter("testcase"):
+        path = case.get("file")
+        if path not in tests:
+            cls = case.get("classname", "")
+            path = next((by_module[m] for m in (cls, cls.rsplit(".", 1)[0]) if m in by_module), None)
+        if path:
+            out[path] = out.get(path, 0.0) + float(case.get("time") or 0.0)
+    return out
+
+
+async def shard_worktree(repo_root: Path, cfg: Dict[str, Any], index: int, commit: str) -> Path:
+    """シャード用の使い回しの detached worktree（`<worktrees_dir>/.shards/sNN`）を commit に揃える。"""
+    path = (worktrees_root(repo_root, cfg) / ".shards" / f"s{index:02d}").resolve()
+    if worktree_gitdir(path) is None:
+        shutil.rmtree(path, ignore_errors=True)
+        ensure_dir(path.parent)
+        await git_retry(["worktree", "add", "--quiet", "--detach", str(path), commit], repo_root)
+    else:
+        await git_retry(["checkout", "--quiet", "--force", "--detach", commit], path)
+        await git_retry(["clean", "-fdq"], path)
+    return path
+
+
+async def run_sharded_gate(repo_root: Path, cfg: Dict[str, Any], impact: ImpactIndex, int_commit: str, tests: List[str], k: int, timeout_sec: int, log_path: Path) -> Dict[str, Any]:
+    """tests を k シャードに分けて別々の作業ツリーで並行実行し、結果を 1 つの記録にまとめる。
+
+    分割は `.arena/impact/test_durations.json`（テストファイル毎の所要時間の移動平均）で均す。
+    pytest なら junitxml から実測し、それ以外はシャードの所要時間を見積もり比で按分して学習する。
+    """
+    dpath = test_durations_path(repo_root)
+    try:
+        durations: Dict[str, float] = json.loads(dpath.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        durations = {}
+    plan = balance_shards(tests, durations, k)
+    known = sum(1 for t in tests if t in durations)
+    if known * 2 < len(tests):
+        print(f"[integrate] WARN: only {known}/{len(tests)} shard tests have recorded durations; shards are balanced on guessed (median) weights.")
+    junit = bool(re.search(r"\bpytest\b", impact.template or ""))
+    deps = DepCache(repo_root, cfg)
+    tail_lines = int(cfg.get("gate_log_tail_lines", 40))
+
+    async def one(i: int, shard_tests: List[str], est: float) -> Dict[str, Any]:
+        with arena_trace.span("gate.shard", shard=i, tests=len(shard_tests)) as attrs:
+            wt = await shard_worktree(repo_root, cfg, i, int_commit)
+            prefix = await deps.prepare(f"INTEGRATION.shard-{i}", wt)
+            cmd = impact.command(shard_tests)
+            xml = logs_dir(repo_root) / f"INTEGRATION.shard-{i}.xml"
+            if junit:
+                # testcase の file 属性は xunit1 だけが出す（既定の xunit2 は classname のみ）
+                cmd += f" --junitxml={shlex.quote(str(xml))} -o junit_family=xunit1"
+            shard_log = gate_log_path(repo_root, f"INTEGRATION.shard-{i}", cfg)
+            run = await run_streamed_async(prefix + cmd, wt, shard_log, f"# Final Gate shard {i}/{len(plan)}\ncommit: {int_commit[:7]}\ncmd: {cmd}\n", timeout_sec, tail_lines)
+            st = "timeout" if run.timed_out else "pass" if run.exit_code == 0 else "fail"
+            attrs.update(status=st)
+        measured = junit_durations(xml, shard_tests) if junit else {}
+        if junit and len(measured) * 2 < len(shard_tests):
+            print(f"[integrate] WARN: shard {i}: junitxml mapped only {len(measured)}/{len(shard_tests)} test files to durations; falling back to estimates.")
+        if not measured and est > 0:
+            measured = {t: run.elapsed * durations.get(t, est / len(shard_tests)) / est for t in shard_tests}
+        return {"shard": i, "tests": shard_tests, "status": st, "exit_code": None if run.timed_out else run.exit_code, "elapsed_sec": round(run.elapsed, 3), "expected_sec": round(est, 3), "rusage": run.rusage, "log": str(shard_log), "log_tail": run.tail if st != "pass" else None, "measured": measured}
+
+    wall_start = time.monotonic()
+    shards = await asyncio.gather(*(one(i, ts, est) for i, (ts, est) in enumerate(plan, 1)))
+    wall = time.monotonic() - wall_start
+    for sh_res in shards:
+        for t, sec in sh_res.pop("measured").items():
+            durations[t] = round(sec if t not in durations else 0.5 * durations[t] + 0.5 * sec, 3)
+    write_json_atomic(dpath, durations)
+    failed = [s for s in shards if s["status"] != "pass"]
+    status = "timeout" if any(s["status"] == "timeout" for s in shards) else "fail" if failed else "pass"
+    rusage = {"cpu_sec": round(sum(s["rusage"].get("cpu_sec", 0) for s in shards), 3), "max_rss_kb": max(s["rusage"].get("max_rss_kb", 0) for s in shards), "io_blocks": sum(s["rusage"].get("io_blocks", 0) for s in shards)}
+    summed = sum(s["elapsed_sec"] for s in shards)
+    with open(log_path, "a", encoding="utf-8") as log:
+        for s in shards:
+            log.write(f"shard {s['shard']}: {s['status']} exit {s['exit_code']} {s['elapsed_sec']:.3f}s (expected {s['expected_sec']:.3f}s, {len(s['tests'])} tests) log: {s['log']}\n")
+        log.write(f"\n--- END ---\nexit: {status}\nelapsed: {wall:.3f}s (summed {summed:.3f}s over {len(shards)} shards)\n")
+    for s in shards:
+        print(f"[integrate]   shard {s['shard']}: {s['status'].upper()} ({human_sec(s['elapsed_sec'])}, expected {human_sec(s['expected_sec'])}, {len(s['tests'])} tests)")
+    record: Dict[str, Any] = {"status": status, "exit_code": next((s["exit_code"] for s in failed), 0), "elapsed_sec": round(wall, 3), "summed_sec": round(summed, 3), "rusage": rusage, "shards": shards}
+    if failed:
+        record["log_tail"] = [f"[shard {s['shard']}] {line}" for s in failed for line in (s["log_tail"] or [])[-10:]]
+    return record
+
+
+@arena_trace.traced("final_gate")
+async def run_final_gate(repo_root: Path, cfg: Dict[str, Any], int_wt: Path, int_commit: str, int_tree: str) -> Dict[str, Any]:
+    """統合ツリーに最終ゲートを掛ける（同一ツリーのキャッシュがあれば再利用）。
+
+    final_gate_shards > 1 ならテストファイルを K シャードに分けて並行実行する（run_sharded_gate）。
+    ls-tree から拾ったテストファイルだけのシャード実行は doctest などを落とし得るので
+    scope="sharded" の部分集合として扱い、キャッシュせず full の周期にも数えない。
+    incremental で full の番が来たときはシャードにせず gate_cmd をそのまま回す。
+    """
+    gate_cmd = cfg.get("gate_cmd") or detect_gate_cmd(repo_root)
+    if not gate_cmd:
+        return {"status": "skipped", "reason": "gate_cmd missing"}
+    integration_branch = cfg.get("integration_branch", "arena/integration")
+    timeout_sec = int(cfg.get("gate_timeout_sec", 1800))
+    cache = GateCache(repo_root, cfg, gate_cmd)
+    hit = cache.get(int_tree)
+    full, why = final_gate_full(repo_root, cfg)
+    tests: Optional[List[str]] = None
+    run_cmd = gate_cmd
+    impact = ImpactIndex(repo_root, cfg, gate_cmd)
+    if not hit and not full:
+        tests, why = await impact.select(int_commit, int_wt)
+        if tests is not None:
+            run_cmd = impact.command(tests)
+    k = int(cfg.get("final_gate_shards", 1) or 1)
+    shard_tests = tests
+    if not hit and k > 1:
+        if impact.template is None:
+            print(f"[integrate] WARN: sharding needs gate_incremental_cmd (e.g. \"pytest -q {{tests}}\") for {gate_cmd!r}; running one final gate.")
+            k = 1
+        elif shard_tests is None and cfg.get("gate_incremental"):
+            print(f"[integrate] full final gate due ({why}); running {gate_cmd!r} unsharded.")
+            k = 1
+        elif shard_tests is None:
+            res = await arena_async.run(["git", "ls-tree", "-r", "-z", "--name-only", int_commit], repo_root)
+            shard_tests = sorted(p for p in res.stdout.split("\0") if p and impact.is_test(p))
+        if shard_tests is not None and len(shard_tests) < 2:
+            k = 1
+    if hit:
+        print(f"[integrate] final gate: cache hit (tree {int_tree[:7]}, from {hit.get('team')})")
+        record = {"cmd": gate_cmd, "status": hit["status"], "exit_code": hit.get("exit_code"), "elapsed_sec": hit.get("elapsed_sec"), "rusage": hit.get("rusage") or {}, "cache": "hit", "cached_from": hit.get("team")}
+    else:
+        scope = "incremental" if tests is not None else "sharded" if k > 1 else "full"
+        selected = f" [{len(tests)} tests]" if tests is not None else ""
+        label = f" ({scope}: {why})" if cfg.get("gate_incremental") else ""
+        sharded = f" in {k} shards" if k > 1 else ""
+        print(f"[integrate] running final gate{label}{sharded}: {gate_cmd}{selected} (log: {logs_dir(repo_root) / 'INTEGRATION.log'})")
+        log_path = gate_log_path(repo_root, "INTEGRATION", cfg)
+        if k > 1:
+            assert shard_tests is not None
+            log_path.write_text(f"# Final Gate (sharded x{k})\ncommit: {int_commit[:7]}\ntree: {int_tree}\ncmd: {gate_cmd}\n--- SHARDS ---\n", encoding="utf-8")
+            with arena_trace.span("gate.sharded", shards=k, tests=len(shard_tests)):
+                record = await run_sharded_gate(repo_root, cfg, impact, int_commit, shard_tests, k, timeout_sec, log_path)
+            record.update({"cmd": gate_cmd, "scope": scope, "impact": why})
+            print(f"[integrate] final gate shards: wall {human_sec(record['elapsed_sec'])}, summed {human_sec(record['summed_sec'])} (x{record['summed_sec'] / record['elapsed_sec'] if record['elapsed_sec'] else 0:0.2f})")
+        else:
+            prefix = await DepCache(repo_root, cfg).prepare("INTEGRATION", int_wt)
+            run = await run_streamed_async(prefix + run_cmd, int_wt, log_path, f"# Final Gate\ncommit: {int_commit[:7]}\ntree: {int_tree}\ncmd: {run_cmd}\n", timeout_sec, int(cfg.get("gate_log_tail_lines", 40)))
+            st = "timeout" if run.timed_out else "pass" if run.exit_code == 0 else "fail"
+            record = {"cmd": gate_cmd, "status": st, "exit_code": None if run.timed_out else run.exit_code, "elapsed_sec": round(run.elapsed, 3), "rusage": run.rusage, "scope": scope, "impact": why}
+            if st != "pass":
+                record["log_tail"] = run.tail
+        if tests is not None:
+            record["tests_selected"] = tests
+        arena_store(repo_root).record_run(dict(record, team="INTEGRATION", track="", branch=integration_branch, commit=int_commit, tree=int_tree, gate_cmd=gate_cmd, timestamp=now_iso()))
+        if scope == "full":
+            cache.put(int_tree, dict(record, team="INTEGRATION", commit=int_commit))
+        if cfg.get("gate_incremental"):
+            note_final_gate(repo_root, full=scope == "full")
+    record["tree"] = int_tree
+    return record
+
+
+def report_integration(repo_root: Path, int_wt: Path, integration_record: Dict[str, Any]) -> None:
+    write_json_atomic(repo_root / ".arena" / "integration.json", integration_record)
+    print(f"[integrate] done. integration worktree: {int_wt}")
+    fg = integration_record.get("final_gate")
+    if fg and fg.get("status") == "pass":
+        print("[integrate] ✅ Final gate PASS.")
+    elif fg and fg.get("status") == "fail":
+        print("[integrate] ❌ Final gate FAIL.")
+
+
+@arena_trace.traced("integrate")
+def integrate_winners(repo_root: Path, cfg: Dict[str, Any], reset: bool, final_gate: bool, precheck: bool = True) -> int:
     winners_path = repo_root / ".arena" / "winners.json"
     if not winners_path.exists():
         print("[integrate] ERROR: winners.json not found. Run rank first.")
@@ -327,60 +2486,271 @@ def integrate_winners(repo_root: Path, cfg: Dict[str, Any], reset: bool, final_g
     if not int_wt.exists():
         print(f"[integrate] ERROR: integration worktree not found: {int_wt}")
         return 2
-    if is_dirty(int_wt):
+    meta = GitMeta(repo_root)
+    if meta.dirty(int_wt):
         print(f"[integrate] ERROR: integration worktree is dirty: {int_wt}")
         return 3
-    sh(["git", "checkout", integration_branch], cwd=int_wt, check=True)
     if reset:
         sh(["git", "fetch", "--all"], cwd=int_wt, check=False)
+    for t in tracks_cfg:
+        if not winners.get(t["key"]):
+            print(f"[integrate] Track {t['key']}: no PASS winner. Integration aborted.")
+            return 4
+    chosen = {t["key"]: winners[t["key"]] for t in tracks_cfg}
+    precheck_info: Optional[Dict[str, Any]] = None
+    if precheck:
+        ranking = winners_data.get("ranking", {})
+        candidates: List[Tuple[str, List[str]]] = []
+        for t in tracks_cfg:
+            key = t["key"]
+            passing = [r["team"] for r in ranking.get(key, []) if r.get("status") == "pass" and r["team"] != winners[key] and meta.branch_exists(f"arena/{r['team']}")]
+            candidates.append((key, [winners[key]] + passing))
+        start = git_out(["rev-parse", base_ref if reset else integration_branch], repo_root)
+        try:
+            found, precheck_info = precheck_merges(repo_root, start, candidates, meta, int(cfg.get("integrate_precheck_max_calls", 200)))
+        except RuntimeError as e:
+            print(f"[integrate] WARN: merge-tree precheck unavailable ({e}); merging without precheck.")
+            found = chosen
+        if found is None:
+            print("[integrate] precheck: no combination of passing teams merges cleanly. Integration aborted (worktree untouched).")
+            print(f"[integrate] conflicting candidates: {', '.join(precheck_info['conflicts']) if precheck_info else '-'}")
+            return 6
+        for key, team in found.items():
+            if team != chosen[key]:
+                print(f"[integrate] precheck: Track {key} winner {chosen[key]} conflicts; falling back to {team}.")
+        if precheck_info is not None:
+            print(f"[integrate] precheck: clean combination {found} ({precheck_info['merge_tree_calls']} merge-tree calls)")
+            precheck_info["substituted"] = {k: {"from": chosen[k], "to": v} for k, v in found.items() if v != chosen[k]}
+        chosen = found
+    sh(["git", "checkout", integration_branch], cwd=int_wt, check=True)
+    if reset:
         sh(["git", "reset", "--hard", base_ref], cwd=int_wt, check=True)
         sh(["git", "clean", "-fd"], cwd=int_wt, check=True)
     merged: List[Dict[str, Any]] = []
     for t in tracks_cfg:
         key = t["key"]
-        win = winners.get(key)
-        if not win:
-            print(f"[integrate] Track {key}: no PASS winner. Integration aborted.")
-            return 4
+        win = chosen[key]
         branch = f"arena/{win}"
-        if not branch_exists(branch, repo_root):
+        if not meta.branch_exists(branch):
             print(f"[integrate] ERROR: branch not found: {branch}")
             return 5
         print(f"[integrate] merging winner {win} ({branch}) into {integration_branch}...")
-        cp = sh(["git", "merge", "--no-ff", "--no-edit", branch], cwd=int_wt, check=False)
+        with arena_trace.span("integrate.merge", track=key, team=win):
+            cp = sh(["git", "merge", "--no-ff", "--no-edit", branch], cwd=int_wt, check=False)
         if cp.returncode != 0:
-            print("[integrate] MERGE CONFLICT or merge failed.")
+            sh(["git", "merge", "--abort"], cwd=int_wt, check=False)
+            print("[integrate] MERGE CONFLICT or merge failed (merge aborted).")
             print(f"[integrate] Worktree: {int_wt}")
             return 6
         merged.append({"track": key, "team": win, "branch": branch})
-    int_commit = git_out(["rev-parse", "HEAD"], int_wt)
+    int_commit, int_tree = git_out(["rev-parse", "HEAD", "HEAD^{tree}"], int_wt).split()
     integration_record: Dict[str, Any] = {"timestamp": now_iso(), "integration_branch": integration_branch, "base_ref": base_ref, "merged": merged, "integration_commit": int_commit}
+    if precheck_info is not None:
+        integration_record["precheck"] = precheck_info
     if final_gate:
-        gate_cmd = cfg.get("gate_cmd") or detect_gate_cmd(repo_root)
-        if not gate_cmd:
-            integration_record["final_gate"] = {"status": "skipped", "reason": "gate_cmd missing"}
-        else:
-            timeout_sec = int(cfg.get("gate_timeout_sec", 1800))
-            print(f"[integrate] running final gate: {gate_cmd}")
-            start = time.monotonic()
-            proc = subprocess.run(["bash", "-lc", gate_cmd], cwd=str(int_wt), text=True, capture_output=True, timeout=timeout_sec)
-            elapsed = time.monotonic() - start
-            st = "pass" if proc.returncode == 0 else "fail"
-            ensure_dir(logs_dir(repo_root))
-            (logs_dir(repo_root) / "INTEGRATION.log").write_text(f"# Final Gate\ncommit: {int_commit[:7]}\ncmd: {gate_cmd}\nexit: {proc.returncode}\nelapsed: {elapsed:.3f}s\n\n--- STDOUT ---\n{proc.stdout or ''}\n--- STDERR ---\n{proc.stderr or ''}\n", encoding="utf-8")
-            integration_record["final_gate"] = {"cmd": gate_cmd, "status": st, "exit_code": proc.returncode, "elapsed_sec": round(elapsed, 3)}
-    ensure_dir(repo_root / ".arena")
-    (repo_root / ".arena" / "integration.json").write_text(json.dumps(integration_record, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
-    print(f"[integrate] done. integration worktree: {int_wt}")
-    fg = integration_record.get("final_gate")
-    if fg and fg.get("status") == "pass":
-        print("[integrate] ✅ Final gate PASS.")
-    elif fg and fg.get("status") == "fail":
-        print("[integrate] ❌ Final gate FAIL.")
+        integration_record["final_gate"] = asyncio.run(run_final_gate(repo_root, cfg, int_wt, int_commit, int_tree))
+    report_integration(repo_root, int_wt, integration_record)
+    return 0
+
+
+class Timeline:
+    """パイプラインのステージ（prepare/gate/rank/merge/final）を依存関係付きで記録する。
+
+    時刻は開始時点からの相対秒。critical_path() は最後のステージから「最も遅く終わった依存」を
+    辿り、全体の所要時間を決めた経路を返す。
+    """
+
+    def __init__(self) -> None:
+        self.started_at = now_iso()
+        self.t0 = time.monotonic()
+        self.spans: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, span_id: str, stage: str, start: float, end: float, deps: Optional[List[str]] = None, **attrs: Any) -> None:
+        span = {"id": span_id, "stage": stage, "start": round(start - self.t0, 3), "end": round(end - self.t0, 3), "deps": [d for d in (deps or []) if d]}
+        span["dur"] = round(span["end"] - span["start"], 3)
+        span.update(attrs)
+        with self._lock:
+            self.spans[span_id] = span
+
+    def critical_path(self, last: str) -> List[Dict[str, Any]]:
+        path: List[Dict[str, Any]] = []
+        cur = self.spans.get(last)
+        while cur:
+            path.append(cur)
+            deps = [self.spans[d] for d in cur["deps"] if d in self.spans]
+            cur = max(deps, key=lambda d: d["end"]) if deps else None
+        return path[::-1]
+
+    def write(self, path: Path, last: str) -> List[Dict[str, Any]]:
+        crit = self.critical_path(last)
+        with self._lock:
+            spans = sorted(self.spans.values(), key=lambda d: (d["start"], d["id"]))
+        write_json_atomic(path, {"started_at": self.started_at, "wall_sec": round(time.monotonic() - self.t0, 3), "stages": spans, "critical_path": [d["id"] for d in crit]})
+        return crit
+
+
+@arena_trace.traced("pipeline")
+def stream_pipeline(repo_root: Path, cfg: Dict[str, Any], jobs: Optional[int] = None, race: bool = False) -> int:
+    """gate→rank→integrate をトラック単位の DAG として流す。
+
+    トラックの全チームのゲートが終わった時点でそのトラックのランキングを確定し、
+    勝者を integrator（arena_async の名前付きロックで直列化したタスク）で INTEGRATION へマージする。他トラックのゲートは
+    その間も並行して走り、最後のトラックがマージされた直後に最終ゲートを開始する。
+    マージ前に `git merge-tree` で現在の統合 HEAD との衝突を確認し、衝突する勝者は次点の
+    pass チームへフォールバックする（トラック間の組み合わせ探索は行わない貪欲法）。
+    各ステージの開始/終了は `.arena/timeline.json` に書き出し、critical path を表示する。
+    """
+    gate_cmd = cfg.get("gate_cmd") or detect_gate_cmd(repo_root)
+    if not gate_cmd:
+        print("[pipeline] ERROR: gate_cmd not set and could not auto-detect.")
+        return 2
+    jobs = max(1, int(jobs or default_jobs()))
+    arena_async.configure(jobs + GIT_SLOTS)
+    integration_branch = cfg.get("integration_branch", "arena/integration")
+    base_ref = cfg.get("base_ref", "main")
+    wt_dir = worktrees_root(repo_root, cfg)
+    int_wt = wt_dir / "INTEGRATION"
+    if not int_wt.exists():
+        print(f"[integrate] ERROR: integration worktree not found: {int_wt}")
+        return 2
+    meta = GitMeta(repo_root)
+    if meta.dirty(int_wt):
+        print(f"[integrate] ERROR: integration worktree is dirty: {int_wt}")
+        return 3
+    ensure_dir(results_dir(repo_root))
+    timeline = Timeline()
+    t = time.monotonic()
+    with arena_trace.span("pipeline.prepare"):
+        sh(["git", "fetch", "--all"], cwd=int_wt, check=False)
+        sh(["git", "checkout", integration_branch], cwd=int_wt, check=True)
+        sh(["git", "reset", "--hard", base_ref], cwd=int_wt, check=True)
+        sh(["git", "clean", "-fd"], cwd=int_wt, check=True)
+    timeline.add("prepare", "prepare", t, time.monotonic())
+
+    track_keys = [tr["key"] for tr in cfg["tracks"]]
+    todo: List[Tuple[str, Path]] = []
+    pending: Dict[str, Set[str]] = {key: set() for key in track_keys}
+    for tr in cfg["tracks"]:
+        for tid in team_ids(tr["key"], int(tr["count"])):
+            wt = wt_dir / tid
+            if not wt.exists():
+                print(f"[gate] WARN: worktree missing: {wt}")
+                continue
+            todo.append((tid, wt))
+            pending[tr["key"]].add(tid)
+    gate_spans: Dict[str, List[str]] = {key: [] for key in track_keys}
+    merged: List[Dict[str, Any]] = []
+    failed: Dict[str, str] = {}
+    conflicts: Dict[str, List[str]] = {}
+    merge_spans: List[str] = []
+    state: Dict[str, Any] = {"last_merge": "prepare"}
+    merges: Dict[str, "asyncio.Task[None]"] = {}
+
+    async def git(args: List[str]) -> arena_async.ProcResult:
+        return await arena_async.run(["git"] + args, int_wt)
+
+    async def finish_all() -> None:
+        int_commit, int_tree = (await git(["rev-parse", "HEAD", "HEAD^{tree}"])).stdout.split()
+        record: Dict[str, Any] = {"timestamp": now_iso(), "integration_branch": integration_branch, "base_ref": base_ref, "merged": merged, "integration_commit": int_commit, "pipeline": "streaming"}
+        if conflicts:
+            record["precheck"] = {"conflicts": [tid for tids in conflicts.values() for tid in tids]}
+        t_final = time.monotonic()
+        record["final_gate"] = await run_final_gate(repo_root, cfg, int_wt, int_commit, int_tree)
+        timeline.add("final", "final", t_final, time.monotonic(), merge_spans, status=record["final_gate"].get("status"))
+        state["record"] = record
+
+    async def merge_track(key: str, candidates: List[str]) -> None:
+        async with arena_async.runner().lock("integrate"):
+            with arena_trace.span("integrate.merge", track=key, candidates=",".join(candidates)):
+                await merge_one(key, candidates)
+
+    async def merge_one(key: str, candidates: List[str]) -> None:
+        t_merge = time.monotonic()
+        head = (await git(["rev-parse", "HEAD"])).stdout.strip()
+        chosen = None
+        for team in candidates:
+            branch = f"arena/{team}"
+            try:
+                clean = await merge_tree_async(repo_root, head, branch) is not None
+            except RuntimeError:
+                clean = True
+            if clean:
+                print(f"[integrate] merging winner {team} ({branch}) into {integration_branch}...")
+                if (await git(["merge", "--no-ff", "--no-edit", branch])).returncode == 0:
+                    chosen = team
+                    break
+                await git(["merge", "--abort"])
+            conflicts.setdefault(key, []).append(team)
+            print(f"[integrate] Track {key}: {team} conflicts with {integration_branch}; trying next passing team.")
+        span = f"merge:{key}"
+        timeline.add(span, "merge", t_merge, time.monotonic(), [f"rank:{key}", state["last_merge"]], track=key, team=chosen)
+        state["last_merge"] = span
+        if chosen is None:
+            failed[key] = "conflict"
+            print(f"[integrate] Track {key}: no passing team merges cleanly.")
+            return
+        merged.append({"track": key, "team": chosen, "branch": f"arena/{chosen}"})
+        merge_spans.append(span)
+        print(f"[pipeline] Track {key} landed ({chosen}) at +{human_sec(time.monotonic() - timeline.t0)}")
+        if len(merged) == len(track_keys):
+            await finish_all()
+
+    def rank_track(key: str) -> Tuple[Dict[str, Any], List[str]]:
+        out = compute_rank(repo_root, cfg)
+        return out, [r["team"] for r in out["ranking"].get(key, []) if r.get("status") == "pass" and meta.branch_exists(f"arena/{r['team']}")]
+
+    async def finalize_track(key: str) -> None:
+        t_rank = time.monotonic()
+        # compute_rank / GitMeta は同期の git・SQLite 呼び出しなので、ループを止めないようスレッドで回す
+        out, candidates = await asyncio.to_thread(rank_track, key)
+        win = out["winners"].get(key)
+        if win in candidates:
+            candidates.remove(win)
+            candidates.insert(0, win)
+        timeline.add(f"rank:{key}", "rank", t_rank, time.monotonic(), gate_spans[key] or ["prepare"], track=key, winner=win)
+        if not candidates:
+            failed[key] = "no PASS winner"
+            print(f"[pipeline] Track {key}: no PASS winner. Integration will be incomplete.")
+            return
+        print(f"[pipeline] Track {key} ranked final (winner {win}) at +{human_sec(time.monotonic() - timeline.t0)}; merging while other tracks gate.")
+        await merge_track(key, candidates)
+
+    def on_result(tid: str, res: Optional[Dict[str, Any]], start: float, end: float) -> None:
+        key = track_of(tid)
+        span = f"gate:{tid}"
+        timeline.add(span, "gate", start, end, ["prepare"], track=key, team=tid, status=(res or {}).get("status", "error"), reused=bool((res or {}).get("reused")))
+        gate_spans[key].append(span)
+        pending[key].discard(tid)
+        if not pending[key]:
+            merges[key] = asyncio.ensure_future(finalize_track(key))
+
+    async def run() -> None:
+        for key in track_keys:
+            if not pending[key]:
+                merges[key] = asyncio.ensure_future(finalize_track(key))
+        await gate_sweep(repo_root, cfg, gate_cmd, todo, jobs, force=False, schedule="track", race=race, on_result=on_result)
+        for key, task in merges.items():
+            try:
+                await task
+            except Exception as e:
+                failed[key] = f"merge error ({e})"
+                print(f"[integrate] Track {key}: ERROR ({e})")
+
+    asyncio.run(run())
+    last = "final" if "final" in timeline.spans else state["last_merge"]
+    crit = timeline.write(repo_root / ".arena" / "timeline.json", last)
+    path = " → ".join(f"{d['id']} {human_sec(d['dur'])}" for d in crit)
+    print(f"[pipeline] critical path: {path} (total {human_sec(time.monotonic() - timeline.t0)}; {repo_root / '.arena' / 'timeline.json'})")
+    if failed:
+        print(f"[pipeline] integration incomplete: {', '.join(f'Track {k}: {v}' for k, v in sorted(failed.items()))}")
+        print(f"[integrate] Worktree: {int_wt}")
+        return 4 if "no PASS winner" in failed.values() else 6
+    report_integration(repo_root, int_wt, state["record"])
     return 0
 
 
-def pipeline(repo_root: Path, cfg: Dict[str, Any], wait: bool, interval: int) -> int:
+def pipeline(repo_root: Path, cfg: Dict[str, Any], wait: bool, interval: int, jobs: Optional[int] = None, race: bool = False, stream: bool = True) -> int:
     if wait:
         print("[pipeline] Ready. Press Enter to run: gate → rank → integrate. Ctrl+C to cancel.")
         try:
@@ -388,7 +2758,9 @@ def pipeline(repo_root: Path, cfg: Dict[str, Any], wait: bool, interval: int) ->
         except KeyboardInterrupt:
             print("\n[pipeline] canceled.")
             return 130
-    rc = run_gate_all(repo_root, cfg, watch=False, interval=interval, force=False)
+    if stream:
+        return stream_pipeline(repo_root, cfg, jobs=jobs, race=race)
+    rc = run_gate_all(repo_root, cfg, watch=False, interval=interval, force=False, jobs=jobs, race=race)
     if rc != 0:
         return rc
     rc = run_rank(repo_root, cfg, watch=False, interval=interval)
@@ -398,6 +2770,301 @@ def pipeline(repo_root: Path, cfg: Dict[str, Any], wait: bool, interval: int) ->
     return rc
 
 
+DURATION_BUCKETS = (1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1200.0, 1800.0, 3600.0)
+DEFAULT_DAEMON_PORT = 9470
+
+
+def daemon_path(repo_root: Path) -> Path:
+    return repo_root / ".arena" / "daemon.json"
+
+
+def prom_labels(**labels: Any) -> str:
+    esc = {k: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for k, v in labels.items()}
+    return "{" + ",".join(f'{k}="{v}"' for k, v in esc.items()) + "}" if esc else ""
+
+
+class ArenaState:
+    """arena デーモン（`serve`）がメモリに保持するゲート/ランク状態。
+
+    ゲートのイベントループから更新され、HTTP スレッドから読まれるのでロックで保護する。
+    起動時に `.arena/arena.db` の履歴からチーム毎の所要時間ヒストグラムを復元する。
+    """
+
+    def __init__(self, repo_root: Path, cfg: Dict[str, Any]):
+        self.repo_root = repo_root
+        self.started = time.time()
+        self.teams = [tid for t in cfg["tracks"] for tid in team_ids(t["key"], int(t["count"]))]
+        self.queued: List[str] = []
+        self.running: Dict[str, float] = {}
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.hist: Dict[str, List[float]] = {}
+        self.runs_total: Dict[str, int] = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.sweeps = 0
+        self.last_sweep_sec: Optional[float] = None
+        self.winners: Dict[str, str] = {}
+        self.winner_since: Dict[str, float] = {}
+        self.last_winner_change: Optional[float] = None
+        self.ranking: Dict[str, List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def seed(self, limit: int = 50) -> None:
+        store = arena_store(self.repo_root)
+        for tid in self.teams:
+            for r in reversed(store.history(tid, limit)):
+                if r.get("cache") != "hit" and r.get("elapsed_sec"):
+                    self._observe(tid, float(r["elapsed_sec"]))
+            latest = store.latest(tid)
+            if latest:
+                self.results[tid] = self._compact(latest)
+
+    @staticmethod
+    def _compact(r: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: r.get(k) for k in ("status", "elapsed_sec", "commit", "timestamp", "cache")}
+
+    def _observe(self, tid: str, sec: float) -> None:
+        h = self.hist.setdefault(tid, [0.0] * (len(DURATION_BUCKETS) + 2))
+        for i, le in enumerate(DURATION_BUCKETS):
+            if sec <= le:
+                h[i] += 1
+        h[-2] += sec
+        h[-1] += 1
+
+    def queue(self, tids: List[str]) -> None:
+        with self._lock:
+            self.queued = [t for t in self.queued if t not in tids] + list(tids)
+
+    def start(self, tid: str) -> None:
+        with self._lock:
+            if tid in self.queued:
+                self.queued.remove(tid)
+            self.running[tid] = time.time()
+
+    def finish(self, tid: str, res: Optional[Dict[str, Any]]) -> None:
+        with self._lock:
+            self.running.pop(tid, None)
+            st = (res or {}).get("status", "error")
+            if res and res.get("reused"):
+                return
+            self.runs_total[st] = self.runs_total.get(st, 0) + 1
+            if res:
+                self.results[tid] = self._compact(res)
+                if res.get("elapsed_sec") and res.get("cache") != "hit":
+                    self._observe(tid, float(res["elapsed_sec"]))
+
+    def sweep(self, hits: int, misses: int, wall: float) -> None:
+        with self._lock:
+            self.cache_hits += hits
+            self.cache_misses += misses
+            self.sweeps += 1
+            self.last_sweep_sec = wall
+
+    def ranked(self, out: Dict[str, Any], initial: bool = False) -> None:
+        now = time.time()
+        with self._lock:
+            changed = False
+            for key, team in out.get("winners", {}).items():
+                if self.winners.get(key) != team:
+                    self.winner_since[key] = now
+                    changed = True
+            for key in list(self.winners):
+                if key not in out.get("winners", {}):
+                    self.winner_since.pop(key, None)
+                    changed = True
+            if changed and not initial:
+                self.last_winner_change = now
+            self.winners = dict(out.get("winners", {}))
+            self.ranking = {key: [{"team": r["team"], "status": r.get("status"), "elapsed_sec": r.get("elapsed_sec"), "stale": r.get("stale", False)} for r in results] for key, results in out.get("ranking", {}).items()}
+
+    def status(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            total = self.cache_hits + self.cache_misses
+            return {
+                "timestamp": now_iso(),
+                "uptime_sec": round(now - self.started, 1),
+                "queue": list(self.queued),
+                "running": {tid: round(now - t, 1) for tid, t in self.running.items()},
+                "results": dict(self.results),
+                "winners": dict(self.winners),
+                "winner_age_sec": {k: round(now - t, 1) for k, t in self.winner_since.items()},
+                "last_winner_change_sec": round(now - self.last_winner_change, 1) if self.last_winner_change else None,
+                "cache": {"hits": self.cache_hits, "misses": self.cache_misses, "hit_rate": round(self.cache_hits / total, 3) if total else None},
+                "gate_runs": dict(self.runs_total),
+                "sweeps": self.sweeps,
+                "last_sweep_sec": self.last_sweep_sec,
+                "ranking": dict(self.ranking),
+            }
+
+    def metrics(self) -> str:
+        now = time.time()
+        lines: List[str] = []
+
+        def metric(name: str, kind: str, help_text: str, samples: List[Tuple[str, Any]]) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{name}{labels} {value:g}" if isinstance(value, float) else f"{name}{labels} {value}" for labels, value in samples)
+
+        with self._lock:
+            metric("arena_up_seconds", "gauge", "Seconds since the arena daemon started.", [("", round(now - self.started, 3))])
+            metric("arena_gate_queue_depth", "gauge", "Teams waiting for a gate slot in the current sweep.", [("", len(self.queued))])
+            metric("arena_gates_running", "gauge", "Gates currently running.", [("", len(self.running))])
+            metric("arena_gate_running_seconds", "gauge", "Elapsed time of each running gate.", [(prom_labels(team=tid, track=track_of(tid)), round(now - t, 3)) for tid, t in sorted(self.running.items())])
+            metric("arena_gate_runs_total", "counter", "Gate runs finished by this daemon, by status.", [(prom_labels(status=k), v) for k, v in sorted(self.runs_total.items())])
+            lines.append("# HELP arena_gate_duration_seconds Gate wall-clock duration per team (cache hits excluded).")
+            lines.append("# TYPE arena_gate_duration_seconds histogram")
+            for tid, h in sorted(self.hist.items()):
+                for i, le in enumerate(DURATION_BUCKETS):
+                    lines.append(f"arena_gate_duration_seconds_bucket{prom_labels(team=tid, track=track_of(tid), le=f'{le:g}')} {int(h[i])}")
+                lines.append(f"arena_gate_duration_seconds_bucket{prom_labels(team=tid, track=track_of(tid), le='+Inf')} {int(h[-1])}")
+                lines.append(f"arena_gate_duration_seconds_sum{prom_labels(team=tid, track=track_of(tid))} {h[-2]:g}")
+                lines.append(f"arena_gate_duration_seconds_count{prom_labels(team=tid, track=track_of(tid))} {int(h[-1])}")
+            total = self.cache_hits + self.cache_misses
+            metric("arena_gate_cache_hits_total", "counter", "Gate cache hits.", [("", self.cache_hits)])
+            metric("arena_gate_cache_misses_total", "counter", "Gate cache misses.", [("", self.cache_misses)])
+            metric("arena_gate_cache_hit_ratio", "gauge", "Gate cache hit ratio since the daemon started.", [("", round(self.cache_hits / total, 4) if total else 0.0)])
+            metric("arena_sweeps_total", "counter", "Gate sweeps run by this daemon.", [("", self.sweeps)])
+            metric("arena_winner", "gauge", "Current winner per track (value is always 1).", [(prom_labels(track=k, team=v), 1) for k, v in sorted(self.winners.items())])
+            metric("arena_winner_age_seconds", "gauge", "Seconds since the winner of each track last changed.", [(prom_labels(track=k), round(now - t, 3)) for k, t in sorted(self.winner_since.items())])
+            metric("arena_last_winner_change_seconds", "gauge", "Seconds since any track winner changed (-1 if none yet).", [("", round(now - self.last_winner_change, 3) if self.last_winner_change else -1)])
+        return "\n".join(lines) + "\n"
+
+
+def metrics_server(state: ArenaState, host: str, port: int) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            path = self.path.split("?", 1)[0]
+            if path == "/metrics":
+                body, ctype = state.metrics().encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+            elif path == "/status":
+                body, ctype = json.dumps(state.status(), ensure_ascii=False).encode("utf-8"), "application/json"
+            elif path == "/":
+                body, ctype = b"arena daemon: /metrics (Prometheus), /status (JSON)\n", "text/plain; charset=utf-8"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve_arena(repo_root: Path, cfg: Dict[str, Any], host: str, port: int, interval: int, debounce: float, jobs: Optional[int] = None, race: bool = False) -> int:
+    """常駐デーモン: gate --watch + rank をプロセス内で回し、状態を HTTP で公開する。"""
+    state = ArenaState(repo_root, cfg)
+    state.seed()
+    state.ranked(compute_rank(repo_root, cfg), initial=True)
+    try:
+        server = metrics_server(state, host, port)
+    except OSError as e:
+        print(f"[serve] ERROR: cannot listen on {host}:{port} ({e})")
+        return 2
+    url = f"http://{host}:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    write_json_atomic(daemon_path(repo_root), {"pid": os.getpid(), "url": url, "started_at": now_iso()})
+    print(f"[serve] arena daemon on {url} (/metrics, /status)")
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+    try:
+        return run_gate_all(repo_root, cfg, watch=True, interval=interval, force=False, jobs=jobs, debounce=debounce, race=race, state=state)
+    finally:
+        server.shutdown()
+        daemon_path(repo_root).unlink(missing_ok=True)
+
+
+def daemon_url(repo_root: Path) -> Optional[str]:
+    try:
+        info = json.loads(daemon_path(repo_root).read_text(encoding="utf-8"))
+        os.kill(int(info["pid"]), 0)
+        return str(info["url"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def fetch_status(repo_root: Path, timeout: float = 2.0) -> Optional[Dict[str, Any]]:
+    url = daemon_url(repo_root)
+    if not url:
+        return None
+    try:
+        with urllib.request.urlopen(f"{url}/status", timeout=timeout) as resp:
+            return dict(json.loads(resp.read().decode("utf-8")), daemon=url)
+    except (OSError, ValueError):
+        return None
+
+
+def print_status(repo_root: Path) -> None:
+    st = fetch_status(repo_root)
+    if st is None:
+        winners_path = repo_root / ".arena" / "winners.json"
+        print(f"[status] {now_iso()} (daemon not running; showing {winners_path})")
+        if not winners_path.exists():
+            print("  (no winners yet)")
+            return
+        out = json.loads(winners_path.read_text(encoding="utf-8"))
+        st = {"winners": out.get("winners", {}), "ranking": out.get("ranking", {})}
+    else:
+        cache = st["cache"]
+        rate = f"{cache['hit_rate'] * 100:0.0f}% ({cache['hits']}/{cache['hits'] + cache['misses']})" if cache["hit_rate"] is not None else "-"
+        change = human_sec(st["last_winner_change_sec"]) + " ago" if st.get("last_winner_change_sec") is not None else "-"
+        running = ", ".join(f"{tid} {human_sec(sec)}" for tid, sec in sorted(st["running"].items())) or "-"
+        print(f"[status] {st['timestamp']} (daemon {st['daemon']}, up {human_sec(st['uptime_sec'])})")
+        print(f"  queue {len(st['queue'])} | running {len(st['running'])}: {running} | cache {rate} | last winner change {change}")
+    for key, results in st.get("ranking", {}).items():
+        cells = []
+        for r in results:
+            mark = "★" if st["winners"].get(key) == r["team"] else ""
+            elapsed = human_sec(r["elapsed_sec"]) if r.get("elapsed_sec") else "-"
+            cells.append(f"{mark}{r['team']} {str(r.get('status', '?')).upper()} {elapsed}")
+        print(f"  Track {key}: {', '.join(cells) or '-'}")
+
+
+def run_status(repo_root: Path, watch: bool, interval: float, as_json: bool) -> int:
+    if as_json:
+        st = fetch_status(repo_root)
+        if st is None:
+            print("[status] ERROR: arena daemon not running (start it with: gen_tmuxp.py serve)", file=sys.stderr)
+            return 1
+        print(json.dumps(st, ensure_ascii=False, indent=2))
+        return 0
+    while True:
+        if watch:
+            print("\033[2J\033[H", end="")
+        print_status(repo_root)
+        if not watch:
+            return 0
+        time.sleep(interval)
+
+
+def run_pool(repo_root: Path, cfg: Dict[str, Any], action: str, capacity: Optional[int]) -> int:
+    wt_dir = (repo_root / cfg.get("worktrees_dir", "worktrees")).resolve()
+    pool = WorktreePool(repo_root, wt_dir, int(cfg.get("worktree_pool_max", DEFAULT_POOL_MAX)))
+    if action == "release":
+        tracks = [(t["key"], int(t["count"])) for t in cfg.get("tracks", [])]
+        specs = arena_worktree_specs(tracks, cfg.get("integration_branch", "arena/integration"))
+        n = pool.park([(name, wt_dir / name) for name, _ in specs if (wt_dir / name).exists()])
+        print(f"[pool] parked {n} worktrees in {pool.dir}")
+        evicted = pool.evict()
+    elif action == "trim":
+        evicted = pool.evict(capacity)
+    else:
+        evicted = 0
+    if evicted:
+        print(f"[pool] evicted {evicted} least recently used worktrees")
+    now = time.time()
+    print(f"[pool] {len(pool.slots)}/{pool.capacity} warm worktrees in {pool.dir}")
+    for name, meta in sorted(pool.slots.items(), key=lambda kv: kv[1].get("last_used", 0), reverse=True):
+        print(f"  {name}  from {meta.get('from', '?'):<12} idle {human_sec(now - meta.get('last_used', now))}")
+    return 0
+
+
 def chunk(items: List[str], size: int) -> List[List[str]]:
     return [items[i : i + size] for i in range(0, len(items), size)]
 
@@ -429,6 +3096,7 @@ def pane(title: str, commands: List[str]) -> Dict[str, Any]:
     return {"shell_command": [cmd0] + commands}
 
 
+@arena_trace.traced("tmuxp.write")
 def generate_tmuxp(repo_root: Path, cfg: Dict[str, Any], session: str, out_path: Path, per_window: int, requirements_file: Optional[Path] = None) -> None:
     wt_dir = repo_root / cfg["worktrees_dir"]
     windows: List[Dict[str, Any]] = []
@@ -453,8 +3121,13 @@ def generate_tmuxp(repo_root: Path, cfg: Dict[str, Any], session: str, out_path:
                 wt = (wt_dir / tid).resolve()
                 panes.append(pane(tid, [f"cd '{wt}'", opencode_shell_snippet(t["agent"], t["model"], repo_root, team_prompt)]))
             windows.append({"window_name": wname, "layout": "tiled", "panes": panes})
-    windows.append({"window_name": "quality-gate", "layout": "even-horizontal", "panes": [pane("gate-watch", [f"cd '{repo_root}'", "export PATH=\"$HOME/.local/bin:$PATH\"", "python3 tools/gen_tmuxp.py gate --watch --interval 20"]), pane("qa-agent", [f"cd '{repo_root}'", opencode_shell_snippet(cfg.get("qa_agent", "qa-gate"), cfg["model_codex"], repo_root)])]})
-    windows.append({"window_name": "ranking", "layout": "even-horizontal", "panes": [pane("rank-watch", [f"cd '{repo_root}'", "export PATH=\"$HOME/.local/bin:$PATH\"", "python3 tools/gen_tmuxp.py rank --watch --interval 20"]), pane("winners", [f"cd '{repo_root}'", "echo '[winners] .arena/winners.json'", "while true; do clear; date; echo; test -f .arena/winners.json && cat .arena/winners.json || echo '(no winners yet)'; sleep 5; done"])]})
+    gate_pane = "python3 tools/gen_tmuxp.py serve" if cfg.get("daemon") else "python3 tools/gen_tmuxp.py gate --watch"
+    windows.append({"window_name": "quality-gate", "layout": "even-horizontal", "panes": [pane("arena-daemon" if cfg.get("daemon") else "gate-watch", [f"cd '{repo_root}'", "export PATH=\"$HOME/.local/bin:$PATH\"", gate_pane]), pane("qa-agent", [f"cd '{repo_root}'", opencode_shell_snippet(cfg.get("qa_agent", "qa-gate"), cfg["model_codex"], repo_root)])]})
+    status_pane = pane("winners", [f"cd '{repo_root}'", "python3 tools/gen_tmuxp.py status --watch"])
+    if cfg.get("daemon"):
+        windows.append({"window_name": "ranking", "layout": "even-horizontal", "panes": [status_pane]})
+    else:
+        windows.append({"window_name": "ranking", "layout": "even-horizontal", "panes": [pane("rank-watch", [f"cd '{repo_root}'", "export PATH=\"$HOME/.local/bin:$PATH\"", "python3 tools/gen_tmuxp.py rank --watch"]), status_pane]})
     int_wt = (wt_dir / "INTEGRATION").resolve()
     windows.append({"window_name": "integration", "layout": "even-horizontal", "panes": [pane("integrate", [f"cd '{repo_root}'", "export PATH=\"$HOME/.local/bin:$PATH\"", "echo '[integrate] Run: python3 tools/gen_tmuxp.py integrate --reset --final-gate'", "bash"]), pane("integrator-agent", [f"cd '{int_wt}'", opencode_shell_snippet(cfg.get("integrator_agent", "integrator"), cfg["model_codex"], repo_root)])]})
     windows.append({"window_name": "pipeline", "layout": "even-horizontal", "panes": [pane("pipeline", [f"cd '{repo_root}'", "export PATH=\"$HOME/.local/bin:$PATH\"", "python3 tools/gen_tmuxp.py pipeline --wait"])]})
@@ -463,7 +3136,7 @@ def generate_tmuxp(repo_root: Path, cfg: Dict[str, Any], session: str, out_path:
     out_path.write_text(json.dumps(tmuxp_conf, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
 
 
-def start_arena(repo_root: Path, requirements: Optional[str], requirements_file: Optional[Path], n: int, gate_cmd: Optional[str], auto_pipeline: bool, model: str) -> int:
+def start_arena(repo_root: Path, requirements: Optional[str], requirements_file: Optional[Path], n: int, gate_cmd: Optional[str], auto_pipeline: bool, model: str, new_round: bool = False) -> int:
     ensure_dir(repo_root / ".arena")
     req_path = repo_root / ".arena" / "requirements.md"
     if requirements:
@@ -487,17 +3160,21 @@ def start_arena(repo_root: Path, requirements: Optional[str], requirements_file:
         agent: str
 
     tracks: List[Track] = [Track("A", n, model, "comp-a"), Track("B", n, model, "comp-b"), Track("C", n, model, "comp-c")]
-    wt_dir = (repo_root / "worktrees").resolve()
-    ensure_dir(wt_dir)
-    sh(["git", "worktree", "prune"], cwd=repo_root, check=False)
-    for t in tracks:
-        for tid in team_ids(t.key, t.count):
-            ensure_worktree(tid, repo_root, wt_dir, base_ref)
-    integration_branch = "arena/integration"
-    ensure_integration_worktree(repo_root, wt_dir, base_ref=base_ref, integration_branch=integration_branch)
+    # 既存の arena 設定（generate で決めた rank_by / bench_* / daemon / worktree・キャッシュ設定など）は引き継ぐ
+    prev = load_config(repo_root) if config_path(repo_root).exists() else {}
+    worktrees_dir = prev.get("worktrees_dir", "worktrees")
+    wt_dir = (repo_root / worktrees_dir).resolve()
+    integration_branch = prev.get("integration_branch", "arena/integration")
+    sparse, cone, wt_jobs = prev.get("worktree_sparse") or None, bool(prev.get("worktree_sparse_cone", True)), prev.get("worktree_jobs")
+    pool_max, keep_ignored = int(prev.get("worktree_pool_max", DEFAULT_POOL_MAX)), bool(prev.get("worktree_keep_ignored", True))
+    pool = WorktreePool(repo_root, wt_dir, pool_max)
+    provision_worktrees(repo_root, wt_dir, arena_worktree_specs([(t.key, t.count) for t in tracks], integration_branch), base_ref, jobs=wt_jobs, sparse=sparse, cone=cone, pool=pool, new_round=new_round, keep_ignored=keep_ignored)
     if not gate_cmd:
-        gate_cmd = detect_gate_cmd(repo_root)
-    cfg: Dict[str, Any] = {"repo_root": str(repo_root), "base_ref": base_ref, "worktrees_dir": "worktrees", "gate_cmd": gate_cmd, "gate_timeout_sec": 1800, "model_codex": model, "model_glm": model, "planner_agent": "central-planner", "qa_agent": "qa-gate", "integrator_agent": "integrator", "integration_branch": integration_branch, "tracks": [{"key": t.key, "count": t.count, "model": t.model, "agent": t.agent} for t in tracks], "generated_at": now_iso()}
+        gate_cmd = prev.get("gate_cmd") or detect_gate_cmd(repo_root)
+    cfg: Dict[str, Any] = dict(prev)
+    cfg.update({"repo_root": str(repo_root), "base_ref": base_ref, "worktrees_dir": worktrees_dir, "gate_cmd": gate_cmd, "model_codex": model, "model_glm": model, "integration_branch": integration_branch, "tracks": [{"key": t.key, "count": t.count, "model": t.model, "agent": t.agent} for t in tracks], "generated_at": now_iso()})
+    for key, default in (("gate_timeout_sec", 1800), ("planner_agent", "central-planner"), ("qa_agent", "qa-gate"), ("integrator_agent", "integrator"), ("worktree_pool_max", pool_max), ("worktree_keep_ignored", keep_ignored)):
+        cfg.setdefault(key, default)
     save_config(repo_root, cfg)
     out_path = (repo_root / ".tmuxp" / "arena.json").resolve()
     generate_tmuxp(repo_root, cfg, session="arena", out_path=out_path, per_window=5, requirements_file=req_path)
@@ -531,6 +3208,12 @@ def build_parser() -> argparse.ArgumentParser:
     g.add_argument("--out", default=".tmuxp/arena.json")
     g.add_argument("--worktrees-dir", default="worktrees")
     g.add_argument("--per-window", type=int, default=5)
+    g.add_argument("--worktree-jobs", type=int, default=None, help="parallel worktree provisioning (default: max(4, CPU count))")
+    g.add_argument("--sparse", action="append", default=None, metavar="PATH", help="sparse checkout pattern for every worktree (repeatable; --no-checkout + sparse-checkout)")
+    g.add_argument("--no-cone", action="store_true", help="treat --sparse patterns as gitignore-style patterns instead of cone directories")
+    g.add_argument("--new-round", action="store_true", help="park the current worktrees in the warm pool and restart every team from --base-ref")
+    g.add_argument("--pool-size", type=int, default=DEFAULT_POOL_MAX, help=f"warm worktree pool capacity; least recently used beyond this are removed (default: {DEFAULT_POOL_MAX})")
+    g.add_argument("--purge-ignored", action="store_true", help="also remove ignored files (build caches) when recycling a pooled worktree")
     g.add_argument("--n", type=int, default=3)
     g.add_argument("--nA", type=int, default=None)
     g.add_argument("--nB", type=int, default=None)
@@ -540,6 +3223,12 @@ def build_parser() -> argparse.ArgumentParser:
     g.add_argument("--base-ref", default=None)
     g.add_argument("--gate-cmd", default=None)
     g.add_argument("--gate-timeout", type=int, default=1800)
+    g.add_argument("--rank-by", choices=sorted(RANK_METRICS), default="elapsed", help="ranking metric for passing teams")
+    g.add_argument("--bench-cmd", default=None, help="benchmark run after a passing gate; prints JSON lines of metrics")
+    g.add_argument("--bench-runs", type=int, default=5)
+    g.add_argument("--bench-warmup", type=int, default=1)
+    g.add_argument("--bench-metric", default=None, help="rank passing teams by this bench metric (rank_policy=bench)")
+    g.add_argument("--bench-goal", choices=["min", "max"], default="min")
     g.add_argument("--model-codex", default=os.environ.get("OPENCODE_MODEL", "openai/gpt-5.2-codex"))
     g.add_argument("--model-glm", default=os.environ.get("OPENCODE_MODEL", "openai/gpt-5.2-codex"))
     g.add_argument("--planner-agent", default="central-planner")
@@ -551,31 +3240,77 @@ def build_parser() -> argparse.ArgumentParser:
     g.add_argument("--integrator-agent", default="integrator")
     g.add_argument("--requirements", default=None)
     g.add_argument("--auto-start", action="store_true")
+    g.add_argument("--incremental", action="store_true", help="gate only the tests affected by each team's diff against --base-ref (index under .arena/impact)")
+    g.add_argument("--incremental-cmd", default=None, metavar="CMD", help="gate command for a subset of tests; {tests} is replaced by the test paths (default: derived for pytest/npm/jest/vitest)")
+    g.add_argument("--always-run", action="append", default=None, metavar="TEST", help="test path always included in incremental gates (repeatable)")
+    g.add_argument("--full-gate-every", type=int, default=5, help="with --incremental, run the full suite on every Nth final gate (0 = always)")
+    g.add_argument("--final-shards", type=int, default=1, help="split the final gate's test files into K concurrent shards balanced by past durations (needs a {tests} command, see --incremental-cmd)")
+    g.add_argument("--dep-cache", action="store_true", help="install dependencies (node_modules, .venv, ...) once per lockfile hash under .arena/cache/deps and link them into each worktree before gating")
+    g.add_argument("--dep-cache-link", choices=["auto", "reflink", "hardlink", "copy"], default="auto", help="how cached dependencies are materialised in worktrees (auto: reflink, then copy; hardlink shares inodes with the store, so in-place writes by a gate leak into every team)")
+    g.add_argument("--daemon", action="store_true", help="run gate+rank as one resident `serve` daemon in the quality-gate pane")
+    g.add_argument("--daemon-port", type=int, default=DEFAULT_DAEMON_PORT)
     s = sub.add_parser("start", help="start arena with requirements")
     s.add_argument("--requirements", "-r", default=None)
     s.add_argument("--requirements-file", "-f", default=None)
     s.add_argument("--n", type=int, default=3)
     s.add_argument("--gate-cmd", default=None)
     s.add_argument("--auto-pipeline", action="store_true")
+    s.add_argument("--new-round", action="store_true", help="park the current worktrees in the warm pool and restart every team from HEAD")
     s.add_argument("--model", default=os.environ.get("OPENCODE_MODEL", "openai/gpt-5.2-codex"))
     gate_p = sub.add_parser("gate", help="run Quality Gate")
     gate_p.add_argument("--watch", action="store_true")
-    gate_p.add_argument("--interval", type=int, default=20)
+    gate_p.add_argument("--interval", type=int, default=20, help="with --watch: seconds between stat polls when inotify is unavailable (with inotify, commits are picked up at once). Before event-driven watching this was the fixed re-sweep period")
+    gate_p.add_argument("--debounce", type=float, default=2.0)
     gate_p.add_argument("--force", action="store_true")
+    gate_p.add_argument("--no-cache", action="store_true", help="ignore the shared gate result cache")
+    gate_p.add_argument("--no-dep-cache", action="store_true", help="do not link cached dependencies into worktrees for this run")
+    gate_p.add_argument("--incremental", action="store_true", help="run only tests affected by each team's diff against base_ref")
+    gate_p.add_argument("--race", action="store_true", help="cancel gates that can no longer beat their track leader")
+    gate_p.add_argument("--schedule", choices=["sejf", "track", "fifo"], default="sejf", help="gate queue order: shortest expected job first interleaved across tracks (default), track by track, or team order")
+    gate_p.add_argument("--jobs", "-j", type=int, default=default_jobs(), help="parallel gate workers (default: CPU count)")
     rank_p = sub.add_parser("rank", help="rank teams")
     rank_p.add_argument("--watch", action="store_true")
-    rank_p.add_argument("--interval", type=int, default=20)
+    rank_p.add_argument("--interval", type=int, default=20, help="with --watch: seconds between stat polls when inotify is unavailable (with inotify, commits are picked up at once). Before event-driven watching this was the fixed re-sweep period")
+    rank_p.add_argument("--debounce", type=float, default=1.0)
     int_p = sub.add_parser("integrate", help="merge winners")
     int_p.add_argument("--reset", action="store_true")
     int_p.add_argument("--final-gate", action="store_true")
+    int_p.add_argument("--no-precheck", action="store_true", help="skip the in-memory merge-tree conflict precheck")
+    int_p.add_argument("--incremental", action="store_true", help="final gate runs only tests affected by the integration diff (full on schedule)")
+    int_p.add_argument("--full-gate", action="store_true", help="force the full suite for the final gate")
+    int_p.add_argument("--shards", type=int, default=None, help="run the final gate as K concurrent shards (default: final_gate_shards from arena config)")
     pipe_p = sub.add_parser("pipeline", help="gate→rank→integrate")
     pipe_p.add_argument("--wait", action="store_true")
     pipe_p.add_argument("--interval", type=int, default=20)
+    pipe_p.add_argument("--race", action="store_true", help="cancel gates that can no longer beat their track leader")
+    pipe_p.add_argument("--jobs", "-j", type=int, default=default_jobs(), help="parallel gate workers (default: CPU count)")
+    pipe_p.add_argument("--incremental", action="store_true", help="gate only tests affected by each diff against base_ref (final gate full on schedule)")
+    pipe_p.add_argument("--full-gate", action="store_true", help="force the full suite for the final gate")
+    pipe_p.add_argument("--shards", type=int, default=None, help="run the final gate as K concurrent shards (default: final_gate_shards from arena config)")
+    pipe_p.add_argument("--barrier", action="store_true", help="gate all teams, then rank, then integrate (no per-track streaming)")
+    serve_p = sub.add_parser("serve", help="resident gate/rank daemon exposing /metrics and /status")
+    serve_p.add_argument("--host", default="127.0.0.1")
+    serve_p.add_argument("--port", type=int, default=None, help=f"HTTP port (default: daemon_port from arena config or {DEFAULT_DAEMON_PORT}; 0 = any free port)")
+    serve_p.add_argument("--interval", type=int, default=2, help="polling fallback period when inotify is unavailable")
+    serve_p.add_argument("--debounce", type=float, default=2.0)
+    serve_p.add_argument("--incremental", action="store_true", help="run only tests affected by each team's diff against base_ref")
+    serve_p.add_argument("--race", action="store_true", help="cancel gates that can no longer beat their track leader")
+    serve_p.add_argument("--jobs", "-j", type=int, default=default_jobs(), help="parallel gate workers (default: CPU count)")
+    status_p = sub.add_parser("status", help="show live arena status from the daemon (falls back to winners.json)")
+    status_p.add_argument("--watch", action="store_true")
+    status_p.add_argument("--interval", type=float, default=5.0)
+    status_p.add_argument("--json", action="store_true", help="print the daemon's /status JSON")
+    pool_p = sub.add_parser("pool", help="inspect or trim the warm worktree pool")
+    pool_p.add_argument("action", nargs="?", choices=["status", "release", "trim"], default="status", help="release: park the current team worktrees; trim: evict down to --max")
+    pool_p.add_argument("--max", type=int, default=None, help="capacity for trim (default: worktree_pool_max from arena config)")
+    for sp in (g, s, gate_p, rank_p, int_p, pipe_p, serve_p, status_p, pool_p):
+        sp.add_argument("--trace", default=None, metavar="OUT.json", help="record nested timing spans as a Chrome trace-event file (open in Perfetto)")
+        sp.add_argument("--trace-top", type=int, default=15, help="number of slowest spans to print with --trace")
     return p
 
 
 def main(argv: List[str]) -> int:
-    known = {"generate", "gate", "rank", "integrate", "pipeline", "start"}
+    known = {"generate", "gate", "rank", "integrate", "pipeline", "start", "serve", "status", "pool"}
     if len(argv) == 0:
         argv = ["generate"]
     elif argv[0] not in known:
@@ -587,9 +3322,23 @@ def main(argv: List[str]) -> int:
         return 2
     parser = build_parser()
     args = parser.parse_args(argv)
+    if not getattr(args, "trace", None):
+        return run_command(repo_root, parser, args)
+    arena_trace.enable()
+    try:
+        with arena_trace.span(args.cmd, cwd=str(repo_root)):
+            return run_command(repo_root, parser, args)
+    finally:
+        out = Path(args.trace).resolve()
+        arena_trace.TRACER.write(out, process_name=f"gen_tmuxp {args.cmd}")
+        print(arena_trace.TRACER.summary(int(args.trace_top)))
+        print(f"[trace] wrote {out} (open in https://ui.perfetto.dev)")
+
+
+def run_command(repo_root: Path, parser: argparse.ArgumentParser, args: argparse.Namespace) -> int:
     if args.cmd == "start":
         req_file = Path(args.requirements_file) if args.requirements_file else None
-        return start_arena(repo_root, requirements=args.requirements, requirements_file=req_file, n=args.n, gate_cmd=args.gate_cmd, auto_pipeline=args.auto_pipeline, model=args.model)
+        return start_arena(repo_root, requirements=args.requirements, requirements_file=req_file, n=args.n, gate_cmd=args.gate_cmd, auto_pipeline=args.auto_pipeline, model=args.model, new_round=bool(args.new_round))
     if args.cmd == "generate":
         base_ref = args.base_ref
         if not base_ref:
@@ -604,14 +3353,10 @@ def main(argv: List[str]) -> int:
         if args.enable_N:
             tracks.append(Track("N", nN, args.model_codex, args.agent_n))
         wt_dir = (repo_root / args.worktrees_dir).resolve()
-        ensure_dir(wt_dir)
-        sh(["git", "worktree", "prune"], cwd=repo_root, check=False)
-        for t in tracks:
-            for tid in team_ids(t.key, t.count):
-                ensure_worktree(tid, repo_root, wt_dir, base_ref)
         integration_branch = "arena/integration"
-        ensure_integration_worktree(repo_root, wt_dir, base_ref=base_ref, integration_branch=integration_branch)
-        cfg: Dict[str, Any] = {"repo_root": str(repo_root), "base_ref": base_ref, "worktrees_dir": args.worktrees_dir, "gate_cmd": args.gate_cmd, "gate_timeout_sec": int(args.gate_timeout), "model_codex": args.model_codex, "model_glm": args.model_glm, "planner_agent": args.planner_agent, "qa_agent": args.qa_agent, "integrator_agent": args.integrator_agent, "integration_branch": integration_branch, "tracks": [{"key": t.key, "count": t.count, "model": t.model, "agent": t.agent} for t in tracks], "generated_at": now_iso()}
+        pool = WorktreePool(repo_root, wt_dir, args.pool_size)
+        provision_worktrees(repo_root, wt_dir, arena_worktree_specs([(t.key, t.count) for t in tracks], integration_branch), base_ref, jobs=args.worktree_jobs, sparse=args.sparse, cone=not args.no_cone, pool=pool, new_round=bool(args.new_round), keep_ignored=not args.purge_ignored)
+        cfg: Dict[str, Any] = {"repo_root": str(repo_root), "base_ref": base_ref, "worktrees_dir": args.worktrees_dir, "gate_cmd": args.gate_cmd, "gate_timeout_sec": int(args.gate_timeout), "rank_by": args.rank_by, "bench_cmd": args.bench_cmd, "bench_runs": int(args.bench_runs), "bench_warmup": int(args.bench_warmup), "bench_metric": args.bench_metric, "bench_goal": args.bench_goal, "rank_policy": "bench" if (args.bench_cmd and args.bench_metric) else "gate", "model_codex": args.model_codex, "model_glm": args.model_glm, "planner_agent": args.planner_agent, "qa_agent": args.qa_agent, "integrator_agent": args.integrator_agent, "worktree_jobs": args.worktree_jobs, "worktree_sparse": args.sparse or [], "worktree_sparse_cone": not args.no_cone, "worktree_pool_max": int(args.pool_size), "worktree_keep_ignored": not args.purge_ignored, "dep_cache": bool(args.dep_cache), "dep_cache_link": args.dep_cache_link, "gate_incremental": bool(args.incremental), "gate_incremental_cmd": args.incremental_cmd, "gate_always_run": args.always_run or [], "final_gate_full_every": int(args.full_gate_every), "final_gate_shards": int(args.final_shards), "daemon": bool(args.daemon), "daemon_port": int(args.daemon_port), "integration_branch": integration_branch, "tracks": [{"key": t.key, "count": t.count, "model": t.model, "agent": t.agent} for t in tracks], "generated_at": now_iso()}
         if cfg["gate_cmd"] is None:
             auto = detect_gate_cmd(repo_root)
             if auto:
@@ -633,14 +3378,29 @@ def main(argv: List[str]) -> int:
             print(f"[generate] next: tmuxp load {out_path}")
         return 0
     cfg = load_config(repo_root)
+    if getattr(args, "incremental", False):
+        cfg["gate_incremental"] = True
+    if getattr(args, "full_gate", False):
+        cfg["final_gate_full"] = True
+    if getattr(args, "shards", None):
+        cfg["final_gate_shards"] = int(args.shards)
     if args.cmd == "gate":
-        return run_gate_all(repo_root, cfg, watch=bool(args.watch), interval=int(args.interval), force=bool(args.force))
+        if args.no_dep_cache:
+            cfg["dep_cache"] = False
+        return run_gate_all(repo_root, cfg, watch=bool(args.watch), interval=int(args.interval), force=bool(args.force), jobs=int(args.jobs), use_cache=not args.no_cache, debounce=float(args.debounce), schedule=args.schedule, race=bool(args.race))
     if args.cmd == "rank":
-        return run_rank(repo_root, cfg, watch=bool(args.watch), interval=int(args.interval))
+        return run_rank(repo_root, cfg, watch=bool(args.watch), interval=int(args.interval), debounce=float(args.debounce))
     if args.cmd == "integrate":
-        return integrate_winners(repo_root, cfg, reset=bool(args.reset), final_gate=bool(args.final_gate))
+        return integrate_winners(repo_root, cfg, reset=bool(args.reset), final_gate=bool(args.final_gate), precheck=not args.no_precheck)
     if args.cmd == "pipeline":
-        return pipeline(repo_root, cfg, wait=bool(args.wait), interval=int(args.interval))
+        return pipeline(repo_root, cfg, wait=bool(args.wait), interval=int(args.interval), jobs=int(args.jobs), race=bool(args.race), stream=not args.barrier)
+    if args.cmd == "serve":
+        port = args.port if args.port is not None else int(cfg.get("daemon_port", DEFAULT_DAEMON_PORT))
+        return serve_arena(repo_root, cfg, host=args.host, port=port, interval=int(args.interval), debounce=float(args.debounce), jobs=int(args.jobs), race=bool(args.race))
+    if args.cmd == "status":
+        return run_status(repo_root, watch=bool(args.watch), interval=float(args.interval), as_json=bool(args.json))
+    if args.cmd == "pool":
+        return run_pool(repo_root, cfg, action=args.action, capacity=args.max)
     parser.print_help()
     return 0
 